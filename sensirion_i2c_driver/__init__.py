@@ -8,6 +8,15 @@ from .connection import I2cConnection  # noqa: F401
 from .linux_i2c_transceiver import LinuxI2cTransceiver  # noqa: F401
 from .command import I2cCommand  # noqa: F401
 from .sensirion_command import SensirionI2cCommand  # noqa: F401
+from .response_layout import ResponseLayout, ResponseField  # noqa: F401
 from .crc_calculator import CrcCalculator  # noqa: F401
+from .response_cache import I2cResponseCache  # noqa: F401
+from .request_coalescer import I2cRequestCoalescer  # noqa: F401
+from .circuit_breaker import I2cCircuitBreaker  # noqa: F401
+from .retry_policy import I2cRetryPolicy  # noqa: F401
+from .multiplexer import I2cMultiplexer  # noqa: F401
+from .scheduler import I2cScheduler  # noqa: F401
+from .bus_timing import I2cBusTiming, I2cAdmissionController, \
+    I2cRateLimiter  # noqa: F401
 
 __copyright__ = '(c) Copyright 2019 Sensirion AG, Switzerland'
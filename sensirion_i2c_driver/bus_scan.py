@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .connection import I2cConnection
+from .linux_i2c_transceiver import LinuxI2cTransceiver
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Version of the cache file format written by :py:func:`scan_buses`.
+CACHE_FORMAT_VERSION = 1
+
+
+def scan_buses(device_files, cache_file=None, identify=None, addresses=None,
+               refresh=False, transceiver_factory=LinuxI2cTransceiver):
+    """
+    Discover the devices on several I²C buses in parallel, with an optional
+    persistent cache for subsequent startups.
+
+    Every bus is scanned in its own thread with
+    :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.scan`. For
+    every discovered address, the optional ``identify`` function is called
+    to determine the identity of the device (e.g. its product type or serial
+    number).
+
+    If a cache file is given and contains an entry for a bus, the bus is not
+    scanned completely. Instead, only the cached addresses are probed. If all
+    of them still acknowledge, the cached addresses and identities are
+    returned without identifying the devices again. Otherwise, the bus is
+    scanned again. The cache file is updated if the result changed.
+
+    .. note:: Validating the cache only detects removed devices, not added
+              ones. Pass ``refresh=True`` to scan all buses completely, e.g.
+              after changing the hardware.
+
+    Example:
+
+    .. code-block:: python
+
+        def identify(connection, address):
+            return connection.execute(address, ReadSerialNumber())
+
+        devices = scan_buses(["/dev/i2c-1", "/dev/i2c-3"],
+                             cache_file="/var/cache/i2c-devices.json",
+                             identify=identify)
+        # {"/dev/i2c-1": {0x44: 12345678}, "/dev/i2c-3": {}}
+
+    :param list device_files:
+        The device files of the buses to scan, e.g. ``["/dev/i2c-1"]``.
+    :param str/None cache_file:
+        Path to the JSON cache file, or None (the default) to disable the
+        cache. A missing or invalid cache file is ignored.
+    :param callable/None identify:
+        Function ``identify(connection, address)`` returning a
+        JSON-serializable identity of a discovered device, or None. Raised
+        exceptions are logged and result in the identity None.
+    :param iterable/None addresses:
+        The slave addresses to probe, or None (the default) to probe
+        :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.SCAN_ADDRESSES`.
+    :param bool refresh:
+        If ``True``, the cache is not used for validation but only updated.
+    :param callable transceiver_factory:
+        Function creating a single-channel transceiver (usable in a
+        "with"-statement) for a device file. Defaults to
+        :py:class:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver`.
+    :return:
+        Dict with a dict ``{address: identity}`` for every device file.
+    :rtype: dict
+    :raise:
+        The first exception raised while scanning a bus (after all buses
+        are done).
+    """
+    device_files = list(device_files)
+    addresses = list(I2cConnection.SCAN_ADDRESSES if addresses is None
+                     else addresses)
+    cache = _load_cache(cache_file) if cache_file else {}
+
+    def scan_bus(device_file):
+        cached = None if refresh else cache.get(device_file)
+        with transceiver_factory(device_file) as transceiver:
+            connection = I2cConnection(transceiver)
+            if cached is not None:
+                if connection.scan(sorted(cached)) == sorted(cached):
+                    return cached
+                log.info("Cached devices of {} changed, scanning again."
+                         .format(device_file))
+            found = connection.scan(addresses)
+            return dict((address, _identify(identify, connection, address))
+                        for address in found)
+
+    results = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=max(len(device_files), 1)) as pool:
+        futures = [(f, pool.submit(scan_bus, f)) for f in device_files]
+        for device_file, future in futures:
+            try:
+                results[device_file] = future.result()
+            except Exception as e:
+                log.error("Failed to scan {}: {}".format(device_file, e))
+                error = error or e
+    if error is not None:
+        raise error
+    if cache_file:
+        updated = dict(cache)
+        updated.update(results)
+        if updated != cache:
+            _save_cache(cache_file, updated)
+    return results
+
+
+def _identify(identify, connection, address):
+    """
+    Determine the identity of a device, without raising exceptions.
+    """
+    if identify is None:
+        return None
+    try:
+        return identify(connection, address)
+    except Exception as e:
+        log.warning("Failed to identify device 0x{:02X}: {}".format(
+            address, e))
+        return None
+
+
+def _load_cache(cache_file):
+    """
+    Load the cache file, or return an empty cache if it is missing or
+    invalid.
+    """
+    try:
+        with open(cache_file, "r") as f:
+            content = json.load(f)
+        if content.get("version") != CACHE_FORMAT_VERSION:
+            raise ValueError("Unsupported version.")
+        return dict(
+            (device_file, dict((int(address, 16), identity)
+                               for address, identity in devices.items()))
+            for device_file, devices in content["buses"].items())
+    except (IOError, OSError):
+        return {}
+    except Exception as e:
+        log.warning("Ignoring invalid I2C scan cache {}: {}".format(
+            cache_file, e))
+        return {}
+
+
+def _save_cache(cache_file, cache):
+    """
+    Write the cache file atomically.
+    """
+    content = {
+        "version": CACHE_FORMAT_VERSION,
+        "buses": dict(
+            (device_file, dict(("0x{:02X}".format(address), identity)
+                               for address, identity in devices.items()))
+            for device_file, devices in cache.items()),
+    }
+    temp_file = cache_file + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(content, f, indent=2, sort_keys=True)
+    os.replace(temp_file, cache_file)
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .realtime import RealtimeMode
+from collections import deque
+import argparse
+import errno
+import os
+import selectors
+import socket
+import stat
+import struct
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Magic bytes sent by the server when a client connects.
+PROTOCOL_MAGIC = b"SI2C"
+
+#: Version of the binary protocol between server and clients.
+PROTOCOL_VERSION = 1
+
+# Hello frame (server -> client, sent once after connecting):
+#   magic, protocol version, channel count (0 = single channel),
+#   description length, followed by the UTF-8 encoded description.
+HELLO_FRAME = struct.Struct(">4sBHH")
+
+# Request frame (client -> server):
+#   request ID, slave address, TX length, RX length, read delay, timeout,
+#   followed by the TX data. A length of NONE_LENGTH means "None".
+REQUEST_FRAME = struct.Struct(">IBHHdd")
+
+# Response frame (server -> client):
+#   request ID, multi-channel flag, number of results, followed by one
+#   result frame per channel.
+RESPONSE_FRAME = struct.Struct(">IBH")
+
+# Result frame (part of a response):
+#   status code, error message length, RX length, followed by the UTF-8
+#   encoded error message and the received data.
+RESULT_FRAME = struct.Struct(">BHH")
+
+#: Length value to encode ``None`` for TX data and RX length.
+NONE_LENGTH = 0xFFFF
+
+# Status code used if the transceiver raised an exception.
+_STATUS_UNSPECIFIED_ERROR = 4
+
+
+def pack_result(status, error, rx_data):
+    """
+    Serialize a single transceive result (as returned by an API V1
+    transceiver) into a result frame.
+
+    :param int status: Status code.
+    :param Exception/None error: The error, if any.
+    :param bytes rx_data: The received data.
+    :return: The serialized result.
+    :rtype: bytes
+    """
+    error_bytes = str(error).encode("utf-8")[:0xFFFE] \
+        if error is not None else b""
+    rx_data = rx_data or b""
+    return RESULT_FRAME.pack(status, len(error_bytes), len(rx_data)) + \
+        error_bytes + rx_data
+
+
+def unpack_result(buffer, offset):
+    """
+    Deserialize a single result frame.
+
+    :param bytes-like buffer: The buffer containing the result frame.
+    :param int offset: Offset of the result frame within the buffer.
+    :return:
+        Tuple of the result (status, error, rx_data) and the offset of the
+        first byte after the result frame. ``error`` is an ``IOError`` object
+        containing the error message of the server, or None.
+    :rtype: tuple
+    """
+    status, error_length, rx_length = RESULT_FRAME.unpack_from(buffer, offset)
+    offset += RESULT_FRAME.size
+    error = None
+    if error_length > 0:
+        error = IOError(bytes(buffer[offset:offset + error_length])
+                        .decode("utf-8", "replace"))
+        offset += error_length
+    rx_data = bytes(buffer[offset:offset + rx_length])
+    offset += rx_length
+    return (status, error, rx_data), offset
+
+
+class _Client(object):
+    """
+    State of a connected client.
+    """
+
+    def __init__(self, sock):
+        super(_Client, self).__init__()
+        self.sock = sock
+        self.rx_buffer = bytearray()
+        self.tx_buffer = bytearray()
+
+
+def _remove_stale_socket(socket_path):
+    """
+    Remove a socket file left over by a server which is not running anymore.
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+    if not stat.S_ISSOCK(mode):
+        raise IOError("'{}' exists and is not a socket.".format(socket_path))
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except socket.error as e:
+        if e.errno != errno.ECONNREFUSED:
+            raise
+        log.info("I2cBusServer: Removing stale socket {}".format(socket_path))
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    raise IOError("Another server is listening on '{}'.".format(socket_path))
+
+
+class I2cBusServer(object):
+    """
+    Server which owns an I²C transceiver and lets other processes use it
+    through a Unix domain socket, see
+    :py:class:`~sensirion_i2c_driver.remote_transceiver.RemoteTransceiver`
+    for the client side.
+
+    All requests received from all clients are queued in their order of
+    arrival and executed one after the other on the transceiver. Replies are
+    collected per client and sent with a single socket write per client and
+    loop iteration, so the IPC overhead stays small compared to the bus time.
+
+    The server can be started from the command line::
+
+        python -m sensirion_i2c_driver.bus_server /dev/i2c-1 /tmp/i2c-1.sock
+    """
+
+    def __init__(self, transceiver, socket_path, realtime=None):
+        """
+        Create a server for a given transceiver and bind it to a socket path.
+
+        :param transceiver:
+            An I²C transceiver object with API version 1.
+        :param str socket_path:
+            Path of the Unix domain socket to create. An existing stale
+            socket file at this path (i.e. nobody accepts connections on it)
+            is removed.
+        :param ~sensirion_i2c_driver.realtime.RealtimeMode realtime:
+            Optional real-time mode, applied to the thread running
+            :py:meth:`serve_forever`. Requests are executed within sampling
+            windows (without garbage collection).
+        :raise IOError:
+            If the socket path exists but is no socket, or another server is
+            still listening on it.
+        """
+        super(I2cBusServer, self).__init__()
+        self._transceiver = transceiver
+        self._realtime = realtime
+        self._socket_path = socket_path
+        self._clients = {}
+        self._pending = deque()
+        self._running = False
+        _remove_stale_socket(socket_path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(socket_path)
+        self._listener.listen(16)
+        self._listener.setblocking(False)
+        self._wakeup_rx, self._wakeup_tx = socket.socketpair()
+        self._wakeup_rx.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_rx, selectors.EVENT_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def socket_path(self):
+        """
+        Path of the Unix domain socket.
+
+        :type: str
+        """
+        return self._socket_path
+
+    @property
+    def client_count(self):
+        """
+        Number of currently connected clients.
+
+        :type: int
+        """
+        return len(self._clients)
+
+    def serve_forever(self):
+        """
+        Handle client requests until
+        :py:meth:`~sensirion_i2c_driver.bus_server.I2cBusServer.shutdown` is
+        called (e.g. from another thread).
+        """
+        realtime = self._realtime
+        if realtime is not None:
+            realtime.apply()
+            realtime.freeze()
+        self._running = True
+        try:
+            while self._running:
+                self.handle_events()
+        finally:
+            if realtime is not None:
+                realtime.restore()
+
+    def shutdown(self):
+        """
+        Stop the loop of
+        :py:meth:`~sensirion_i2c_driver.bus_server.I2cBusServer.serve_forever`.
+        This method is thread-safe.
+        """
+        self._running = False
+        self._wakeup_tx.send(b"\x00")
+
+    def handle_events(self, timeout=None):
+        """
+        Wait for socket events, execute all received requests and send the
+        replies.
+
+        :param float/None timeout:
+            Maximum time in Seconds to wait for events, or None to wait
+            forever.
+        """
+        for key, mask in self._selector.select(timeout):
+            if key.fileobj is self._listener:
+                self._accept()
+            elif key.fileobj is self._wakeup_rx:
+                self._wakeup_rx.recv(4096)
+            else:
+                client = key.data
+                if mask & selectors.EVENT_READ:
+                    self._receive(client)
+                if (mask & selectors.EVENT_WRITE) and \
+                        (client.sock in self._clients):
+                    self._flush(client)
+        if self._realtime is not None:
+            with self._realtime.sampling_window():
+                self._execute_pending()
+        else:
+            self._execute_pending()
+
+    def close(self):
+        """
+        Disconnect all clients and remove the socket file.
+        """
+        for client in list(self._clients.values()):
+            self._disconnect(client)
+        self._selector.close()
+        self._listener.close()
+        self._wakeup_rx.close()
+        self._wakeup_tx.close()
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+    def _accept(self):
+        sock, _ = self._listener.accept()
+        sock.setblocking(False)
+        client = _Client(sock)
+        self._clients[sock] = client
+        self._selector.register(sock, selectors.EVENT_READ, client)
+        channel_count = self._transceiver.channel_count or 0
+        description = str(self._transceiver.description).encode("utf-8")
+        client.tx_buffer += HELLO_FRAME.pack(
+            PROTOCOL_MAGIC, PROTOCOL_VERSION, channel_count, len(description))
+        client.tx_buffer += description
+        self._flush(client)
+        log.debug("I2cBusServer: Client connected.")
+
+    def _disconnect(self, client):
+        self._selector.unregister(client.sock)
+        del self._clients[client.sock]
+        client.sock.close()
+        log.debug("I2cBusServer: Client disconnected.")
+
+    def _receive(self, client):
+        try:
+            data = client.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._disconnect(client)
+            return
+        client.rx_buffer += data
+        self._parse_requests(client)
+
+    def _parse_requests(self, client):
+        buffer = client.rx_buffer
+        offset = 0
+        while len(buffer) - offset >= REQUEST_FRAME.size:
+            request_id, slave_address, tx_length, rx_length, read_delay, \
+                timeout = REQUEST_FRAME.unpack_from(buffer, offset)
+            payload_length = tx_length if tx_length != NONE_LENGTH else 0
+            end = offset + REQUEST_FRAME.size + payload_length
+            if len(buffer) < end:
+                break  # request not completely received yet
+            tx_data = bytes(buffer[offset + REQUEST_FRAME.size:end]) \
+                if tx_length != NONE_LENGTH else None
+            self._pending.append((client, request_id, slave_address, tx_data,
+                                  rx_length if rx_length != NONE_LENGTH
+                                  else None, read_delay, timeout))
+            offset = end
+        del buffer[:offset]
+
+    def _execute_pending(self):
+        clients_with_replies = set()
+        while self._pending:
+            client, request_id, slave_address, tx_data, rx_length, \
+                read_delay, timeout = self._pending.popleft()
+            if client.sock not in self._clients:
+                continue  # client disconnected in the meantime
+            try:
+                result = self._transceiver.transceive(
+                    slave_address=slave_address,
+                    tx_data=tx_data,
+                    rx_length=rx_length,
+                    read_delay=read_delay,
+                    timeout=timeout,
+                )
+            except Exception as e:
+                log.warning("I2cBusServer: Transceive failed: {}".format(e))
+                result = (_STATUS_UNSPECIFIED_ERROR, e, b"")
+            if isinstance(result, list):
+                client.tx_buffer += RESPONSE_FRAME.pack(request_id, 1,
+                                                        len(result))
+                for r in result:
+                    client.tx_buffer += pack_result(*r)
+            else:
+                client.tx_buffer += RESPONSE_FRAME.pack(request_id, 0, 1)
+                client.tx_buffer += pack_result(*result)
+            clients_with_replies.add(client)
+        for client in clients_with_replies:
+            self._flush(client)
+
+    def _flush(self, client):
+        if client.tx_buffer:
+            try:
+                sent = client.sock.send(client.tx_buffer)
+                del client.tx_buffer[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self._disconnect(client)
+                return
+        events = selectors.EVENT_READ
+        if client.tx_buffer:
+            events |= selectors.EVENT_WRITE
+        self._selector.modify(client.sock, events, client)
+
+
+def main(argv=None):
+    """
+    Command line entry point to run a bus server for a Linux I²C device.
+
+    :param list/None argv:
+        Command line arguments (without program name), or None to use
+        ``sys.argv``.
+    """
+    from .linux_i2c_transceiver import LinuxI2cTransceiver
+
+    parser = argparse.ArgumentParser(
+        description="Share a Linux I2C device with other processes through "
+                    "a Unix domain socket.")
+    parser.add_argument("device_file", help="I2C device, e.g. /dev/i2c-1")
+    parser.add_argument("socket_path", help="Path of the socket to create")
+    parser.add_argument("--cpu", type=int, action="append",
+                        help="Enable real-time mode and pin the server to "
+                             "this CPU (repeatable)")
+    parser.add_argument("--priority", type=int,
+                        help="Enable real-time mode with this SCHED_FIFO "
+                             "priority")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    realtime = None
+    if (args.cpu is not None) or (args.priority is not None):
+        realtime = RealtimeMode(cpus=args.cpu, priority=args.priority)
+    with LinuxI2cTransceiver(args.device_file) as transceiver:
+        with I2cBusServer(transceiver, args.socket_path,
+                          realtime) as server:
+            log.info("Serving {} on {}".format(args.device_file,
+                                               args.socket_path))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+from collections import namedtuple
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Bus timing of a command, as returned by
+#: :py:meth:`~sensirion_i2c_driver.bus_timing.I2cBusTiming.cost`. All values
+#: are in Seconds: ``wire_time`` is the time the bus transmits bits,
+#: ``read_delay`` and ``post_processing_time`` are taken from the command,
+#: and ``occupancy`` is the time the bus is blocked by the command (wire
+#: time, transfer overhead and read delay).
+I2cCommandCost = namedtuple(
+    "I2cCommandCost",
+    ["wire_time", "read_delay", "post_processing_time", "occupancy"])
+
+
+class I2cBusTiming(object):
+    """
+    Model of the bus time needed by I²C commands at a given SCL clock rate.
+
+    Every transferred byte (including the address byte) takes 9 clock
+    cycles (8 data bits and the ACK bit). A write or read operation
+    additionally takes one cycle for its (repeated) start condition, and
+    every frame takes one cycle for the stop condition. Clock stretching is
+    not taken into account.
+
+    The read delay of a command is counted as bus occupancy, since the
+    command blocks its connection (and e.g. an
+    :py:class:`~sensirion_i2c_driver.scheduler.I2cScheduler`) between the
+    write and the read operation. Some transceivers release the bus itself
+    during the read delay (e.g.
+    :py:class:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver`,
+    so other connections or processes can use it in the meantime), so the
+    occupancy is an upper bound of the actual bus usage. The post processing
+    time is not counted, since other devices can use the bus in the
+    meantime.
+    """
+
+    def __init__(self, scl_frequency=100e3, transfer_overhead=0.0):
+        """
+        Create a bus timing model.
+
+        :param float scl_frequency:
+            The SCL clock frequency in Hz, e.g. 100e3 or 400e3.
+        :param float transfer_overhead:
+            Additional time (in Seconds) per write or read operation, e.g.
+            to take the latency of the kernel driver or of a USB adapter into
+            account. Defaults to 0.0.
+        """
+        super(I2cBusTiming, self).__init__()
+        if scl_frequency <= 0:
+            raise ValueError("SCL frequency must be positive.")
+        self._scl_frequency = float(scl_frequency)
+        self._transfer_overhead = float(transfer_overhead)
+
+    @property
+    def scl_frequency(self):
+        """
+        The SCL clock frequency in Hz.
+
+        :type: float
+        """
+        return self._scl_frequency
+
+    def wire_time(self, command):
+        """
+        Get the time the bus transmits bits for a command.
+
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command.
+        :return: The wire time in Seconds.
+        :rtype: float
+        """
+        cycles = 0
+        if command.tx_data is not None:
+            cycles += 1 + 9 * (1 + len(command.tx_data))
+        if command.rx_length is not None:
+            cycles += 1 + 9 * (1 + command.rx_length)
+        if cycles:
+            cycles += 1  # stop condition
+        return cycles / self._scl_frequency
+
+    def occupancy(self, command):
+        """
+        Get the time the bus is blocked by a command.
+
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command.
+        :return: The occupancy in Seconds.
+        :rtype: float
+        """
+        transfers = (command.tx_data is not None) + \
+            (command.rx_length is not None)
+        return self.wire_time(command) + \
+            transfers * self._transfer_overhead + command.read_delay
+
+    def cost(self, command):
+        """
+        Get the complete bus timing of a command.
+
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command.
+        :rtype: ~sensirion_i2c_driver.bus_timing.I2cCommandCost
+        """
+        return I2cCommandCost(self.wire_time(command), command.read_delay,
+                              command.post_processing_time,
+                              self.occupancy(command))
+
+    def utilization(self, workload):
+        """
+        Get the projected bus utilization of periodic commands.
+
+        :param iterable workload:
+            Tuples ``(command, period)``, with the period in Seconds. Use a
+            list of commands to declare several commands executed once per
+            period (e.g. a trigger and a fetch command).
+        :return:
+            The fraction of time the bus is occupied (1.0 means 100%).
+        :rtype: float
+        """
+        total = 0.0
+        for commands, period in workload:
+            if not isinstance(commands, (list, tuple)):
+                commands = [commands]
+            total += sum(self.occupancy(c) for c in commands) / period
+        return total
+
+
+class I2cAdmissionController(object):
+    """
+    Accepts or rejects periodic commands, depending on whether the bus
+    utilization stays below a limit (see
+    :py:meth:`~sensirion_i2c_driver.bus_timing.I2cBusTiming.utilization`).
+
+    Example:
+
+    .. code-block:: python
+
+        controller = I2cAdmissionController(I2cBusTiming(400e3), 0.7)
+        if not controller.admit([trigger, fetch], period=0.1):
+            raise RuntimeError("Sensor does not fit on the bus.")
+    """
+
+    def __init__(self, timing, max_utilization=0.7):
+        """
+        Create an admission controller.
+
+        :param ~sensirion_i2c_driver.bus_timing.I2cBusTiming timing:
+            The bus timing model.
+        :param float max_utilization:
+            Maximum projected utilization of the admitted workload. Some
+            headroom below 1.0 is recommended for non-periodic commands and
+            software latencies.
+        """
+        super(I2cAdmissionController, self).__init__()
+        self._timing = timing
+        self._max_utilization = float(max_utilization)
+        self._lock = threading.Lock()
+        self._workload = []
+        self._utilization = 0.0
+
+    @property
+    def utilization(self):
+        """
+        Projected utilization of the admitted workload.
+
+        :type: float
+        """
+        return self._utilization
+
+    @property
+    def workload(self):
+        """
+        The admitted workload as list of ``(commands, period)`` tuples.
+
+        :type: list
+        """
+        with self._lock:
+            return list(self._workload)
+
+    def fits(self, commands, period):
+        """
+        Check whether periodic commands could be admitted, without admitting
+        them.
+
+        :param commands:
+            An :py:class:`~sensirion_i2c_driver.command.I2cCommand` or a list
+            of commands, executed once per period.
+        :param float period: The period in Seconds.
+        :rtype: bool
+        """
+        return self._utilization + \
+            self._timing.utilization([(commands, period)]) <= \
+            self._max_utilization
+
+    def admit(self, commands, period):
+        """
+        Admit periodic commands if the utilization stays within the limit.
+
+        :param commands:
+            An :py:class:`~sensirion_i2c_driver.command.I2cCommand` or a list
+            of commands, executed once per period.
+        :param float period: The period in Seconds.
+        :return: Whether the commands were admitted.
+        :rtype: bool
+        """
+        utilization = self._timing.utilization([(commands, period)])
+        with self._lock:
+            if self._utilization + utilization > self._max_utilization:
+                log.info("I2cAdmissionController: Rejected workload with "
+                         "utilization {:.3f} (admitted: {:.3f})".format(
+                             utilization, self._utilization))
+                return False
+            self._workload.append((commands, period))
+            self._utilization += utilization
+            return True
+
+    def remove(self, commands, period):
+        """
+        Remove previously admitted commands.
+
+        :param commands: The commands passed to :py:meth:`admit`.
+        :param float period: The period passed to :py:meth:`admit`.
+        :raise ValueError: If the commands were not admitted.
+        """
+        with self._lock:
+            self._workload.remove((commands, period))
+            self._utilization = self._timing.utilization(self._workload)
+
+
+class I2cRateLimiter(object):
+    """
+    Token bucket limiting the bus utilization of an
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection` at runtime
+    (see
+    :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.rate_limiter`).
+
+    The tokens are bus time: They are refilled with ``utilization`` Seconds
+    per Second, up to ``burst`` Seconds. Every command consumes its
+    occupancy (see
+    :py:meth:`~sensirion_i2c_driver.bus_timing.I2cBusTiming.occupancy`). If
+    not enough tokens are available, the command waits until they are
+    refilled.
+    """
+
+    def __init__(self, timing, utilization, burst=0.01, clock=None):
+        """
+        Create a rate limiter.
+
+        :param ~sensirion_i2c_driver.bus_timing.I2cBusTiming timing:
+            The bus timing model.
+        :param float utilization:
+            The maximum long-term bus utilization (e.g. 0.5 for 50%).
+        :param float burst:
+            The bus time (in Seconds) which may be used at once after an
+            idle period.
+        :param clock:
+            Clock used for waiting, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        """
+        super(I2cRateLimiter, self).__init__()
+        if utilization <= 0:
+            raise ValueError("Utilization must be positive.")
+        self._timing = timing
+        self._rate = float(utilization)
+        self._burst = float(burst)
+        self._clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._tokens = self._burst
+        self._last_refill = self._clock.monotonic()
+        self._throttled = 0
+        self._total_wait = 0.0
+
+    @property
+    def timing(self):
+        """
+        The bus timing model.
+
+        :type: ~sensirion_i2c_driver.bus_timing.I2cBusTiming
+        """
+        return self._timing
+
+    @property
+    def stats(self):
+        """
+        Statistics about the rate limiting.
+
+        :return:
+            Dict with the number of ``throttled`` acquisitions and the
+            ``total_wait`` time in Seconds.
+        :rtype: dict
+        """
+        with self._lock:
+            return {"throttled": self._throttled,
+                    "total_wait": self._total_wait}
+
+    def acquire(self, commands):
+        """
+        Consume the bus time of commands, waiting if the bucket does not
+        contain enough tokens.
+
+        :param list commands: The commands to be executed.
+        """
+        cost = sum(self._timing.occupancy(c) for c in commands)
+        with self._lock:
+            now = self._clock.monotonic()
+            self._tokens = min(
+                self._burst,
+                self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+            # Reserve the tokens immediately (possibly going into debt), so
+            # concurrent callers are served in order.
+            self._tokens -= cost
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+            if wait > 0.0:
+                self._throttled += 1
+                self._total_wait += wait
+        if wait > 0.0:
+            self._clock.sleep(wait)
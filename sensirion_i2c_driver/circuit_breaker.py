@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class _AddressHealth(object):
+    """
+    Health state of a single slave address.
+    """
+
+    def __init__(self):
+        super(_AddressHealth, self).__init__()
+        self.state = I2cCircuitBreaker.STATE_CLOSED
+        self.failures = 0
+        self.backoff = 0.0
+        self.retry_time = 0.0
+
+
+class I2cCircuitBreaker(object):
+    """
+    Per-address health tracker, used by
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection` (see
+    :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.circuit_breaker`)
+    to stop wasting bus time on devices which do not respond.
+
+    After a configurable number of consecutive failed transfers (NACK or
+    timeout), the circuit of the slave address is *opened*: Further commands
+    fail immediately with
+    :py:class:`~sensirion_i2c_driver.errors.I2cDeviceUnavailableError`
+    without accessing the bus. After a backoff time, a single command is let
+    through as probe (*half-open*). If it succeeds, the circuit is *closed*
+    again, otherwise it is opened again with an exponentially increased
+    backoff time.
+    """
+
+    STATE_CLOSED = "closed"  #: Device is healthy, commands are executed.
+    STATE_OPEN = "open"  #: Device is unavailable, commands fail fast.
+    STATE_HALF_OPEN = "half-open"  #: A probe command is being executed.
+
+    def __init__(self, failure_threshold=3, initial_backoff=1.0,
+                 max_backoff=60.0, backoff_factor=2.0, clock=None):
+        """
+        Create a circuit breaker.
+
+        :param int failure_threshold:
+            Number of consecutive failed transfers to open the circuit.
+        :param float initial_backoff:
+            Time (in Seconds) until the first probe after opening the circuit.
+        :param float max_backoff:
+            Maximum time (in Seconds) between two probes.
+        :param float backoff_factor:
+            Factor to increase the backoff time after every failed probe.
+        :param clock:
+            Clock used for the backoff times, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        """
+        super(I2cCircuitBreaker, self).__init__()
+        self._failure_threshold = int(failure_threshold)
+        self._initial_backoff = float(initial_backoff)
+        self._max_backoff = float(max_backoff)
+        self._backoff_factor = float(backoff_factor)
+        self._clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._addresses = {}
+        self._transitions = {}
+        self._rejected = 0
+
+    @property
+    def stats(self):
+        """
+        Statistics about the circuit breaker.
+
+        :return:
+            Dict with the number of ``rejected`` commands and the number of
+            state ``transitions`` (a dict with keys like ``"closed->open"``).
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "rejected": self._rejected,
+                "transitions": dict(self._transitions),
+            }
+
+    def state(self, slave_address):
+        """
+        Get the state of a slave address.
+
+        :param byte slave_address: The slave address.
+        :return:
+            One of :py:attr:`STATE_CLOSED`, :py:attr:`STATE_OPEN` or
+            :py:attr:`STATE_HALF_OPEN`.
+        :rtype: str
+        """
+        with self._lock:
+            health = self._addresses.get(slave_address)
+            return health.state if health else self.STATE_CLOSED
+
+    def allow(self, slave_address):
+        """
+        Check whether a command may be executed on a slave address. If this
+        returns ``True``, the outcome must be reported with
+        :py:meth:`record_success` or :py:meth:`record_failure`.
+
+        :param byte slave_address: The slave address.
+        :return: Whether the command may access the bus.
+        :rtype: bool
+        """
+        with self._lock:
+            health = self._addresses.get(slave_address)
+            if (health is None) or (health.state == self.STATE_CLOSED):
+                return True
+            if (health.state == self.STATE_OPEN) and \
+                    (self._clock.monotonic() >= health.retry_time):
+                self._set_state(slave_address, health, self.STATE_HALF_OPEN)
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self, slave_address):
+        """
+        Report a successful transfer.
+
+        :param byte slave_address: The slave address.
+        """
+        with self._lock:
+            health = self._addresses.get(slave_address)
+            if health is not None:
+                health.failures = 0
+                health.backoff = 0.0
+                self._set_state(slave_address, health, self.STATE_CLOSED)
+
+    def record_failure(self, slave_address):
+        """
+        Report a failed transfer (e.g. NACK or timeout).
+
+        :param byte slave_address: The slave address.
+        """
+        with self._lock:
+            health = self._addresses.setdefault(slave_address,
+                                                _AddressHealth())
+            health.failures += 1
+            if health.state == self.STATE_HALF_OPEN:
+                backoff = min(health.backoff * self._backoff_factor,
+                              self._max_backoff)
+            elif (health.state == self.STATE_CLOSED) and \
+                    (health.failures >= self._failure_threshold):
+                backoff = min(self._initial_backoff, self._max_backoff)
+            else:
+                return
+            health.backoff = backoff
+            health.retry_time = self._clock.monotonic() + backoff
+            self._set_state(slave_address, health, self.STATE_OPEN)
+
+    def reset(self, slave_address=None):
+        """
+        Close the circuit of a slave address (or of all addresses), e.g.
+        after a device was replaced.
+
+        :param byte/None slave_address:
+            The slave address, or None to reset all addresses.
+        """
+        with self._lock:
+            if slave_address is None:
+                self._addresses.clear()
+            else:
+                self._addresses.pop(slave_address, None)
+
+    def _set_state(self, slave_address, health, state):
+        """
+        Change the state of a slave address and count the transition. Must
+        be called with the lock held.
+        """
+        if health.state != state:
+            transition = "{}->{}".format(health.state, state)
+            self._transitions[transition] = \
+                self._transitions.get(transition, 0) + 1
+            log.debug("I2cCircuitBreaker: Slave address 0x{:02X}: {}".format(
+                slave_address, transition))
+            health.state = state
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import threading
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class SystemClock(object):
+    """
+    Clock using the real time of the system. This is the default clock of
+    all classes in this package which wait or take timestamps.
+
+    Custom clocks (e.g.
+    :py:class:`~sensirion_i2c_driver.clock.VirtualClock`) must provide the
+    same methods.
+    """
+
+    def __init__(self):
+        super(SystemClock, self).__init__()
+
+    def monotonic(self):
+        """
+        Get the value of a monotonic clock, used for measuring durations.
+
+        :return: Time in Seconds (with undefined reference point).
+        :rtype: float
+        """
+        return time.monotonic()
+
+    def perf_counter_ns(self):
+        """
+        Get the value of a high-resolution performance counter, used for
+        tracing.
+
+        :return: Time in Nanoseconds (with undefined reference point).
+        :rtype: int
+        """
+        return time.perf_counter_ns()
+
+    def time(self):
+        """
+        Get the wall clock time, used for timestamps of samples.
+
+        :return: Time in Seconds since the epoch.
+        :rtype: float
+        """
+        return time.time()
+
+    def sleep(self, seconds):
+        """
+        Suspend the calling thread.
+
+        :param float seconds: Time to sleep (in Seconds).
+        """
+        time.sleep(seconds)
+
+
+class VirtualClock(object):
+    """
+    Clock with a virtual time which advances instantly when sleeping. This
+    allows to run simulations and tests of long schedules (e.g. hours of
+    periodic measurements) within milliseconds.
+
+    .. note:: All threads using the same virtual clock share its time.
+              Sleeping advances the time immediately without waiting for
+              other threads, so concurrent schedules are not synchronized.
+    """
+
+    def __init__(self, start=0.0, epoch=0.0):
+        """
+        Create a virtual clock.
+
+        :param float start: Initial value of :py:meth:`monotonic`.
+        :param float epoch:
+            Value of :py:meth:`time` when :py:meth:`monotonic` is zero.
+        """
+        super(VirtualClock, self).__init__()
+        self._now = float(start)
+        self._epoch = float(epoch)
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        """
+        Get the current virtual time.
+
+        :return: Time in Seconds.
+        :rtype: float
+        """
+        return self._now
+
+    def perf_counter_ns(self):
+        """
+        Get the current virtual time in Nanoseconds.
+
+        :rtype: int
+        """
+        return int(round(self._now * 1e9))
+
+    def time(self):
+        """
+        Get the virtual wall clock time.
+
+        :return: Time in Seconds since the epoch.
+        :rtype: float
+        """
+        return self._epoch + self._now
+
+    def sleep(self, seconds):
+        """
+        Advance the virtual time without actually sleeping.
+
+        :param float seconds: Time to sleep (in Seconds).
+        """
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        """
+        Advance the virtual time.
+
+        :param float seconds: Time to advance (in Seconds).
+        :raise ValueError: If ``seconds`` is negative.
+        """
+        if seconds < 0:
+            raise ValueError("Cannot go back in time.")
+        with self._lock:
+            self._now += seconds
+
+
+#: Default clock used if no clock is passed to a constructor.
+SYSTEM_CLOCK = SystemClock()
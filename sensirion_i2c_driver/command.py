@@ -9,8 +9,11 @@ class I2cCommand(object):
     Base class for all I²C commands.
     """
 
+    #: Value for ``cache_ttl`` to cache the response forever.
+    CACHE_FOREVER = float("inf")
+
     def __init__(self, tx_data, rx_length, read_delay, timeout,
-                 post_processing_time=0.0):
+                 post_processing_time=0.0, cache_ttl=None, rereadable=False):
         """
         Constructs a new I²C command.
 
@@ -40,13 +43,32 @@ class I2cCommand(object):
             example after a device reset command, the device might need some
             time until it is ready again. Usually this is 0.0s, i.e. no post
             processing is needed.
+        :param float/None cache_ttl:
+            Time (in Seconds) the response of this command may be served from
+            the response cache of the connection (see
+            :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.response_cache`),
+            or :py:attr:`CACHE_FOREVER` if the response never changes (e.g.
+            for serial numbers). None (the default) means that the command
+            is not cacheable.
+        :param bool rereadable:
+            Whether the device allows to read the response again without
+            sending the command again (i.e. it keeps the response until the
+            next command). If set, a
+            :py:class:`~sensirion_i2c_driver.retry_policy.I2cRetryPolicy`
+            retries checksum errors by repeating only the read operation.
+            Defaults to False.
         """
         super(I2cCommand, self).__init__()
 
         #: The data bytes to be send to the device (bytes/None).
-        # Note: Typecasts are needed to allow arbitrary iterables.
-        self.tx_data = bytes(bytearray(tx_data)) \
-            if tx_data is not None else None
+        # Note: Typecasts are needed to allow arbitrary iterables, but bytes-
+        # like objects are converted directly to avoid an additional copy.
+        if tx_data is None:
+            self.tx_data = None
+        elif isinstance(tx_data, (bytes, bytearray)):
+            self.tx_data = bytes(tx_data)
+        else:
+            self.tx_data = bytes(bytearray(tx_data))
 
         #: Number of bytes to be read from the device (int/None).
         self.rx_length = int(rx_length) if rx_length is not None else None
@@ -60,6 +82,12 @@ class I2cCommand(object):
         #: Time in Seconds how long the post processing takes (float).
         self.post_processing_time = float(post_processing_time)
 
+        #: Time in Seconds the response may be cached (float/None).
+        self.cache_ttl = float(cache_ttl) if cache_ttl is not None else None
+
+        #: Whether the response can be read again without resending (bool).
+        self.rereadable = bool(rereadable)
+
     def interpret_response(self, data):
         """
         Interprets the raw response from the device and returns it in the
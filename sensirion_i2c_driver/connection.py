@@ -3,9 +3,10 @@
 
 from __future__ import absolute_import, division, print_function
 from .errors import I2cTransceiveError, I2cChannelDisabledError, \
-    I2cNackError, I2cTimeoutError
+    I2cNackError, I2cTimeoutError, I2cDeviceUnavailableError
 from .transceiver_v1 import I2cTransceiverV1
-import time
+from .clock import SYSTEM_CLOCK
+from collections import OrderedDict
 
 import logging
 log = logging.getLogger(__name__)
@@ -20,17 +21,42 @@ class I2cConnection(object):
     and multi channel. See :ref:`single_multi_channel_mode` for details.
     """
 
-    def __init__(self, transceiver):
+    #: Default slave addresses probed by
+    #: :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.scan` (the
+    #: 7-bit address space without reserved addresses).
+    SCAN_ADDRESSES = tuple(range(0x08, 0x78))
+
+    def __init__(self, transceiver, clock=None):
         """
         Creates an I²C connection object.
 
         :param transceiver:
             An I²C transceiver object of any API version (type depends on the
             used hardware).
+        :param clock:
+            Clock used for all delays (e.g. post processing and retry
+            backoff), see :py:mod:`~sensirion_i2c_driver.clock`. Defaults to
+            None, which means to use the system clock.
         """
         super(I2cConnection, self).__init__()
         self._transceiver = transceiver
+        self._clock = clock or SYSTEM_CLOCK
         self._always_multi_channel_response = False
+        self._response_cache = None
+        self._request_coalescer = None
+        self._circuit_breaker = None
+        self._retry_policy = None
+        self._rate_limiter = None
+        self._tracer = None
+
+    @property
+    def clock(self):
+        """
+        The clock used for delays.
+
+        :type: ~sensirion_i2c_driver.clock.SystemClock
+        """
+        return self._clock
 
     @property
     def always_multi_channel_response(self):
@@ -51,6 +77,118 @@ class I2cConnection(object):
     def always_multi_channel_response(self, value):
         self._always_multi_channel_response = value
 
+    @property
+    def response_cache(self):
+        """
+        Optional cache for the responses of cacheable commands (i.e. commands
+        with a ``cache_ttl``, see
+        :py:class:`~sensirion_i2c_driver.command.I2cCommand`). If set,
+        repeated executions of such commands are served from the cache
+        without accessing the bus. Defaults to None (no caching).
+
+        Entries can be removed explicitly, e.g. after a device reset, with
+        :py:meth:`~sensirion_i2c_driver.response_cache.I2cResponseCache.invalidate`.
+
+        :type: ~sensirion_i2c_driver.response_cache.I2cResponseCache/None
+        """
+        return self._response_cache
+
+    @response_cache.setter
+    def response_cache(self, value):
+        self._response_cache = value
+
+    @property
+    def request_coalescer(self):
+        """
+        Optional coalescer for identical concurrent read requests. If set,
+        commands with RX data which are executed while an identical command
+        (same slave address, TX data and RX length) is already running in
+        another thread, do not access the bus but return the result of the
+        running command. Defaults to None (no coalescing).
+
+        :type: ~sensirion_i2c_driver.request_coalescer.I2cRequestCoalescer/None
+        """
+        return self._request_coalescer
+
+    @request_coalescer.setter
+    def request_coalescer(self, value):
+        self._request_coalescer = value
+
+    @property
+    def circuit_breaker(self):
+        """
+        Optional per-address health tracker. If set, commands to slave
+        addresses which repeatedly failed with NACK or timeout errors fail
+        fast with
+        :py:class:`~sensirion_i2c_driver.errors.I2cDeviceUnavailableError`
+        without accessing the bus, until a probe succeeds again. Defaults to
+        None (disabled).
+
+        :type: ~sensirion_i2c_driver.circuit_breaker.I2cCircuitBreaker/None
+        """
+        return self._circuit_breaker
+
+    @circuit_breaker.setter
+    def circuit_breaker(self, value):
+        self._circuit_breaker = value
+
+    @property
+    def retry_policy(self):
+        """
+        Optional policy to retry failed commands. If set, commands which fail
+        with one of the exception types configured in the policy are executed
+        again (after a backoff time), before the exception is raised. Checksum
+        errors of commands which declare their response as ``rereadable``
+        only repeat the read operation. Defaults to None (no retries).
+
+        .. note:: Retries are only done in single-channel mode. In
+                  multi-channel mode and for batches, errors are returned
+                  per channel and the command is never repeated.
+
+        :type: ~sensirion_i2c_driver.retry_policy.I2cRetryPolicy/None
+        """
+        return self._retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, value):
+        self._retry_policy = value
+
+    @property
+    def rate_limiter(self):
+        """
+        Optional limiter for the bus utilization. If set, every bus access
+        of :py:meth:`execute`, :py:meth:`execute_batch`,
+        :py:meth:`execute_per_channel` and :py:meth:`execute_chunked` first
+        waits until the limiter grants the bus time of its commands.
+        Responses served from the response cache or by the request coalescer
+        are not limited. Defaults to None (no limit).
+
+        :type: ~sensirion_i2c_driver.bus_timing.I2cRateLimiter/None
+        """
+        return self._rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, value):
+        self._rate_limiter = value
+
+    @property
+    def tracer(self):
+        """
+        Optional tracer to record the phases of executed commands (bus
+        transfer, response interpretation, post processing and retry
+        backoff). To also record the phases within the bus transfer, assign
+        the tracer to the transceiver as well (if supported, e.g.
+        :py:attr:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver.tracer`).
+        Defaults to None (no tracing).
+
+        :type: ~sensirion_i2c_driver.tracing.I2cTracer/None
+        """
+        return self._tracer
+
+    @tracer.setter
+    def tracer(self, value):
+        self._tracer = value
+
     @property
     def is_multi_channel(self):
         """
@@ -65,7 +203,7 @@ class I2cConnection(object):
         :return: True if multi-channel, False if single-channel.
         :rtype: Bool
         """
-        if self._transceiver.API_VERSION == 1:
+        if self._transceiver.API_VERSION in (1, 2):
             return (self._always_multi_channel_response) or \
                 (self._transceiver.channel_count is not None)
         else:
@@ -102,19 +240,424 @@ class I2cConnection(object):
             In single-channel mode, an exception is raised in case of
             communication errors.
         """
-        response = self._transceive(
-            slave_address=slave_address,
-            tx_data=command.tx_data,
-            rx_length=command.rx_length,
-            read_delay=command.read_delay,
-            timeout=command.timeout,
-        )
+        tracer = self._tracer
+        start = tracer.now() if tracer is not None else 0
+        try:
+            policy = self._retry_policy
+            if (policy is not None) and (not self.is_multi_channel):
+                return self._execute_with_retries(slave_address, command,
+                                                  wait_post_process, policy)
+            return self._execute_once(slave_address, command,
+                                      wait_post_process)
+        finally:
+            if tracer is not None:
+                tracer.record("execute", start, self._transceiver.description,
+                              {"slave_address": slave_address})
+
+    def _execute_once(self, slave_address, command, wait_post_process):
+        """
+        Helper function to execute a command a single time, using the
+        response cache and the request coalescer (if any).
+        """
+        cache = self._response_cache \
+            if command.cache_ttl is not None else None
+        if cache is not None:
+            response = cache.get(slave_address, command.tx_data,
+                                 command.rx_length)
+            if response is not None:
+                return self._interpret_response(command, response)
+        coalescer = self._request_coalescer \
+            if command.rx_length is not None else None
+        if coalescer is not None:
+            response = coalescer.execute(
+                (slave_address, command.tx_data, command.rx_length),
+                lambda: self._execute_on_bus(slave_address, command),
+                lambda r: not self._has_error(r))
+        else:
+            response = self._execute_on_bus(slave_address, command)
         if wait_post_process and command.post_processing_time > 0.0:
             # Wait for post processing in the device (to be sure the device is
             # ready for receiving the next command).
-            time.sleep(command.post_processing_time)
+            self._sleep("post_process", command.post_processing_time)
+        tracer = self._tracer
+        start = tracer.now() if tracer is not None else 0
+        try:
+            result = self._interpret_response(command, response)
+        finally:
+            if tracer is not None:
+                tracer.record("interpret", start,
+                              self._transceiver.description)
+        if (cache is not None) and (not self._has_error(result)):
+            # Only cache responses which could be interpreted successfully
+            cache.put(slave_address, command.tx_data, command.rx_length,
+                      response, command.cache_ttl)
+        return result
+
+    def execute_batch(self, requests, wait_post_process=True):
+        """
+        Execute several I²C commands, possibly on different devices, one
+        after the other.
+
+        With transceivers of API version 2 (see
+        :py:class:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2`),
+        all commands are passed to the transceiver with a single call, which
+        allows it to avoid per-command overhead. Only commands which need
+        time for post processing split the batch into several calls.
+
+        .. note:: The response cache and the request coalescer are not used
+                  for batches.
+
+        :param list requests:
+            List of tuples ``(slave_address, command)`` to execute.
+        :param bool wait_post_process:
+            If ``True`` and a command needs some time for post processing,
+            this method waits until post processing is done before executing
+            the next command.
+        :return:
+            A list with one response per request. In contrast to
+            :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute`,
+            errors are never raised but returned as Exception objects, so the
+            data of successful commands is not lost. In multi-channel mode,
+            every response is a list with one entry per channel.
+        """
+        requests = list(requests)
+        responses = []
+        if self._transceiver.API_VERSION == 2:
+            start = 0
+            for i, (_, command) in enumerate(requests):
+                needs_wait = wait_post_process and \
+                    command.post_processing_time > 0.0
+                if needs_wait or (i == len(requests) - 1):
+                    self._throttle([c for _, c in requests[start:i + 1]])
+                    responses.extend(
+                        self._transceive_batch_v2(requests[start:i + 1]))
+                    start = i + 1
+                if needs_wait:
+                    self._sleep("post_process", command.post_processing_time)
+        else:
+            for slave_address, command in requests:
+                self._throttle([command])
+                responses.append(
+                    self._transceive_command(slave_address, command))
+                if wait_post_process and command.post_processing_time > 0.0:
+                    self._sleep("post_process", command.post_processing_time)
+        return [self._interpret_batch_response(command, response)
+                for (_, command), response in zip(requests, responses)]
+
+    def execute_per_channel(self, requests, wait_post_process=True):
+        """
+        Execute different I²C commands (or the same command on different
+        slave addresses) on the channels of a multi-channel transceiver.
+
+        Channels with identical frames are grouped and executed together, so
+        the number of transceiver calls is the number of distinct frames.
+        With transceivers of API version 2 (see
+        :py:class:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2`),
+        all groups are passed to the transceiver with a single call, using
+        channel masks. With API version 1, every group is executed on all
+        channels and the responses of the other channels are discarded.
+
+        :param list requests:
+            List with one entry per channel of the transceiver. Each entry is
+            either a tuple ``(slave_address, command)``, or None to skip the
+            channel.
+        :param bool wait_post_process:
+            If ``True`` and a command needs some time for post processing,
+            this method waits until post processing of all commands is done.
+        :return:
+            A list with one entry per channel, containing the interpreted
+            response of the channel's command (on success), an Exception
+            object (on error), or None for skipped channels.
+        :raise ValueError:
+            If the transceiver is not a multi-channel transceiver, or the
+            number of requests does not match its channel count.
+        """
+        channel_count = self._transceiver.channel_count
+        if channel_count is None:
+            raise ValueError("Per-channel execution requires a multi-channel "
+                             "transceiver.")
+        requests = list(requests)
+        if len(requests) != channel_count:
+            raise ValueError("Expected {} requests (one per channel), got {}."
+                             .format(channel_count, len(requests)))
+        groups = OrderedDict()  # frame -> list of channels
+        for channel, request in enumerate(requests):
+            if request is not None:
+                slave_address, command = request
+                frame = (slave_address, command.tx_data, command.rx_length,
+                         command.read_delay, command.timeout)
+                groups.setdefault(frame, []).append(channel)
+        responses = [None] * channel_count
+        self._throttle([requests[channels[0]][1]
+                        for channels in groups.values()])
+        if self._transceiver.API_VERSION == 2:
+            frames = list(groups.keys())
+            masks = [sum(1 << ch for ch in groups[f]) for f in frames]
+            rx_buffers = [self._create_rx_buffer_v2(f[2]) for f in frames]
+            for frame in frames:
+                self._log_send(*frame)
+            results = self._transceiver.transceive_batch(frames, rx_buffers,
+                                                         masks)
+            for frame, rx_buffer, result in zip(frames, rx_buffers, results):
+                response = self._convert_result_v2(result, rx_buffer,
+                                                   frame[2])
+                self._log_received(response)
+                for channel in groups[frame]:
+                    responses[channel] = response[channel]
+        else:
+            for frame, channels in groups.items():
+                response = self._transceive(*frame)
+                for channel in channels:
+                    responses[channel] = response[channel]
+        post_processing_time = max(
+            [r[1].post_processing_time for r in requests if r is not None] +
+            [0.0])
+        if wait_post_process and post_processing_time > 0.0:
+            self._sleep("post_process", post_processing_time)
+        return [self._interpret_single_response(request[1], response)
+                if request is not None else None
+                for request, response in zip(requests, responses)]
+
+    def execute_chunked(self, slave_address, command, chunk_size,
+                        wait_post_process=True):
+        """
+        Execute an I²C command, but read its response in several chunks.
+        This is intended for devices which allow to continue reading a long
+        buffer (e.g. a FIFO) with subsequent read operations. Compared to
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute`,
+        memory usage is bounded by the chunk size and the first data is
+        available earlier.
+
+        The first chunk is read together with the TX data of the command
+        (after its read delay), all further chunks are read without sending
+        any TX data. The total number of read bytes is given by the RX length
+        of the command.
+
+        .. note:: This method is only supported for single-channel
+                  connections.
+
+        :param byte slave_address:
+            The slave address of the device to communicate with.
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to execute.
+        :param int chunk_size:
+            Maximum number of bytes to read per read operation. For Sensirion
+            commands with CRC, this should be a multiple of 3.
+        :param bool wait_post_process:
+            If ``True`` and the passed command needs some time for post
+            processing, this method waits until post processing is done
+            after the last chunk.
+        :return:
+            A generator yielding the raw received chunks (bytes). Use e.g.
+            :py:meth:`~sensirion_i2c_driver.sensirion_command.SensirionI2cCommand.interpret_response_chunks`
+            to validate and decode them.
+        :raise ValueError:
+            Immediately (not only when iterating) if the connection is
+            multi-channel or the chunk size is invalid.
+        :raise:
+            An exception is raised in case of communication errors.
+        """
+        if self.is_multi_channel:
+            raise ValueError("Chunked execution is not supported for "
+                             "multi-channel connections.")
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be positive.")
+        self._throttle([command])
+        return self._execute_chunks(slave_address, command, chunk_size,
+                                    wait_post_process)
+
+    def _execute_chunks(self, slave_address, command, chunk_size,
+                        wait_post_process):
+        """
+        Generator reading the chunks of
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_chunked`.
+        """
+        remaining = command.rx_length or 0
+        tx_data = command.tx_data
+        read_delay = command.read_delay
+        while True:
+            length = min(chunk_size, remaining)
+            response = self._transceive(
+                slave_address=slave_address,
+                tx_data=tx_data,
+                rx_length=length if command.rx_length is not None else None,
+                read_delay=read_delay,
+                timeout=command.timeout,
+            )
+            if isinstance(response, Exception):
+                raise response
+            remaining -= length
+            if len(response):
+                yield response
+            if remaining <= 0:
+                break
+            tx_data = None
+            read_delay = 0.0
+        if wait_post_process and command.post_processing_time > 0.0:
+            self._sleep("post_process", command.post_processing_time)
+
+    def scan(self, addresses=None):
+        """
+        Detect which slave addresses are acknowledged by a device, using
+        zero-length write transfers ("quick write").
+
+        If the transceiver provides a ``scan()`` method (e.g.
+        :py:meth:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver.scan`),
+        it is used to probe all addresses with the least overhead. Otherwise,
+        every address is probed with an empty write frame through the
+        transceiver API. The response cache, request coalescer, circuit
+        breaker and retry policy are not used.
+
+        :param iterable/None addresses:
+            The slave addresses to probe, or None (the default) to probe
+            :py:attr:`SCAN_ADDRESSES`.
+        :return:
+            - In single channel mode: A list of the acknowledged addresses.
+            - In multi-channel mode: A list containing the list of
+              acknowledged addresses for every channel.
+        :raise:
+            In single-channel mode, an exception is raised in case of other
+            communication errors than NACK.
+        """
+        addresses = list(self.SCAN_ADDRESSES if addresses is None
+                         else addresses)
+        channel_count = self._transceiver.channel_count
+        if (channel_count is None) and \
+                hasattr(self._transceiver, "scan"):
+            found = list(self._transceiver.scan(addresses))
+            return [found] if self._always_multi_channel_response else found
+        found = [[] for _ in range(channel_count or 1)]
+        for address in addresses:
+            response = self._transceive(address, b"", None, 0.0, 0.0)
+            if channel_count is None:
+                if isinstance(response, Exception) and \
+                        not isinstance(response, I2cNackError) and \
+                        not self._always_multi_channel_response:
+                    raise response
+                response = [response]
+            for channel, r in enumerate(response):
+                if not isinstance(r, Exception):
+                    found[channel].append(address)
+        return found if self.is_multi_channel else found[0]
+
+    def _execute_with_retries(self, slave_address, command, wait_post_process,
+                              policy):
+        """
+        Helper function to execute a command in single-channel mode and retry
+        it according to the retry policy.
+        """
+        start_time = self._clock.monotonic()
+        retries = {}  # retry count per configured exception type
+        retry = 0
+        reread = False
+        while True:
+            try:
+                if reread:
+                    return self._reread(slave_address, command)
+                return self._execute_once(slave_address, command,
+                                          wait_post_process)
+            except Exception as e:
+                key = policy.retry_key(e)
+                if (key is None) or \
+                        (retries.get(key, 0) >= policy.max_retries(key)):
+                    if retry > 0:
+                        policy.record_exhausted()
+                    raise
+                retries[key] = retries.get(key, 0) + 1
+                retry += 1
+                backoff = policy.backoff_time(retry)
+                if (policy.deadline is not None) and \
+                        (self._clock.monotonic() - start_time + backoff >
+                         policy.deadline):
+                    policy.record_exhausted()
+                    raise
+                reread = policy.is_reread(e, command)
+                policy.record_retry(reread)
+                log.debug("I2cConnection: Retry {} ({}) after {}: {}".format(
+                    retry, "read only" if reread else "full", type(e).__name__,
+                    e))
+                if backoff > 0.0:
+                    self._sleep("retry_backoff", backoff)
+
+    def _reread(self, slave_address, command):
+        """
+        Helper function to repeat only the read operation of a command.
+        """
+        response = self._execute_on_bus(slave_address, command, reread=True)
         return self._interpret_response(command, response)
 
+    def _execute_on_bus(self, slave_address, command, reread=False):
+        """
+        Helper function to transceive the raw data of a command, guarded by
+        the circuit breaker (if any).
+        """
+        breaker = self._circuit_breaker
+        if breaker is None:
+            self._throttle([command])
+            return self._transceive_command(slave_address, command, reread)
+        if not breaker.allow(slave_address):
+            error = I2cDeviceUnavailableError(slave_address)
+            channel_count = self._transceiver.channel_count
+            return [error] * channel_count if channel_count else error
+        try:
+            self._throttle([command])
+            response = self._transceive_command(slave_address, command,
+                                                reread)
+        except BaseException:
+            # The outcome must be reported in any case, otherwise a probe
+            # would leave the circuit half-open forever
+            breaker.record_failure(slave_address)
+            raise
+        if self._is_device_failure(response):
+            breaker.record_failure(slave_address)
+        else:
+            breaker.record_success(slave_address)
+        return response
+
+    def _sleep(self, name, seconds):
+        """
+        Helper function to sleep, recording the phase with the tracer (if
+        any).
+        """
+        tracer = self._tracer
+        if tracer is None:
+            self._clock.sleep(seconds)
+            return
+        start = tracer.now()
+        self._clock.sleep(seconds)
+        tracer.record(name, start, self._transceiver.description,
+                      {"requested_us": seconds * 1e6})
+
+    def _throttle(self, commands):
+        """
+        Helper function to wait for the rate limiter (if any).
+        """
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(commands)
+
+    @staticmethod
+    def _is_device_failure(response):
+        """
+        Helper function to check whether a raw response indicates that the
+        device did not respond (on all channels).
+        """
+        responses = response if isinstance(response, list) else [response]
+        return all(isinstance(r, (I2cNackError, I2cTimeoutError))
+                   for r in responses)
+
+    def _transceive_command(self, slave_address, command, reread=False):
+        """
+        Helper function to transceive the raw data of a command. If
+        ``reread`` is True, only the read operation is performed.
+        """
+        return self._transceive(
+            slave_address=slave_address,
+            tx_data=command.tx_data if not reread else None,
+            rx_length=command.rx_length,
+            read_delay=command.read_delay if not reread else 0.0,
+            timeout=command.timeout,
+        )
+
     def _transceive(self, slave_address, tx_data, rx_length, read_delay,
                     timeout):
         """
@@ -122,26 +665,22 @@ class I2cConnection(object):
         """
         api_methods_dict = {
             1: self._transceive_v1,
+            2: self._transceive_v2,
         }
         if self._transceiver.API_VERSION in api_methods_dict:
             # log what command is sent for easier debugging of low level issues
-            log.debug(
-                "I2cConnection send raw: " +
-                "slave_address={} ".format(slave_address) +
-                "rx_length={} ".format(rx_length) +
-                "read_delay={} ".format(read_delay) +
-                "timeout={} ".format(timeout) +
-                "tx_data={}".format(self._data_to_log_string(tx_data))
-            )
+            self._log_send(slave_address, tx_data, rx_length, read_delay,
+                           timeout)
+            tracer = self._tracer
+            start = tracer.now() if tracer is not None else 0
             result = api_methods_dict[self._transceiver.API_VERSION](
                 slave_address, tx_data, rx_length, read_delay, timeout)
+            if tracer is not None:
+                tracer.record("transceive", start,
+                              self._transceiver.description,
+                              {"slave_address": slave_address})
             # log what we received for easier debugging of low level issues
-            if type(result) is list:
-                log.debug("I2cConnection received raw: ({})".format(
-                    ", ".join([self._data_to_log_string(r) for r in result])))
-            else:
-                log.debug("I2cConnection received raw: {}".format(
-                    self._data_to_log_string(result)))
+            self._log_received(result)
             return result
         else:
             raise Exception("The I2C transceiver API version {} is not "
@@ -166,6 +705,80 @@ class I2cConnection(object):
         else:
             return self._convert_result_v1(result)
 
+    def _transceive_v2(self, slave_address, tx_data, rx_length, read_delay,
+                       timeout):
+        """
+        Helper function to transceive a command with a API V2 transceiver.
+        """
+        frame = (slave_address, tx_data, rx_length, read_delay, timeout)
+        rx_buffer = self._create_rx_buffer_v2(rx_length)
+        result = self._transceiver.transceive_batch([frame], [rx_buffer])[0]
+        return self._convert_result_v2(result, rx_buffer, rx_length)
+
+    def _transceive_batch_v2(self, requests):
+        """
+        Helper function to transceive several commands with a single call of
+        a API V2 transceiver.
+        """
+        frames = []
+        rx_buffers = []
+        for slave_address, command in requests:
+            self._log_send(slave_address, command.tx_data, command.rx_length,
+                           command.read_delay, command.timeout)
+            frames.append((slave_address, command.tx_data, command.rx_length,
+                           command.read_delay, command.timeout))
+            rx_buffers.append(self._create_rx_buffer_v2(command.rx_length))
+        tracer = self._tracer
+        start = tracer.now() if tracer is not None else 0
+        results = self._transceiver.transceive_batch(frames, rx_buffers)
+        if tracer is not None:
+            tracer.record("transceive_batch", start,
+                          self._transceiver.description,
+                          {"frames": len(frames)})
+        responses = []
+        for frame, rx_buffer, result in zip(frames, rx_buffers, results):
+            response = self._convert_result_v2(result, rx_buffer, frame[2])
+            self._log_received(response)
+            responses.append(response)
+        return responses
+
+    def _create_rx_buffer_v2(self, rx_length):
+        """
+        Helper function to create the RX buffer for a API V2 transceiver.
+        """
+        if not rx_length:
+            return None
+        return bytearray(rx_length * (self._transceiver.channel_count or 1))
+
+    def _convert_result_v2(self, result, rx_buffer, rx_length):
+        """
+        Helper function to convert the returned data from a API V2
+        transceiver.
+        """
+        if self._transceiver.channel_count is not None:
+            return [self._convert_channel_result_v2(
+                r, rx_buffer, ch * (rx_length or 0), rx_length)
+                for ch, r in enumerate(result)]
+        else:
+            return self._convert_channel_result_v2(result, rx_buffer, 0,
+                                                   rx_length)
+
+    def _convert_channel_result_v2(self, result, rx_buffer, offset,
+                                   rx_length):
+        """
+        Helper function to convert the returned data of a single channel from
+        a API V2 transceiver.
+        """
+        if result is None:
+            # Channel was excluded by the channel mask
+            return I2cChannelDisabledError(None, b"")
+        status, error, _ = result
+        if (status == self._transceiver.STATUS_OK) and rx_length:
+            rx_data = bytes(rx_buffer[offset:offset + rx_length])
+        else:
+            rx_data = b""
+        return self._convert_result_v1((status, error, rx_data))
+
     def _convert_result_v1(self, result):
         """
         Helper function to convert the returned data from a API V1 transceiver.
@@ -182,6 +795,29 @@ class I2cConnection(object):
         else:
             return I2cTransceiveError(error, rx_data, str(error))
 
+    @staticmethod
+    def _has_error(response):
+        """
+        Helper function to check whether a response (of any channel) contains
+        an error.
+        """
+        if isinstance(response, list):
+            return any(isinstance(r, Exception) for r in response)
+        return isinstance(response, Exception)
+
+    def _interpret_batch_response(self, command, response):
+        """
+        Helper function to interpret a response of a batch, without raising
+        exceptions.
+        """
+        if isinstance(response, list):
+            return [self._interpret_single_response(command, ch)
+                    for ch in response]
+        elif self._always_multi_channel_response is True:
+            return [self._interpret_single_response(command, response)]
+        else:
+            return self._interpret_single_response(command, response)
+
     def _interpret_response(self, command, response):
         """
         Helper function to interpret the returned data from the transceiver.
@@ -220,6 +856,31 @@ class I2cConnection(object):
         except Exception as e:
             return e
 
+    def _log_send(self, slave_address, tx_data, rx_length, read_delay,
+                  timeout):
+        """
+        Helper function to log the raw data to be sent.
+        """
+        log.debug(
+            "I2cConnection send raw: " +
+            "slave_address={} ".format(slave_address) +
+            "rx_length={} ".format(rx_length) +
+            "read_delay={} ".format(read_delay) +
+            "timeout={} ".format(timeout) +
+            "tx_data={}".format(self._data_to_log_string(tx_data))
+        )
+
+    def _log_received(self, result):
+        """
+        Helper function to log the received raw data.
+        """
+        if type(result) is list:
+            log.debug("I2cConnection received raw: ({})".format(
+                ", ".join([self._data_to_log_string(r) for r in result])))
+        else:
+            log.debug("I2cConnection received raw: {}".format(
+                self._data_to_log_string(result)))
+
     def _data_to_log_string(self, data):
         """
         Helper function to pretty print TX data or RX data.
@@ -59,3 +59,21 @@ class I2cDevice(object):
             Depends on the executed command.
         """
         return self._connection.execute(self._slave_address, command)
+
+    def execute_chunked(self, command, chunk_size):
+        """
+        Execute an I²C command on this device and read its response in
+        chunks.
+
+        For details, please refer to
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_chunked`.
+
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to be executed.
+        :param int chunk_size:
+            Maximum number of bytes to read per read operation.
+        :return:
+            A generator yielding the raw received chunks (bytes).
+        """
+        return self._connection.execute_chunked(self._slave_address, command,
+                                                chunk_size)
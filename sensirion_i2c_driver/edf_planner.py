@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class PeriodicTask(object):
+    """
+    Declaration of a periodic measurement of an
+    :py:class:`~sensirion_i2c_driver.device.I2cDevice`, executed by an
+    :py:class:`~sensirion_i2c_driver.edf_planner.EdfPlanner`.
+
+    Every period, the trigger command is executed to start a measurement.
+    After the measurement time, the fetch command is executed to read the
+    result, which is passed to the callback. While the device is measuring,
+    the bus is used by other tasks.
+    """
+
+    def __init__(self, device, trigger_command, fetch_command, period,
+                 jitter_tolerance=0.0, measurement_time=None, callback=None,
+                 offset=0.0, name=None):
+        """
+        Declare a periodic task.
+
+        :param ~sensirion_i2c_driver.device.I2cDevice device:
+            The device to execute the commands on.
+        :param ~sensirion_i2c_driver.command.I2cCommand trigger_command:
+            The command to start a measurement.
+        :param ~sensirion_i2c_driver.command.I2cCommand/None fetch_command:
+            The command to read the measurement result, or None if the
+            response of the trigger command is the result.
+        :param float period: The sampling period in Seconds.
+        :param float jitter_tolerance:
+            Maximum time (in Seconds) the trigger command may start after the
+            nominal sampling time without being counted as deadline miss.
+        :param float/None measurement_time:
+            Time (in Seconds) between the end of the trigger command and the
+            start of the fetch command. None (the default) means to use the
+            post processing time of the trigger command.
+        :param callable/None callback:
+            Function ``callback(task, result)`` called with the interpreted
+            response of the fetch command, or with the raised exception.
+        :param float offset:
+            Delay (in Seconds) of the first sampling time after starting the
+            planner.
+        :param str/None name:
+            Name of the task in the statistics. Defaults to a name derived
+            from the slave address. Must be unique within a planner, so pass
+            a name if several tasks use the same slave address (e.g. on
+            different buses or multiplexer channels).
+        """
+        super(PeriodicTask, self).__init__()
+        if period <= 0:
+            raise ValueError("Period must be positive.")
+        self.device = device
+        self.trigger_command = trigger_command
+        self.fetch_command = fetch_command
+        self.period = float(period)
+        self.jitter_tolerance = float(jitter_tolerance)
+        self.measurement_time = float(
+            measurement_time if measurement_time is not None
+            else trigger_command.post_processing_time)
+        self.callback = callback
+        self.offset = float(offset)
+        self.name = name or "0x{:02X}".format(device.slave_address)
+
+
+class _TaskStats(object):
+    """
+    Statistics of a periodic task.
+    """
+
+    def __init__(self):
+        super(_TaskStats, self).__init__()
+        self.jobs = 0
+        self.errors = 0
+        self.trigger_misses = 0
+        self.fetch_misses = 0
+        self.skipped = 0
+        self.max_jitter = 0.0
+
+    def as_dict(self):
+        return {
+            "jobs": self.jobs,
+            "errors": self.errors,
+            "deadline_misses": self.trigger_misses + self.fetch_misses +
+            self.skipped,
+            "trigger_misses": self.trigger_misses,
+            "fetch_misses": self.fetch_misses,
+            "skipped": self.skipped,
+            "max_jitter": self.max_jitter,
+        }
+
+
+class _Action(object):
+    """
+    A pending trigger or fetch command of a task.
+    """
+
+    def __init__(self, task, command, release, ready_time, deadline,
+                 is_trigger):
+        super(_Action, self).__init__()
+        self.task = task
+        self.command = command
+        self.release = release
+        self.ready_time = ready_time
+        self.deadline = deadline
+        self.is_trigger = is_trigger
+
+
+class EdfPlanner(object):
+    """
+    Executes periodic tasks (see
+    :py:class:`~sensirion_i2c_driver.edf_planner.PeriodicTask`) of several
+    devices on a shared bus, using non-preemptive earliest-deadline-first
+    scheduling.
+
+    Every task has two kinds of pending actions:
+
+    - The trigger command becomes ready at the sampling time and has the
+      deadline ``sampling time + jitter_tolerance``.
+    - The fetch command becomes ready after the measurement time and has the
+      deadline ``sampling time + period``.
+
+    Whenever the bus is free, the ready action with the earliest deadline is
+    executed. If no action is ready, the planner sleeps until the next one
+    gets ready. This way, the measurement windows of different devices
+    overlap and the bus does not stay idle while a device is measuring.
+
+    All commands are executed with ``wait_post_process=False``, the planner
+    takes care of the measurement time itself. A task is sampled again only
+    after its previous result has been fetched; sampling times which have
+    already passed at that point are skipped and counted as deadline misses.
+
+    With a :py:class:`~sensirion_i2c_driver.realtime.RealtimeMode`, the
+    thread calling :py:meth:`run` is switched to real-time mode, the garbage
+    collector is frozen after every task has completed its first job, every
+    command is executed within a sampling window, and the jitter of the
+    trigger commands is added to the histogram of the real-time mode.
+    """
+
+    def __init__(self, tasks, clock=None, realtime=None):
+        """
+        Create a planner.
+
+        :param list tasks:
+            The :py:class:`~sensirion_i2c_driver.edf_planner.PeriodicTask`
+            objects to execute. Their names must be unique, otherwise a
+            ValueError is raised.
+        :param clock:
+            Clock used for waiting and for the sampling times, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        :param ~sensirion_i2c_driver.realtime.RealtimeMode realtime:
+            Optional real-time mode (see class description).
+        """
+        super(EdfPlanner, self).__init__()
+        self._tasks = list(tasks)
+        names = [task.name for task in self._tasks]
+        duplicates = sorted(set(n for n in names if names.count(n) > 1))
+        if duplicates:
+            raise ValueError("Task names must be unique, but got several "
+                             "tasks named {}.".format(", ".join(duplicates)))
+        self._clock = clock or SYSTEM_CLOCK
+        self._realtime = realtime
+        self._stop = threading.Event()
+        self._stats = dict((task.name, _TaskStats()) for task in self._tasks)
+        self._busy_time = 0.0
+        self._run_time = 0.0
+
+    @property
+    def tasks(self):
+        """
+        The executed tasks.
+
+        :type: list(~sensirion_i2c_driver.edf_planner.PeriodicTask)
+        """
+        return list(self._tasks)
+
+    @property
+    def stats(self):
+        """
+        Statistics of the executed tasks.
+
+        :return:
+            Dict with a dict per task name containing the number of completed
+            ``jobs``, the number of ``errors``, the number of
+            ``deadline_misses`` (sum of late triggers, late fetches and
+            ``skipped`` sampling times) and the ``max_jitter`` of the trigger
+            start (in Seconds), and the overall bus ``utilization`` (fraction
+            of the run time spent executing commands).
+        :rtype: dict
+        """
+        return {
+            "tasks": dict((name, stats.as_dict())
+                          for name, stats in self._stats.items()),
+            "utilization": self._busy_time / self._run_time
+            if self._run_time > 0 else 0.0,
+        }
+
+    def stop(self):
+        """
+        Stop a running :py:meth:`run` call (e.g. from another thread or a
+        callback) after the current command.
+        """
+        self._stop.set()
+
+    def run(self, duration=None):
+        """
+        Execute the tasks until the duration has elapsed or :py:meth:`stop`
+        is called.
+
+        :param float/None duration:
+            Run time in Seconds, or None to run until :py:meth:`stop` is
+            called.
+        """
+        self._stop.clear()
+        realtime = self._realtime
+        if realtime is not None:
+            realtime.apply()
+        try:
+            self._run(duration)
+        finally:
+            if realtime is not None:
+                realtime.restore()
+
+    def _run(self, duration):
+        """
+        Main loop of :py:meth:`run`.
+        """
+        clock = self._clock
+        realtime = self._realtime
+        warm = realtime is None
+        start_time = clock.monotonic()
+        end_time = start_time + duration if duration is not None else None
+        pending = [self._trigger_action(task, start_time + task.offset)
+                   for task in self._tasks]
+        while pending and not self._stop.is_set():
+            now = clock.monotonic()
+            if (end_time is not None) and (now >= end_time):
+                break
+            ready = [a for a in pending if a.ready_time <= now]
+            if not ready:
+                next_time = min(a.ready_time for a in pending)
+                if end_time is not None:
+                    next_time = min(next_time, end_time)
+                clock.sleep(next_time - now)
+                continue
+            action = min(ready, key=lambda a: a.deadline)
+            pending.remove(action)
+            if realtime is not None:
+                with realtime.sampling_window():
+                    follow_up = self._execute(action, now)
+            else:
+                follow_up = self._execute(action, now)
+            pending.append(follow_up)
+            if not warm and all(s.jobs for s in self._stats.values()):
+                realtime.freeze()
+                warm = True
+        self._run_time += clock.monotonic() - start_time
+
+    def _trigger_action(self, task, release):
+        """
+        Create the trigger action of a task for a sampling time.
+        """
+        return _Action(task, task.trigger_command, release, release,
+                       release + task.jitter_tolerance, True)
+
+    def _execute(self, action, start):
+        """
+        Execute an action and return the next action of its task.
+        """
+        task = action.task
+        stats = self._stats[task.name]
+        if action.is_trigger:
+            jitter = start - action.release
+            stats.max_jitter = max(stats.max_jitter, jitter)
+            if self._realtime is not None:
+                self._realtime.add_jitter(jitter)
+            if start > action.deadline:
+                stats.trigger_misses += 1
+        try:
+            result = task.device.connection.execute(
+                task.device.slave_address, action.command,
+                wait_post_process=False)
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+        end = self._clock.monotonic()
+        self._busy_time += end - start
+        if action.is_trigger and (error is None) and \
+                (task.fetch_command is not None):
+            return _Action(task, task.fetch_command, action.release,
+                           end + task.measurement_time,
+                           action.release + task.period, False)
+        # Job is done (or failed)
+        stats.jobs += 1
+        if error is not None:
+            stats.errors += 1
+            log.debug("EdfPlanner: Task {} failed: {}".format(
+                task.name, error))
+        elif end > action.release + task.period:
+            stats.fetch_misses += 1
+        if task.callback is not None:
+            task.callback(task, error if error is not None else result)
+        release = action.release + task.period
+        while release + task.period <= end:
+            release += task.period
+            stats.skipped += 1
+        return self._trigger_action(task, release)
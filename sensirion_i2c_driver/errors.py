@@ -78,3 +78,18 @@ class I2cTimeoutError(I2cTransceiveError):
             received_data,
             "Timeout."
         )
+
+
+class I2cDeviceUnavailableError(I2cTransceiveError):
+    """
+    I2C device unavailable error, raised without accessing the bus if the
+    circuit breaker of the connection considers the device as unavailable.
+    """
+    def __init__(self, slave_address):
+        super(I2cDeviceUnavailableError, self).__init__(
+            None,
+            None,
+            "Device 0x{:02X} is unavailable (too many failed transfers)."
+            .format(slave_address)
+        )
+        self.slave_address = slave_address
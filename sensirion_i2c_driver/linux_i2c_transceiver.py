@@ -2,24 +2,236 @@
 # (c) Copyright 2019 Sensirion AG, Switzerland
 
 from __future__ import absolute_import, division, print_function
-import time
+from .clock import SYSTEM_CLOCK
+import ctypes
+import errno
+import math
 import os
+import threading
 
 import logging
 log = logging.getLogger(__name__)
 
 
+# Constants of the Linux I²C device interface, see
+# https://www.kernel.org/doc/html/latest/i2c/dev-interface.html
+I2C_RETRIES = 0x0701  #: ioctl request to set the number of retries.
+I2C_TIMEOUT = 0x0702  #: ioctl request to set the timeout (in 10ms units).
+I2C_SLAVE = 0x0703  #: ioctl request to set the slave address.
+I2C_RDWR = 0x0707  #: ioctl request for combined read/write transfers.
+I2C_M_RD = 0x0001  #: Message flag for read messages.
+I2C_RDWR_IOCTL_MAX_MSGS = 42  #: Maximum number of messages per I2C_RDWR.
+
+# Operations of flock() (see sys/file.h)
+_LOCK_EX = 0x2
+_LOCK_UN = 0x8
+
+
+class _I2cMsg(ctypes.Structure):
+    """
+    struct i2c_msg (see linux/i2c.h).
+    """
+    _fields_ = [
+        ("addr", ctypes.c_uint16),
+        ("flags", ctypes.c_uint16),
+        ("len", ctypes.c_uint16),
+        ("buf", ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+
+class _I2cRdwrIoctlData(ctypes.Structure):
+    """
+    struct i2c_rdwr_ioctl_data (see linux/i2c-dev.h).
+    """
+    _fields_ = [
+        ("msgs", ctypes.POINTER(_I2cMsg)),
+        ("nmsgs", ctypes.c_uint32),
+    ]
+
+
+class _I2cAdapterSettings(object):
+    """
+    Retries and timeout last applied to an I²C adapter by this process. The
+    kernel stores them per adapter, not per file descriptor, so they are
+    shared by all file descriptors of the same adapter (see
+    :py:class:`_I2cAdapterPool`).
+    """
+
+    def __init__(self, device_file):
+        super(_I2cAdapterSettings, self).__init__()
+        self.device_file = device_file
+        self.lock = threading.Lock()
+        self.references = 0
+        self.retries = None
+        self.timeout_ticks = None
+
+
+class _I2cAdapter(object):
+    """
+    Device file of an I²C adapter, together with its state (current slave
+    address) and a lock to serialize the transfers. Shared by all
+    transceivers of the adapter which are created with ``shared=True`` (see
+    :py:class:`_I2cAdapterPool`).
+    """
+
+    def __init__(self, device_file, settings):
+        super(_I2cAdapter, self).__init__()
+        self.device_file = device_file
+        self.settings = settings
+        self.lock = threading.RLock()
+        self.references = 0
+        self.slave_address = None
+        self._file_descriptor = None
+
+    @property
+    def is_open(self):
+        return self._file_descriptor is not None
+
+    @property
+    def file_descriptor(self):
+        """
+        The file descriptor, opening the device file on first use.
+        """
+        if self._file_descriptor is None:
+            self.open()
+        return self._file_descriptor
+
+    def open(self):
+        with self.lock:
+            if self._file_descriptor is None:
+                self._file_descriptor = os.open(self.device_file, os.O_RDWR)
+                log.debug("LinuxI2cTransceiver: Opened {}".format(
+                    self.device_file))
+
+    def close(self):
+        with self.lock:
+            if self._file_descriptor is not None:
+                os.close(self._file_descriptor)
+                self._file_descriptor = None
+            self.slave_address = None
+
+
+class _I2cAdapterPool(object):
+    """
+    Reference-counted pool of shared I²C adapters and of the applied adapter
+    settings, keyed by the real path of the device file. The device file of
+    an adapter is opened on first use and closed when the last transceiver
+    releases it. The settings are forgotten when the last adapter (shared or
+    not) of the device file is released.
+    """
+
+    def __init__(self):
+        super(_I2cAdapterPool, self).__init__()
+        self._lock = threading.Lock()
+        self._adapters = {}
+        self._settings = {}
+
+    def acquire(self, device_file):
+        key = os.path.realpath(device_file)
+        with self._lock:
+            adapter = self._adapters.get(key)
+            if adapter is None:
+                adapter = _I2cAdapter(key, self._acquire_settings(key))
+                self._adapters[key] = adapter
+            adapter.references += 1
+            return adapter
+
+    def release(self, adapter):
+        with self._lock:
+            adapter.references -= 1
+            if adapter.references > 0:
+                return
+            del self._adapters[adapter.device_file]
+            self._release_settings(adapter.settings)
+        adapter.close()
+
+    def create(self, device_file):
+        """
+        Create a separate (not shared) adapter, sharing only the settings.
+        """
+        with self._lock:
+            return _I2cAdapter(device_file, self._acquire_settings(
+                os.path.realpath(device_file)))
+
+    def close(self, adapter):
+        """
+        Close an adapter created with :py:meth:`create`.
+        """
+        with self._lock:
+            self._release_settings(adapter.settings)
+        adapter.close()
+
+    def get(self, device_file):
+        with self._lock:
+            return self._adapters.get(os.path.realpath(device_file))
+
+    def get_settings(self, device_file):
+        with self._lock:
+            return self._settings.get(os.path.realpath(device_file))
+
+    def _acquire_settings(self, key):
+        settings = self._settings.get(key)
+        if settings is None:
+            settings = _I2cAdapterSettings(key)
+            self._settings[key] = settings
+        settings.references += 1
+        return settings
+
+    def _release_settings(self, settings):
+        settings.references -= 1
+        if settings.references == 0:
+            del self._settings[settings.device_file]
+
+
+_ADAPTER_POOL = _I2cAdapterPool()
+
+
 class LinuxI2cTransceiver(object):
     """
     Transceiver for the Linux I²C kernel driver, for example to use the I²C
     pins of a Raspberry Pi.
 
+    This class implements the API version 2 (see
+    :py:class:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2`). For
+    backward compatibility, it also provides the method
+    :py:meth:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver.transceive`
+    of API version 1.
+
     .. note:: This class can be used in a "with"-statement, and it's
               recommended to do so as it automatically closes the device file
               after using it.
+
+    If many transceivers are created for the same I²C adapter (e.g. one per
+    device driver), pass ``shared=True`` to let them share a single file
+    descriptor. The descriptor is opened on the first transfer and closed
+    when the last of the transceivers is closed. Transfers of the sharing
+    transceivers are serialized with a common lock, and the slave address
+    of the descriptor is only set (``I2C_SLAVE``) when it changes.
+
+    To arbitrate the bus between several processes, pass ``bus_lock=True``.
+    Then every bus phase (writing, reading, ``I2C_RDWR`` ioctl calls) is
+    executed while holding an advisory lock (``flock``) on the device file.
+    The lock is released during read delays, so other processes can use
+    the bus while a sensor is measuring. Since
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection` waits for the
+    post processing time of commands outside of the transceiver, the lock is
+    not held during post processing either. See :py:attr:`lock_stats` for
+    the wait and hold times of the lock.
+
+    .. note:: The retries and the timeout (``I2C_RETRIES``,
+              ``I2C_TIMEOUT``) are stored by the kernel per I²C adapter, not
+              per file descriptor, so they apply to all users of the
+              adapter. To avoid redundant ioctl calls, the values applied
+              by this process are remembered per adapter and only applied
+              again when they change. Settings changed by other processes
+              are not noticed, unless ``bus_lock=True`` is passed: Then the
+              settings are applied on every transfer while holding the bus
+              lock. The kernel provides no way to read the settings, so the
+              previous values are not restored when closing the
+              transceiver; they stay in effect until changed again.
     """
 
-    API_VERSION = 1  #: API version (accessed by I2cConnection)
+    API_VERSION = 2  #: API version (accessed by I2cConnection)
 
     # Status codes
     STATUS_OK = 0  #: Status code for "transceive operation succeeded".
@@ -28,7 +240,9 @@ class LinuxI2cTransceiver(object):
     STATUS_TIMEOUT = 3  #: Status code for "timeout error".
     STATUS_UNSPECIFIED_ERROR = 4  #: Status code for "unspecified error".
 
-    def __init__(self, device_file, do_open=True):
+    def __init__(self, device_file, do_open=True, ioctl=None, retries=None,
+                 clock=None, tracer=None, shared=False, bus_lock=False,
+                 repeated_start=False):
         """
         Create a transceiver for a given I²C device file and (optionally) open
         it for read/write access.
@@ -40,10 +254,57 @@ class LinuxI2cTransceiver(object):
             you will have to call
             :py:meth:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver.open`
             manually before using the transceiver. Defaults to ``True``.
+        :param callable ioctl:
+            Function used for ioctl calls, with the same signature as
+            :py:func:`fcntl.ioctl`. Defaults to None, which means to use
+            :py:func:`fcntl.ioctl`. Mainly intended for testing.
+        :param int/None retries:
+            Number of times the I²C adapter retries a transfer when the slave
+            does not acknowledge (``I2C_RETRIES``). Defaults to None, which
+            keeps the setting of the kernel driver. Like the timeout, this
+            setting applies to all users of the adapter (see class
+            description).
+        :param clock:
+            Clock used for the read delays and completion timestamps, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        :param ~sensirion_i2c_driver.tracing.I2cTracer tracer:
+            Optional tracer, see :py:attr:`tracer`.
+        :param bool shared:
+            Whether to share the file descriptor with all other shared
+            transceivers of the same device file (see class description).
+            Defaults to ``False``, which means to open a separate file
+            descriptor.
+        :param bool bus_lock:
+            Whether to hold an advisory lock (``flock``) on the device file
+            during the bus phases, to arbitrate the bus with other processes
+            (see class description). Defaults to ``False``.
+        :param bool repeated_start:
+            Whether the write and read of frames passed to
+            :py:meth:`transceive_batch` (e.g. by
+            :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute`
+            or
+            :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_batch`)
+            are transferred within the same ``I2C_RDWR`` ioctl call, i.e.
+            with a repeated start condition in between. Defaults to
+            ``False``, which means to write and read with separate
+            transfers (with a stop condition in between), as required by
+            some devices.
         """
         super(LinuxI2cTransceiver, self).__init__()
         self._device_file = device_file
-        self._file_descriptor = None
+        self._adapter = None
+        self._ioctl = ioctl
+        self._retries = retries
+        self._clock = clock or SYSTEM_CLOCK
+        self._tracer = tracer
+        self._shared = shared
+        self._bus_lock = bus_lock
+        self._repeated_start = repeated_start
+        self._lock_acquired = 0.0
+        self._lock_stats = {"acquisitions": 0, "total_wait": 0.0,
+                            "max_wait": 0.0, "total_hold": 0.0,
+                            "max_hold": 0.0}
         if do_open:
             self.open()
 
@@ -58,15 +319,85 @@ class LinuxI2cTransceiver(object):
         Open the I²C port (only needs to be called if ``do_open`` in
         :py:meth:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver.__init__`
         was set to ``False``.
+
+        For shared transceivers, this only registers the transceiver as user
+        of the adapter. The device file is opened on the first transfer.
         """
-        self._file_descriptor = os.open(self._device_file, os.O_RDWR)
+        if self._shared:
+            self._adapter = _ADAPTER_POOL.acquire(self._device_file)
+        else:
+            adapter = _ADAPTER_POOL.create(self._device_file)
+            try:
+                adapter.open()
+            except Exception:
+                _ADAPTER_POOL.close(adapter)
+                raise
+            self._adapter = adapter
 
     def close(self):
         """
-        Close (release) the device file.
+        Close (release) the device file. For shared transceivers, the device
+        file is closed when the last transceiver of the adapter is closed.
         """
-        os.close(self._file_descriptor)
-        self._file_descriptor = None
+        if self._shared:
+            _ADAPTER_POOL.release(self._adapter)
+        else:
+            _ADAPTER_POOL.close(self._adapter)
+        self._adapter = None
+
+    @property
+    def shared(self):
+        """
+        Whether the file descriptor is shared with other transceivers.
+
+        :type: bool
+        """
+        return self._shared
+
+    @property
+    def bus_lock(self):
+        """
+        Whether the bus phases are arbitrated with other processes by an
+        advisory lock (``flock``) on the device file.
+
+        :type: bool
+        """
+        return self._bus_lock
+
+    @property
+    def lock_stats(self):
+        """
+        Statistics about acquiring the bus for the bus phases of this
+        transceiver (the lock of the file descriptor and, if
+        :py:attr:`bus_lock` is enabled, the advisory lock of the device file).
+
+        :return:
+            Dict with the number of ``acquisitions``, and the ``total_wait``,
+            ``max_wait``, ``total_hold`` and ``max_hold`` times in Seconds.
+            After closing the transceiver, the final statistics are returned.
+        :rtype: dict
+        """
+        adapter = self._adapter
+        if adapter is None:
+            return dict(self._lock_stats)
+        with adapter.lock:
+            return dict(self._lock_stats)
+
+    @property
+    def tracer(self):
+        """
+        Optional tracer to record the phases of the transfers (setting the
+        slave address, write, read delay, read, ``I2C_RDWR`` ioctl calls and
+        waiting for the bus lock),
+        with the device file as bus name. Defaults to None (no tracing).
+
+        :type: ~sensirion_i2c_driver.tracing.I2cTracer/None
+        """
+        return self._tracer
+
+    @tracer.setter
+    def tracer(self, value):
+        self._tracer = value
 
     @property
     def description(self):
@@ -96,10 +427,15 @@ class LinuxI2cTransceiver(object):
         For details (e.g. parameter documentation), please refer to
         :py:meth:`~sensirion_i2c_driver.transceiver_v1.I2cTransceiverV1.transceive`.
 
-        .. note::  The ``timeout`` parameter is not supported (i.e. ignored)
-                   since we can't specify the clock stretching timeout. It
+        .. note::  The ``timeout`` is applied to the I²C adapter with the
+                   ``I2C_TIMEOUT`` ioctl, in units of 10ms (rounded up). A
+                   timeout of 0.0 keeps the current setting. The timeout
+                   limits the duration of a whole transfer (not only clock
+                   stretching) and applies to all users of the adapter. It
                    depends on the underlying hardware whether clock stretching
-                   is supported at all or not, and what timeout value is used.
+                   is supported at all or not. The ioctl is only issued if the
+                   value changes (see class description). Expired transfers
+                   are reported with :py:attr:`STATUS_TIMEOUT`.
         """
         assert type(slave_address) is int
         assert (tx_data is None) or (type(tx_data) is bytes)
@@ -107,36 +443,357 @@ class LinuxI2cTransceiver(object):
         assert type(read_delay) in [float, int]
         assert type(timeout) in [float, int]
 
-        # Delayed import to avoid errors when importing this module on Windows
-        from fcntl import ioctl
+        rx_buffer = bytearray(rx_length or 0)
+        status, error, received = self._transceive_frame(
+            self._get_ioctl(), slave_address, tx_data, rx_length, read_delay,
+            timeout, rx_buffer)
+        return status, error, bytes(rx_buffer[:received])
 
-        status = self.STATUS_OK
-        error = None
-        rx_data = b""
+    def transceive_batch(self, frames, rx_buffers, channel_mask=None):
+        """
+        Transceive a batch of I²C frames in single-channel mode.
 
-        # Set address
-        # See https://www.kernel.org/doc/html/latest/i2c/dev-interface.html
-        ioctl(self._file_descriptor, 0x0703, slave_address)
+        For details (e.g. parameter documentation), please refer to
+        :py:meth:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2.transceive_batch`.
 
-        # I2C Write
-        if tx_data is not None:
+        The write and read operations of consecutive frames are packed into
+        as few ``I2C_RDWR`` ioctl calls as possible (at most 42 messages per
+        call, which may address different slaves). Within an ioctl call, the
+        messages are separated by repeated start conditions. A batch is
+        split where a frame needs a read delay, which is implemented in
+        software between two ioctl calls, and between the write and read of
+        every frame (i.e. with a stop condition in between) unless
+        ``repeated_start`` was enabled in the constructor. A batch with a
+        single frame is transferred like in
+        :py:meth:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver.transceive`
+        in that case.
+
+        .. note::  The ``timeout`` of the frames is applied like in
+                   :py:meth:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver.transceive`,
+                   using the longest timeout of all frames within an ioctl
+                   call. The ``channel_mask`` is ignored since this is a
+                   single-channel transceiver. If an ioctl call fails, all
+                   frames with messages in this call get the error status
+                   since the kernel does not report which message failed.
+        """
+        ioctl = self._get_ioctl()
+        if (len(frames) == 1) and not self._repeated_start:
+            slave_address, tx_data, rx_length, read_delay, timeout = frames[0]
+            status, error, _ = self._transceive_frame(
+                ioctl, slave_address, tx_data, rx_length, read_delay,
+                timeout, rx_buffers[0])
+            return [(status, error, self._clock.monotonic())]
+        adapter = self._adapter
+        tracer = self._tracer
+        results = [None] * len(frames)
+        pending = []  # list of (frame index, message)
+        buffers = []  # keep ctypes buffers alive until the ioctl is done
+
+        def flush():
+            if not pending:
+                return
+            messages = (_I2cMsg * len(pending))(*[m for _, m in pending])
+            data = _I2cRdwrIoctlData(messages, len(pending))
+            status, error = self.STATUS_OK, None
+            self._lock_bus()
+            try:
+                self._apply_settings(ioctl,
+                                     max(frames[i][4] for i, _ in pending))
+                start = tracer.now() if tracer is not None else 0
+                try:
+                    ioctl(adapter.file_descriptor, I2C_RDWR, data)
+                except OSError as e:
+                    status, error = self._status_from_error(e), e
+            finally:
+                self._unlock_bus()
+            if tracer is not None:
+                tracer.record("ioctl", start, self._device_file,
+                              {"messages": len(pending)})
+            timestamp = self._clock.monotonic()
+            for index, _ in pending:
+                if (results[index] is None) or \
+                        (results[index][0] == self.STATUS_OK):
+                    results[index] = (status, error, timestamp)
+            del pending[:]
+            del buffers[:]
+
+        def append(index, message):
+            if len(pending) >= I2C_RDWR_IOCTL_MAX_MSGS:
+                flush()
+            pending.append((index, message))
+
+        for index, (frame, rx_buffer) in enumerate(zip(frames, rx_buffers)):
+            slave_address, tx_data, rx_length, read_delay, timeout = frame
+            if tx_data is not None:
+                buffer = (ctypes.c_uint8 * len(tx_data)).from_buffer_copy(
+                    tx_data) if len(tx_data) else None
+                buffers.append(buffer)
+                append(index, _I2cMsg(slave_address, 0, len(tx_data),
+                                      self._to_pointer(buffer)))
+            if (read_delay > 0) or ((tx_data is not None) and
+                                    (rx_length is not None) and
+                                    not self._repeated_start):
+                # Stop condition between write and read. Since we use
+                # separate ioctl calls for write and read, we have to
+                # implement the read delay in software.
+                flush()
+                if read_delay > 0:
+                    self._read_delay(read_delay)
+            failed = (results[index] is not None) and \
+                (results[index][0] != self.STATUS_OK)
+            if (rx_length is not None) and not failed:
+                buffer = (ctypes.c_uint8 * rx_length).from_buffer(
+                    rx_buffer) if rx_length else None
+                buffers.append(buffer)
+                append(index, _I2cMsg(slave_address, I2C_M_RD, rx_length,
+                                      self._to_pointer(buffer)))
+            if (tx_data is None) and (rx_length is None):
+                results[index] = (self.STATUS_OK, None, self._clock.monotonic())
+        flush()
+        return results
+
+    def scan(self, addresses):
+        """
+        Probe slave addresses with zero-length write transfers ("quick
+        write") and return the addresses which acknowledged.
+
+        Every address is probed with its own ``I2C_RDWR`` ioctl call
+        containing a single empty write message, so no data is transferred
+        and no slave address switching (``I2C_SLAVE``) is needed.
+
+        .. warning:: Some (rare) devices interpret a quick write as command,
+                     e.g. to toggle a write protection. Only scan addresses
+                     where this is known to be harmless.
+
+        :param iterable addresses: The 7-bit slave addresses to probe.
+        :return: The addresses which acknowledged, in probing order.
+        :rtype: list(int)
+        :raise OSError:
+            If a probe failed with another error than NACK, for example if
+            the I²C adapter does not support zero-length transfers.
+        """
+        ioctl = self._get_ioctl()
+        found = []
+        for address in addresses:
+            message = (_I2cMsg * 1)(
+                _I2cMsg(address, 0, 0, self._to_pointer(None)))
+            self._lock_bus()
             try:
-                os.write(self._file_descriptor, tx_data)
+                ioctl(self._adapter.file_descriptor, I2C_RDWR,
+                      _I2cRdwrIoctlData(message, 1))
             except OSError as e:
-                status = self.STATUS_UNSPECIFIED_ERROR
-                error = e
+                if self._status_from_error(e) != self.STATUS_NACK:
+                    raise
+            else:
+                found.append(address)
+            finally:
+                self._unlock_bus()
+        return found
+
+    def _transceive_frame(self, ioctl, slave_address, tx_data, rx_length,
+                          read_delay, timeout, rx_buffer):
+        """
+        Transceive a single frame and write the received data into the given
+        buffer. The bus is released during the read delay.
+
+        :return: Status code, error and number of received bytes.
+        :rtype: tuple(int, Exception, int)
+        """
+        status = self.STATUS_OK
+        error = None
+        received = 0
+        tracer = self._tracer
+
+        # I2C Write
+        self._lock_bus()
+        try:
+            self._apply_settings(ioctl, timeout)
+            fd = self._set_slave_address(ioctl, slave_address)
+            if tx_data is not None:
+                start = tracer.now() if tracer is not None else 0
+                try:
+                    os.write(fd, tx_data)
+                except OSError as e:
+                    status = self._status_from_error(e)
+                    error = e
+                if tracer is not None:
+                    tracer.record("write", start, self._device_file,
+                                  {"bytes": len(tx_data)})
+        finally:
+            self._unlock_bus()
 
         # Since we use separate commands for write and read, we have to
         # implement the read delay in software
         if read_delay > 0:
-            time.sleep(read_delay)
+            self._read_delay(read_delay)
 
-        # I2C Read
+        # I2C Read (directly into the buffer to avoid copying the data)
         if (rx_length is not None) and (status == self.STATUS_OK):
+            self._lock_bus()
             try:
-                rx_data = os.read(self._file_descriptor, rx_length)
-            except OSError as e:
-                status = self.STATUS_UNSPECIFIED_ERROR
-                error = e
+                # Another thread sharing the file descriptor might have
+                # changed the slave address during the read delay
+                fd = self._set_slave_address(ioctl, slave_address)
+                start = tracer.now() if tracer is not None else 0
+                try:
+                    if rx_length > 0:
+                        received = os.readv(
+                            fd, [memoryview(rx_buffer)[:rx_length]])
+                    else:
+                        os.read(fd, 0)
+                except OSError as e:
+                    status = self._status_from_error(e)
+                    error = e
+                if tracer is not None:
+                    tracer.record("read", start, self._device_file,
+                                  {"bytes": rx_length})
+            finally:
+                self._unlock_bus()
+
+        return status, error, received
+
+    def _set_slave_address(self, ioctl, slave_address):
+        """
+        Set the slave address of the file descriptor, if it has changed since
+        the last frame on the same file descriptor. Must be called with the
+        bus locked.
+
+        :return: The file descriptor.
+        :rtype: int
+        """
+        # See https://www.kernel.org/doc/html/latest/i2c/dev-interface.html
+        adapter = self._adapter
+        fd = adapter.file_descriptor
+        if adapter.slave_address != slave_address:
+            tracer = self._tracer
+            start = tracer.now() if tracer is not None else 0
+            adapter.slave_address = None
+            ioctl(fd, I2C_SLAVE, slave_address)
+            adapter.slave_address = slave_address
+            if tracer is not None:
+                tracer.record("set_address", start, self._device_file,
+                              {"slave_address": slave_address})
+        return fd
+
+    def _lock_bus(self):
+        """
+        Acquire the bus for a bus phase: The lock of the file descriptor and,
+        if enabled, the advisory lock of the device file. Must be followed by
+        :py:meth:`_unlock_bus`.
+        """
+        adapter = self._adapter
+        start = self._clock.monotonic()
+        adapter.lock.acquire()
+        if self._bus_lock:
+            tracer = self._tracer
+            trace_start = tracer.now() if tracer is not None else 0
+            try:
+                self._flock(adapter.file_descriptor, _LOCK_EX)
+            except Exception:
+                adapter.lock.release()
+                raise
+            if tracer is not None:
+                tracer.record("lock_wait", trace_start, self._device_file)
+        now = self._clock.monotonic()
+        wait = now - start
+        self._lock_acquired = now
+        stats = self._lock_stats
+        stats["acquisitions"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
 
-        return status, error, rx_data
+    def _unlock_bus(self):
+        """
+        Release the bus acquired by :py:meth:`_lock_bus`.
+        """
+        adapter = self._adapter
+        try:
+            if self._bus_lock:
+                self._flock(adapter.file_descriptor, _LOCK_UN)
+        finally:
+            hold = self._clock.monotonic() - self._lock_acquired
+            stats = self._lock_stats
+            stats["total_hold"] += hold
+            stats["max_hold"] = max(stats["max_hold"], hold)
+            adapter.lock.release()
+
+    @staticmethod
+    def _flock(fd, operation):
+        """
+        Apply or remove an advisory lock on a file descriptor.
+        """
+        # Delayed import to avoid errors when importing this module on Windows
+        from fcntl import flock
+        flock(fd, operation)
+
+    def _read_delay(self, read_delay):
+        """
+        Wait for the read delay, recording it with the tracer (if any).
+        """
+        tracer = self._tracer
+        if tracer is None:
+            self._clock.sleep(read_delay)
+            return
+        start = tracer.now()
+        self._clock.sleep(read_delay)
+        tracer.record("read_delay", start, self._device_file,
+                      {"requested_us": read_delay * 1e6})
+
+    def _get_ioctl(self):
+        """
+        Get the function to be used for ioctl calls.
+        """
+        if self._ioctl is not None:
+            return self._ioctl
+        # Delayed import to avoid errors when importing this module on Windows
+        from fcntl import ioctl
+        return ioctl
+
+    def _apply_settings(self, ioctl, timeout):
+        """
+        Apply the retries and the timeout to the I²C adapter, if they have
+        changed since the last call on any file descriptor of the adapter in
+        this process. Must be called with the bus locked. If
+        :py:attr:`bus_lock` is enabled, the settings are applied on every
+        call since other processes might have changed them.
+        """
+        adapter = self._adapter
+        settings = adapter.settings
+        force = self._bus_lock
+        with settings.lock:
+            if (self._retries is not None) and \
+                    (force or (self._retries != settings.retries)):
+                settings.retries = self._retries
+                try:
+                    ioctl(adapter.file_descriptor, I2C_RETRIES,
+                          self._retries)
+                except OSError as e:
+                    log.warning("Failed to set I2C retries: {}".format(e))
+            if timeout > 0:
+                ticks = int(math.ceil(round(timeout * 100.0, 6)))
+                if force or (ticks != settings.timeout_ticks):
+                    settings.timeout_ticks = ticks
+                    try:
+                        ioctl(adapter.file_descriptor, I2C_TIMEOUT, ticks)
+                    except OSError as e:
+                        log.warning("Failed to set I2C timeout: {}"
+                                    .format(e))
+
+    def _status_from_error(self, error):
+        """
+        Map an OSError of the I²C kernel driver to a status code.
+        """
+        if error.errno in (errno.EREMOTEIO, errno.ENXIO):
+            return self.STATUS_NACK
+        if error.errno == errno.ETIMEDOUT:
+            return self.STATUS_TIMEOUT
+        return self.STATUS_UNSPECIFIED_ERROR
+
+    @staticmethod
+    def _to_pointer(buffer):
+        """
+        Get a pointer to a ctypes buffer, or a NULL pointer for empty buffers.
+        """
+        if buffer is None:
+            return ctypes.POINTER(ctypes.c_uint8)()
+        return ctypes.cast(buffer, ctypes.POINTER(ctypes.c_uint8))
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .command import I2cCommand
+from collections import OrderedDict
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class I2cMultiplexerChannel(object):
+    """
+    A single channel of an
+    :py:class:`~sensirion_i2c_driver.multiplexer.I2cMultiplexer`, acting as
+    virtual I²C bus. It provides the same execute methods as
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection`, so it can be
+    passed as connection to
+    :py:class:`~sensirion_i2c_driver.device.I2cDevice` objects.
+
+    Use :py:meth:`~sensirion_i2c_driver.multiplexer.I2cMultiplexer.channel`
+    to get the channel objects.
+    """
+
+    def __init__(self, multiplexer, index):
+        super(I2cMultiplexerChannel, self).__init__()
+        self._multiplexer = multiplexer
+        self._index = index
+
+    @property
+    def multiplexer(self):
+        """
+        The multiplexer of this channel.
+
+        :type: ~sensirion_i2c_driver.multiplexer.I2cMultiplexer
+        """
+        return self._multiplexer
+
+    @property
+    def index(self):
+        """
+        The channel number of the multiplexer.
+
+        :type: int
+        """
+        return self._index
+
+    @property
+    def is_multi_channel(self):
+        """
+        Whether the underlying connection returns multi-channel responses, see
+        :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.is_multi_channel`.
+
+        :type: bool
+        """
+        return self._multiplexer.connection.is_multi_channel
+
+    def execute(self, slave_address, command, wait_post_process=True):
+        """
+        Select this channel (if needed) and execute a command.
+
+        For details, please refer to
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute`.
+        """
+        return self._multiplexer.execute(self._index, slave_address, command,
+                                         wait_post_process)
+
+    def execute_batch(self, requests, wait_post_process=True):
+        """
+        Select this channel (if needed) and execute several commands.
+
+        For details, please refer to
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_batch`.
+        """
+        return self._multiplexer.execute_batch(
+            [(self._index, slave_address, command)
+             for slave_address, command in requests], wait_post_process)
+
+    def execute_chunked(self, slave_address, command, chunk_size,
+                        wait_post_process=True):
+        """
+        Select this channel (if needed) and execute a command with chunked
+        read.
+
+        For details, please refer to
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_chunked`.
+
+        .. note:: The multiplexer is only locked while a chunk is
+                  transferred, so other channels can be used between the
+                  chunks. The channel is selected again before a chunk if
+                  it was switched in the meantime.
+        """
+        return self._multiplexer.execute_chunked(
+            self._index, slave_address, command, chunk_size,
+            wait_post_process)
+
+
+class I2cMultiplexer(object):
+    """
+    Layer for I²C multiplexers (switches) like the TCA9548A, which connect
+    one of several downstream buses to an
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection`. This allows
+    to use several devices with the same slave address.
+
+    Every channel is presented as virtual bus (see :py:meth:`channel`). The
+    multiplexer remembers the currently selected channel and only writes the
+    channel select byte when a command is executed on a different channel.
+    After any error, the selection is considered unknown and is written again
+    before the next command.
+
+    Example:
+
+    .. code-block:: python
+
+        mux = I2cMultiplexer(connection, mux_address=0x70)
+        sensors = [MySensor(mux.channel(i), 0x44) for i in range(8)]
+
+    .. note:: The multiplexer must only be accessed through this object,
+              otherwise the cached selection gets out of sync. In that case,
+              call :py:meth:`invalidate`.
+    """
+
+    def __init__(self, connection, mux_address=0x70, channel_count=8):
+        """
+        Create a multiplexer layer.
+
+        :param ~sensirion_i2c_driver.connection.I2cConnection connection:
+            The connection of the upstream bus.
+        :param byte mux_address:
+            The slave address of the multiplexer.
+        :param int channel_count:
+            Number of downstream channels of the multiplexer.
+        """
+        super(I2cMultiplexer, self).__init__()
+        self._connection = connection
+        self._mux_address = mux_address
+        self._channels = [I2cMultiplexerChannel(self, i)
+                          for i in range(channel_count)]
+        self._select_commands = [I2cCommand([1 << i], None, 0.0, 0.0)
+                                 for i in range(channel_count)]
+        self._lock = threading.RLock()
+        self._selected = None
+        self._selects = 0
+        self._skipped = 0
+
+    @property
+    def connection(self):
+        """
+        The connection of the upstream bus.
+
+        :type: ~sensirion_i2c_driver.connection.I2cConnection
+        """
+        return self._connection
+
+    @property
+    def mux_address(self):
+        """
+        The slave address of the multiplexer.
+
+        :type: byte
+        """
+        return self._mux_address
+
+    @property
+    def channels(self):
+        """
+        All channels of the multiplexer.
+
+        :type: list(~sensirion_i2c_driver.multiplexer.I2cMultiplexerChannel)
+        """
+        return list(self._channels)
+
+    @property
+    def selected_channel(self):
+        """
+        The currently selected channel, or None if unknown.
+
+        :type: int/None
+        """
+        return self._selected
+
+    @property
+    def stats(self):
+        """
+        Statistics about the channel selection.
+
+        :return:
+            Dict with the number of written channel ``selects`` and the
+            number of ``skipped`` selects because the channel was already
+            selected.
+        :rtype: dict
+        """
+        with self._lock:
+            return {"selects": self._selects, "skipped": self._skipped}
+
+    def channel(self, index):
+        """
+        Get the virtual bus of a channel.
+
+        :param int index: The channel number.
+        :return: The channel object.
+        :rtype: ~sensirion_i2c_driver.multiplexer.I2cMultiplexerChannel
+        """
+        return self._channels[index]
+
+    def invalidate(self):
+        """
+        Forget the currently selected channel, so it is written again before
+        the next command (e.g. after the multiplexer was reset).
+        """
+        with self._lock:
+            self._selected = None
+
+    def select(self, index):
+        """
+        Select a channel, if it is not already selected.
+
+        :param int index: The channel number.
+        :raise:
+            An exception is raised if the channel select byte could not be
+            written.
+        """
+        with self._lock:
+            if self._selected == index:
+                self._skipped += 1
+                return
+            self._selected = None
+            self._selects += 1
+            response = self._connection.execute(self._mux_address,
+                                                self._select_commands[index])
+            if self._has_error(response):
+                errors = response if isinstance(response, list) \
+                    else [response]
+                raise next(e for e in errors if isinstance(e, Exception))
+            self._selected = index
+
+    def execute(self, index, slave_address, command, wait_post_process=True):
+        """
+        Select a channel (if needed) and execute a command on it.
+
+        For details, please refer to
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute`.
+
+        :param int index: The channel number.
+        """
+        with self._lock:
+            self.select(index)
+            try:
+                response = self._connection.execute(
+                    slave_address, command, wait_post_process)
+            except Exception:
+                self._selected = None
+                raise
+            if self._has_error(response):
+                self._selected = None
+            return response
+
+    def execute_batch(self, requests, wait_post_process=True):
+        """
+        Execute several commands on (possibly) different channels.
+
+        The requests are grouped by channel to minimize the number of
+        channel switches, starting with the currently selected channel. The
+        order of the requests within a channel is preserved. Each group is
+        executed with
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_batch`.
+
+        :param list requests:
+            List of tuples ``(channel, slave_address, command)`` to execute.
+        :param bool wait_post_process:
+            See
+            :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_batch`.
+        :return:
+            A list with one response per request, in the order of the
+            requests. Errors (including failed channel selection) are never
+            raised but returned as Exception objects.
+        """
+        requests = list(requests)
+        responses = [None] * len(requests)
+        with self._lock:
+            groups = OrderedDict()  # channel -> list of request indices
+            if self._selected is not None:
+                groups[self._selected] = []
+            for i, (channel, _, _) in enumerate(requests):
+                groups.setdefault(channel, []).append(i)
+            for channel, indices in groups.items():
+                if not indices:
+                    continue
+                try:
+                    self.select(channel)
+                except Exception as e:
+                    for i in indices:
+                        responses[i] = e
+                    continue
+                results = self._connection.execute_batch(
+                    [requests[i][1:] for i in indices], wait_post_process)
+                for i, result in zip(indices, results):
+                    responses[i] = result
+                if any(self._has_error(r) for r in results):
+                    self._selected = None
+        return responses
+
+    def execute_chunked(self, index, slave_address, command, chunk_size,
+                        wait_post_process=True):
+        """
+        Select a channel (if needed) and execute a command with chunked read.
+
+        For details, please refer to
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_chunked`.
+
+        The channel is selected and the arguments are validated
+        immediately. Afterwards, the multiplexer is only locked while a chunk
+        is transferred (the generator may be resumed from any thread), and
+        the channel is selected again before a chunk if another command
+        switched it in the meantime.
+
+        :param int index: The channel number.
+        """
+        with self._lock:
+            self.select(index)
+            chunks = self._connection.execute_chunked(
+                slave_address, command, chunk_size, wait_post_process)
+        return self._read_chunks(index, chunks)
+
+    def _read_chunks(self, index, chunks):
+        """
+        Generator reading the chunks of :py:meth:`execute_chunked`, locking
+        the multiplexer and selecting the channel for every chunk.
+        """
+        while True:
+            with self._lock:
+                try:
+                    self.select(index)
+                    chunk = next(chunks, None)
+                except Exception:
+                    self._selected = None
+                    raise
+            if chunk is None:
+                break
+            yield chunk
+
+    @staticmethod
+    def _has_error(response):
+        """
+        Helper function to check whether a response (of any channel) contains
+        an error.
+        """
+        if isinstance(response, list):
+            return any(isinstance(r, Exception) for r in response)
+        return isinstance(response, Exception)
@@ -0,0 +1,587 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+"""
+Bus profiler to characterize the latency of commands on an I²C bus.
+
+Run ``python -m sensirion_i2c_driver.profile --help`` for the command line
+usage. Example to measure a measurement command of a device at address 0x44
+and to search the minimum working read delay:
+
+.. code-block:: bash
+
+    python -m sensirion_i2c_driver.profile --device /dev/i2c-1 -a 0x44 \\
+        -c 2400,6,0.016 --crc --find-read-delay
+"""
+
+from __future__ import absolute_import, division, print_function
+from .bus_timing import I2cBusTiming
+from .clock import SYSTEM_CLOCK, VirtualClock
+from .command import I2cCommand
+from .connection import I2cConnection
+from .crc_calculator import CrcCalculator
+from .errors import I2cChecksumError
+from .tracing import I2cTracer
+from binascii import hexlify, unhexlify
+import argparse
+import json
+import sys
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Version of the recording file format.
+RECORDING_FORMAT_VERSION = 1
+
+# Status codes of API V1 transceivers
+_STATUS_OK = 0
+_STATUS_NACK = 2
+_STATUS_UNSPECIFIED_ERROR = 4
+
+
+class ProfileCommand(I2cCommand):
+    """
+    Command with raw TX data used by the profiler, optionally validating
+    the CRCs of Sensirion responses.
+    """
+
+    def __init__(self, tx_data, rx_length, read_delay, crc=None):
+        """
+        Create a profile command.
+
+        :param bytes tx_data: The raw bytes to send.
+        :param int/None rx_length: Number of bytes to read.
+        :param float read_delay: The read delay in Seconds.
+        :param calleable crc:
+            CRC calculator to validate every third received byte, or None.
+        """
+        super(ProfileCommand, self).__init__(tx_data, rx_length, read_delay,
+                                             0.0)
+        self._crc = crc
+
+    @classmethod
+    def parse(cls, spec, crc=None):
+        """
+        Create a command from a specification string
+        ``TX_HEX[,RX_LENGTH[,READ_DELAY]]``, e.g. ``"2400,6,0.016"``.
+
+        :param str spec: The specification.
+        :param calleable crc: See :py:meth:`__init__`.
+        :rtype: ~sensirion_i2c_driver.profile.ProfileCommand
+        """
+        parts = spec.split(",")
+        if len(parts) > 3:
+            raise ValueError("Invalid command specification '{}'."
+                             .format(spec))
+        tx_data = unhexlify(parts[0])
+        rx_length = int(parts[1]) if len(parts) > 1 else None
+        read_delay = float(parts[2]) if len(parts) > 2 else 0.0
+        return cls(tx_data, rx_length, read_delay, crc)
+
+    @property
+    def name(self):
+        """
+        Name of the command (hex TX data, RX length and read delay in
+        Milliseconds), e.g. ``"2400/6@16ms"``.
+
+        :type: str
+        """
+        return "{}/{}@{:g}ms".format(hexlify(self.tx_data).decode("ascii"),
+                                     self.rx_length, self.read_delay * 1e3)
+
+    def with_read_delay(self, read_delay):
+        """
+        Create a copy of the command with another read delay.
+
+        :rtype: ~sensirion_i2c_driver.profile.ProfileCommand
+        """
+        return ProfileCommand(self.tx_data, self.rx_length, read_delay,
+                              self._crc)
+
+    def interpret_response(self, data):
+        """
+        Validate the CRCs (if enabled) and return the raw data.
+        """
+        if self._crc is not None:
+            for i in range(2, len(data), 3):
+                expected_crc = self._crc(data[i - 2:i])
+                if data[i] != expected_crc:
+                    raise I2cChecksumError(data[i], expected_crc, data)
+        return data
+
+
+class SimulatedTransceiver(object):
+    """
+    API V1 transceiver simulating devices which acknowledge on the given
+    addresses. The virtual clock is advanced by the wire time of every
+    frame (see :py:class:`~sensirion_i2c_driver.bus_timing.I2cBusTiming`)
+    and by the read delay. Reads started before ``min_read_delay`` has
+    elapsed are not acknowledged, like most Sensirion sensors do while
+    measuring. The received data consists of zero words with valid CRC.
+    """
+
+    API_VERSION = 1  #: API version (accessed by I2cConnection)
+
+    def __init__(self, addresses, clock, timing=None, min_read_delay=0.0):
+        """
+        Create a simulated transceiver.
+
+        :param list addresses: The addresses of the simulated devices.
+        :param ~sensirion_i2c_driver.clock.VirtualClock clock:
+            The clock to advance.
+        :param ~sensirion_i2c_driver.bus_timing.I2cBusTiming timing:
+            The bus timing model, defaults to 100 kHz.
+        :param float min_read_delay:
+            Minimum read delay (in Seconds) the devices need.
+        """
+        super(SimulatedTransceiver, self).__init__()
+        self._addresses = set(addresses)
+        self._clock = clock
+        self._timing = timing or I2cBusTiming()
+        self._min_read_delay = float(min_read_delay)
+
+    @property
+    def description(self):
+        return "simulated@{:g}Hz".format(self._timing.scl_frequency)
+
+    @property
+    def channel_count(self):
+        return None
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        command = I2cCommand(tx_data, rx_length, read_delay, timeout)
+        self._clock.advance(self._timing.wire_time(command) + read_delay)
+        if slave_address not in self._addresses:
+            return _STATUS_NACK, IOError("NACK"), b""
+        if (tx_data is not None) and (rx_length is not None) and \
+                (read_delay < self._min_read_delay):
+            return _STATUS_NACK, IOError("NACK (not ready)"), b""
+        return _STATUS_OK, None, (b"\x00\x00\x81" * rx_length)[:rx_length] \
+            if rx_length else b""
+
+
+class TransceiverRecorder(object):
+    """
+    Single-channel transceiver wrapper recording all frames with their
+    results and durations, to replay them later with
+    :py:class:`~sensirion_i2c_driver.profile.RecordedTransceiver`.
+
+    The recorder provides the same API version as the recorded transceiver,
+    so the frames are transferred exactly like without recording (e.g. with
+    :py:meth:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2.transceive_batch`
+    for API V2 transceivers).
+    """
+
+    API_VERSION = 1  #: API version (overridden by the recorded transceiver)
+
+    def __init__(self, transceiver, clock=None):
+        """
+        Create a recorder.
+
+        :param transceiver:
+            The recorded single-channel transceiver with API version 1 or 2
+            (e.g.
+            :py:class:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver`).
+        :param clock:
+            Clock to measure the durations. For API V2 transceivers, the
+            durations are derived from the completion timestamps, so this
+            should be the clock of the transceiver.
+        """
+        super(TransceiverRecorder, self).__init__()
+        self.API_VERSION = transceiver.API_VERSION
+        self._transceiver = transceiver
+        self._clock = clock or SYSTEM_CLOCK
+        self._frames = []
+
+    @property
+    def description(self):
+        return self._transceiver.description
+
+    @property
+    def channel_count(self):
+        return None
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        start = self._clock.monotonic()
+        status, error, rx_data = self._transceiver.transceive(
+            slave_address, tx_data, rx_length, read_delay, timeout)
+        self._record((slave_address, tx_data, rx_length, read_delay),
+                     status, error, rx_data, self._clock.monotonic() - start)
+        return status, error, rx_data
+
+    def transceive_batch(self, frames, rx_buffers, channel_mask=None):
+        previous = self._clock.monotonic()
+        results = self._transceiver.transceive_batch(frames, rx_buffers,
+                                                     channel_mask)
+        for frame, rx_buffer, (status, error, timestamp) in \
+                zip(frames, rx_buffers, results):
+            rx_length = frame[2]
+            rx_data = bytes(rx_buffer[:rx_length]) \
+                if rx_length and (status == _STATUS_OK) else b""
+            self._record(frame[:4], status, error, rx_data,
+                         max(timestamp - previous, 0.0))
+            previous = max(timestamp, previous)
+        return results
+
+    def _record(self, frame, status, error, rx_data, duration):
+        slave_address, tx_data, rx_length, read_delay = frame
+        self._frames.append({
+            "slave_address": slave_address,
+            "tx_data": _to_hex(tx_data),
+            "rx_length": rx_length,
+            "read_delay": read_delay,
+            "status": status,
+            "error": str(error) if error is not None else None,
+            "rx_data": _to_hex(rx_data),
+            "duration": duration,
+        })
+
+    def save(self, path):
+        """
+        Write the recorded frames to a JSON file.
+
+        :param str path: Path of the recording file.
+        """
+        with open(path, "w") as f:
+            json.dump({"version": RECORDING_FORMAT_VERSION,
+                       "api_version": self.API_VERSION,
+                       "description": self.description,
+                       "frames": self._frames}, f, indent=1)
+
+
+class RecordedTransceiver(object):
+    """
+    Transceiver replaying a recording of
+    :py:class:`~sensirion_i2c_driver.profile.TransceiverRecorder`, with the
+    API version of the recorded transceiver. The results of every frame
+    (same slave address, TX data and RX length) are replayed in a cycle, and
+    the virtual clock is advanced by the recorded durations. Frames which
+    are not contained in the recording fail.
+    """
+
+    API_VERSION = 1  #: API version (overridden by the recording)
+
+    def __init__(self, path, clock):
+        """
+        Load a recording.
+
+        :param str path: Path of the recording file.
+        :param ~sensirion_i2c_driver.clock.VirtualClock clock:
+            The clock to advance.
+        """
+        super(RecordedTransceiver, self).__init__()
+        with open(path, "r") as f:
+            content = json.load(f)
+        if content.get("version") != RECORDING_FORMAT_VERSION:
+            raise ValueError("Unsupported recording format.")
+        self.API_VERSION = content.get("api_version", 1)
+        self._description = "replay of " + content.get("description", "")
+        self._clock = clock
+        self._frames = {}
+        for frame in content["frames"]:
+            key = (frame["slave_address"], frame["tx_data"],
+                   frame["rx_length"])
+            self._frames.setdefault(key, []).append(frame)
+        self._positions = {}
+
+    @property
+    def description(self):
+        return self._description
+
+    @property
+    def channel_count(self):
+        return None
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        key = (slave_address, _to_hex(tx_data), rx_length)
+        frames = self._frames.get(key)
+        if not frames:
+            return _STATUS_UNSPECIFIED_ERROR, \
+                IOError("Frame not contained in recording."), b""
+        position = self._positions.get(key, 0)
+        self._positions[key] = (position + 1) % len(frames)
+        frame = frames[position]
+        self._clock.advance(frame["duration"])
+        error = IOError(frame["error"]) if frame["error"] else None
+        return frame["status"], error, _from_hex(frame["rx_data"])
+
+    def transceive_batch(self, frames, rx_buffers, channel_mask=None):
+        results = []
+        for frame, rx_buffer in zip(frames, rx_buffers):
+            status, error, rx_data = self.transceive(*frame)
+            if rx_data:
+                rx_buffer[:len(rx_data)] = rx_data
+            results.append((status, error, self._clock.monotonic()))
+        return results
+
+
+def _to_hex(data):
+    return hexlify(data).decode("ascii") if data is not None else None
+
+
+def _from_hex(text):
+    return unhexlify(text) if text is not None else b""
+
+
+def _percentiles(values, scale=1.0):
+    """
+    Get the statistics of a list of values (nearest-rank percentiles).
+    """
+    if not values:
+        return None
+    values = sorted(values)
+
+    def percentile(p):
+        return values[min(int(p / 100.0 * len(values)), len(values) - 1)] \
+            * scale
+    return {
+        "mean": sum(values) / len(values) * scale,
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": values[-1] * scale,
+    }
+
+
+def profile(connection, addresses, commands, iterations=100):
+    """
+    Execute commands repeatedly on several addresses and measure their
+    latency.
+
+    In every iteration, every command is executed once on every address.
+    If a tracer is attached to the connection (see
+    :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.tracer`), the
+    overshoot of all recorded sleeps is evaluated as well.
+
+    :param ~sensirion_i2c_driver.connection.I2cConnection connection:
+        The connection to profile (single-channel).
+    :param list addresses: The slave addresses.
+    :param list commands:
+        The :py:class:`~sensirion_i2c_driver.profile.ProfileCommand` objects.
+    :param int iterations: Number of iterations.
+    :return:
+        Dict with the ``elapsed`` time, the overall ``throughput`` (commands
+        per Second), a list of ``results`` per address and command (with
+        ``count``, ``errors`` per exception type, ``error_rate`` and
+        ``latency_ms`` percentiles), and the ``sleep_overshoot_us``
+        percentiles (or None).
+    :rtype: dict
+    """
+    clock = connection.clock
+    latencies = dict(((a, c.name), []) for a in addresses for c in commands)
+    errors = dict(((a, c.name), {}) for a in addresses for c in commands)
+    start_time = clock.monotonic()
+    for _ in range(iterations):
+        for address in addresses:
+            for command in commands:
+                key = (address, command.name)
+                start = clock.perf_counter_ns()
+                try:
+                    connection.execute(address, command)
+                except Exception as e:
+                    name = type(e).__name__
+                    errors[key][name] = errors[key].get(name, 0) + 1
+                latencies[key].append(clock.perf_counter_ns() - start)
+    elapsed = clock.monotonic() - start_time
+    results = []
+    for address in addresses:
+        for command in commands:
+            key = (address, command.name)
+            error_count = sum(errors[key].values())
+            results.append({
+                "address": "0x{:02X}".format(address),
+                "command": command.name,
+                "count": len(latencies[key]),
+                "errors": errors[key],
+                "error_rate": error_count / len(latencies[key])
+                if latencies[key] else 0.0,
+                "latency_ms": _percentiles(latencies[key], 1e-6),
+            })
+    overshoots = []
+    if connection.tracer is not None:
+        for event in connection.tracer.events():
+            requested = event.get("args", {}).get("requested_us")
+            if requested is not None:
+                overshoots.append(event["dur"] - requested)
+    total = iterations * len(addresses) * len(commands)
+    return {
+        "iterations": iterations,
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed > 0 else None,
+        "results": results,
+        "sleep_overshoot_us": _percentiles(overshoots),
+    }
+
+
+def find_min_read_delay(connection, address, command, trials=5,
+                        resolution=0.0001):
+    """
+    Search the minimum read delay of a command which works reliably, with a
+    binary search between zero and the read delay of the command.
+
+    :param ~sensirion_i2c_driver.connection.I2cConnection connection:
+        The connection (single-channel).
+    :param byte address: The slave address.
+    :param ~sensirion_i2c_driver.profile.ProfileCommand command:
+        The command. Its read delay is the upper bound of the search.
+    :param int trials:
+        Number of consecutive successful executions required to accept a
+        read delay.
+    :param float resolution: Resolution of the search in Seconds.
+    :return:
+        The minimum working read delay in Seconds, or None if the command
+        does not work reliably even with its own read delay.
+    :rtype: float/None
+    """
+    def works(read_delay):
+        candidate = command.with_read_delay(read_delay)
+        try:
+            for _ in range(trials):
+                connection.execute(address, candidate)
+            return True
+        except Exception:
+            return False
+
+    high = command.read_delay
+    if not works(high):
+        return None
+    low = 0.0
+    if works(low):
+        return low
+    while high - low > resolution:
+        middle = (low + high) / 2.0
+        if works(middle):
+            high = middle
+        else:
+            low = middle
+    return high
+
+
+def format_table(report):
+    """
+    Format a report of :py:func:`profile` as human-readable table.
+
+    :param dict report: The report.
+    :rtype: str
+    """
+    lines = []
+    if report.get("transceiver"):
+        lines.append("Transceiver: {}".format(report["transceiver"]))
+    lines.append("{:<8} {:<20} {:>7} {:>7} {:>9} {:>9} {:>9} {:>9} {:>12}"
+                 .format("Address", "Command", "Count", "Err%", "p50 ms",
+                         "p90 ms", "p99 ms", "max ms", "min delay ms"))
+    for result in report["results"]:
+        latency = result["latency_ms"] or {}
+        min_delay = result.get("min_read_delay")
+        lines.append(
+            "{:<8} {:<20} {:>7} {:>7.2f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} "
+            "{:>12}".format(
+                result["address"], result["command"], result["count"],
+                result["error_rate"] * 100.0, latency.get("p50", 0.0),
+                latency.get("p90", 0.0), latency.get("p99", 0.0),
+                latency.get("max", 0.0),
+                "{:.3f}".format(min_delay * 1e3)
+                if min_delay is not None else "-"))
+    if report.get("throughput") is not None:
+        lines.append("Throughput: {:.1f} commands/s".format(
+            report["throughput"]))
+    overshoot = report.get("sleep_overshoot_us")
+    if overshoot:
+        lines.append("Sleep overshoot: p50 {:.1f} us, p99 {:.1f} us, "
+                     "max {:.1f} us".format(overshoot["p50"],
+                                            overshoot["p99"],
+                                            overshoot["max"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """
+    Command line entry point of the bus profiler.
+
+    :param list/None argv:
+        Command line arguments (without program name), or None to use
+        ``sys.argv``.
+    :return: The exit code.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m sensirion_i2c_driver.profile",
+        description="Measure the latency of I2C commands.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--device", help="Linux I2C device, e.g. /dev/i2c-1")
+    source.add_argument("--simulate", action="store_true",
+                        help="Use simulated devices (in virtual time)")
+    source.add_argument("--replay", metavar="RECORDING",
+                        help="Replay a recording (in virtual time)")
+    parser.add_argument("-a", "--address", action="append", required=True,
+                        type=lambda s: int(s, 0), help="Slave address")
+    parser.add_argument("-c", "--command", action="append", required=True,
+                        help="Command as TX_HEX[,RX_LENGTH[,READ_DELAY]]")
+    parser.add_argument("-n", "--iterations", type=int, default=100)
+    parser.add_argument("--crc", action="store_true",
+                        help="Validate the CRCs of Sensirion responses")
+    parser.add_argument("--find-read-delay", action="store_true",
+                        help="Search the minimum working read delay")
+    parser.add_argument("--record", metavar="RECORDING",
+                        help="Record all frames to a file")
+    parser.add_argument("--scl", type=float, default=100e3,
+                        help="SCL frequency of the simulation in Hz")
+    parser.add_argument("--simulated-read-delay", type=float, default=0.0,
+                        help="Minimum read delay of simulated devices")
+    parser.add_argument("--format", choices=["table", "json"],
+                        default="table")
+    args = parser.parse_args(argv)
+
+    crc = CrcCalculator(8, 0x31, 0xFF) if args.crc else None
+    commands = [ProfileCommand.parse(spec, crc) for spec in args.command]
+    transceiver = None
+    if args.device:
+        from .linux_i2c_transceiver import LinuxI2cTransceiver
+        clock = SYSTEM_CLOCK
+        transceiver = LinuxI2cTransceiver(args.device, clock=clock)
+        bus = transceiver
+    elif args.simulate:
+        clock = VirtualClock()
+        bus = SimulatedTransceiver(args.address, clock,
+                                   I2cBusTiming(args.scl),
+                                   args.simulated_read_delay)
+    else:
+        clock = VirtualClock()
+        bus = RecordedTransceiver(args.replay, clock)
+    try:
+        tracer = I2cTracer(clock=clock)
+        if transceiver is not None:
+            transceiver.tracer = tracer
+        if args.record:
+            bus = TransceiverRecorder(bus, clock)
+        connection = I2cConnection(bus, clock=clock)
+        connection.tracer = tracer
+        report = profile(connection, args.address, commands, args.iterations)
+        report["transceiver"] = bus.description
+        if args.find_read_delay:
+            tracer.enabled = False
+            for result in report["results"]:
+                address = int(result["address"], 16)
+                command = next(c for c in commands
+                               if c.name == result["command"])
+                if command.rx_length is not None:
+                    result["min_read_delay"] = find_min_read_delay(
+                        connection, address, command)
+        if args.record:
+            bus.save(args.record)
+    finally:
+        if transceiver is not None:
+            transceiver.close()
+    if args.format == "json":
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(format_table(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
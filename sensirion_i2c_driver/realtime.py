@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+import argparse
+import gc
+import os
+import sys
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class JitterHistogram(object):
+    """
+    Histogram of timing deviations (jitter), e.g. of the start of periodic
+    measurements relative to their nominal sampling time.
+
+    Values are counted in buckets of fixed width. Values beyond the last
+    bucket are counted as overflow, negative values (too early) in the first
+    bucket. Mean and maximum are exact, percentiles are resolved to the
+    bucket width.
+    """
+
+    def __init__(self, bucket_width=0.0001, bucket_count=100):
+        """
+        Create an empty histogram.
+
+        :param float bucket_width: Width of a bucket in Seconds.
+        :param int bucket_count: Number of buckets.
+        """
+        super(JitterHistogram, self).__init__()
+        if bucket_width <= 0 or bucket_count < 1:
+            raise ValueError("Invalid histogram size.")
+        self._bucket_width = float(bucket_width)
+        self._buckets = [0] * int(bucket_count)
+        self._overflow = 0
+        self._count = 0
+        self._sum = 0.0
+        self._max = None
+
+    @property
+    def bucket_width(self):
+        """
+        Width of a bucket in Seconds.
+
+        :type: float
+        """
+        return self._bucket_width
+
+    @property
+    def buckets(self):
+        """
+        Counts of the buckets (without the overflow).
+
+        :type: list(int)
+        """
+        return list(self._buckets)
+
+    @property
+    def overflow(self):
+        """
+        Number of values beyond the last bucket.
+
+        :type: int
+        """
+        return self._overflow
+
+    @property
+    def count(self):
+        """
+        Total number of values.
+
+        :type: int
+        """
+        return self._count
+
+    def add(self, jitter):
+        """
+        Add a value.
+
+        :param float jitter: The deviation in Seconds.
+        """
+        index = int(jitter / self._bucket_width) if jitter > 0 else 0
+        if index < len(self._buckets):
+            self._buckets[index] += 1
+        else:
+            self._overflow += 1
+        self._count += 1
+        self._sum += jitter
+        if (self._max is None) or (jitter > self._max):
+            self._max = jitter
+
+    def clear(self):
+        """
+        Remove all values.
+        """
+        self._buckets = [0] * len(self._buckets)
+        self._overflow = 0
+        self._count = 0
+        self._sum = 0.0
+        self._max = None
+
+    def percentile(self, percent):
+        """
+        Get the upper bound of the bucket containing a percentile.
+
+        :param float percent: The percentile, e.g. 99.0.
+        :return:
+            The percentile in Seconds, None if the histogram is empty or
+            infinity if the percentile is in the overflow.
+        :rtype: float/None
+        """
+        if self._count == 0:
+            return None
+        rank = max(int(round(percent / 100.0 * self._count)), 1)
+        total = 0
+        for index, count in enumerate(self._buckets):
+            total += count
+            if total >= rank:
+                return (index + 1) * self._bucket_width
+        return float("inf")
+
+    def as_dict(self):
+        """
+        Get a summary of the histogram.
+
+        :return:
+            Dict with the ``count``, the ``mean``, ``p50``, ``p99``,
+            ``p999`` and ``max`` jitter (in Seconds) and the ``overflow``
+            count.
+        :rtype: dict
+        """
+        return {
+            "count": self._count,
+            "mean": self._sum / self._count if self._count else None,
+            "p50": self.percentile(50.0),
+            "p99": self.percentile(99.0),
+            "p999": self.percentile(99.9),
+            "max": self._max,
+            "overflow": self._overflow,
+        }
+
+    def format(self, width=50):
+        """
+        Format the histogram as text, with one line per non-empty bucket.
+
+        :param int width: Length of the longest bar.
+        :rtype: str
+        """
+        lines = []
+        largest = max(self._buckets + [self._overflow, 1])
+        for index, count in enumerate(self._buckets + [self._overflow]):
+            if count == 0:
+                continue
+            if index < len(self._buckets):
+                label = "< {:8.1f} us".format(
+                    (index + 1) * self._bucket_width * 1e6)
+            else:
+                label = ">= {:7.1f} us".format(
+                    index * self._bucket_width * 1e6)
+            lines.append("{} {:>8} {}".format(
+                label, count, "#" * int(round(count * width / largest))))
+        return "\n".join(lines)
+
+
+class _GcPause(object):
+    """
+    Process-wide pause of the cyclic garbage collector. Since the collector
+    is enabled and disabled for the whole process, overlapping pauses (e.g.
+    sampling windows of several threads) are counted, and the collector is
+    only enabled again when the last pause ends (if it was enabled before
+    the first one).
+    """
+
+    def __init__(self):
+        super(_GcPause, self).__init__()
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._was_enabled = False
+
+    def enter(self):
+        with self._lock:
+            if self._depth == 0:
+                self._was_enabled = gc.isenabled()
+                gc.disable()
+            self._depth += 1
+
+    def exit(self):
+        with self._lock:
+            self._depth -= 1
+            if (self._depth == 0) and self._was_enabled:
+                gc.enable()
+
+
+_GC_PAUSE = _GcPause()
+
+
+class _GcFreeze(object):
+    """
+    Process-wide freeze of the garbage collector objects. Since
+    ``gc.unfreeze()`` unfreezes all objects of the process, the freezes of
+    several real-time modes (e.g. of a bus server and a planner in the same
+    process) are counted, and the objects are only unfrozen when the last
+    freeze is released.
+    """
+
+    def __init__(self):
+        super(_GcFreeze, self).__init__()
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def freeze(self, acquire):
+        with self._lock:
+            gc.collect()
+            gc.freeze()
+            if acquire:
+                self._count += 1
+
+    def release(self):
+        with self._lock:
+            self._count -= 1
+            if self._count == 0:
+                gc.unfreeze()
+
+
+_GC_FREEZE = _GcFreeze()
+
+
+class _SamplingWindow(object):
+    """
+    Context manager pausing the cyclic garbage collector.
+    """
+
+    def __enter__(self):
+        _GC_PAUSE.enter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _GC_PAUSE.exit()
+
+
+class RealtimeMode(object):
+    """
+    Opt-in settings to reduce the timing jitter of sampling threads, e.g. of
+    :py:class:`~sensirion_i2c_driver.edf_planner.EdfPlanner` or
+    :py:class:`~sensirion_i2c_driver.bus_server.I2cBusServer`:
+
+    - Pin the thread to dedicated CPUs, so it is not migrated between CPUs
+      (losing its caches).
+    - Request the ``SCHED_FIFO`` real-time scheduling policy, so the thread
+      preempts normal processes. This needs root or ``CAP_SYS_NICE``; if it
+      is not permitted, a warning is logged and the thread keeps running
+      with its normal policy.
+    - Freeze all objects allocated during warm-up (``gc.freeze()``), so the
+      garbage collector does not scan them anymore.
+    - Pause the cyclic garbage collector during sampling windows, so
+      collections only happen between the samples.
+
+    The achieved jitter is collected in :py:attr:`histogram`.
+
+    Example:
+
+    .. code-block:: python
+
+        realtime = RealtimeMode(cpus=[3], priority=50)
+        planner = EdfPlanner(tasks, realtime=realtime)
+        planner.run(duration=3600)
+        print(realtime.histogram.format())
+    """
+
+    def __init__(self, cpus=None, priority=None, freeze_gc=True,
+                 histogram=None):
+        """
+        Create the real-time settings.
+
+        :param list/None cpus:
+            CPU numbers to pin the thread to, or None to keep the affinity.
+        :param int/None priority:
+            ``SCHED_FIFO`` priority (1..99) to request, or None to keep the
+            scheduling policy.
+        :param bool freeze_gc:
+            Whether :py:meth:`freeze` freezes the objects of the garbage
+            collector.
+        :param ~sensirion_i2c_driver.realtime.JitterHistogram histogram:
+            Histogram to collect the jitter, or None to create one with the
+            default buckets.
+        """
+        super(RealtimeMode, self).__init__()
+        self._cpus = set(cpus) if cpus is not None else None
+        self._priority = priority
+        self._freeze_gc = freeze_gc
+        self._histogram = histogram or JitterHistogram()
+        self._saved_affinity = None
+        self._saved_scheduler = None
+        self._status = {"affinity": False, "sched_fifo": False,
+                        "gc_frozen": False}
+
+    @property
+    def histogram(self):
+        """
+        The histogram collecting the jitter.
+
+        :type: ~sensirion_i2c_driver.realtime.JitterHistogram
+        """
+        return self._histogram
+
+    @property
+    def status(self):
+        """
+        Which settings are in effect.
+
+        :return:
+            Dict with the bools ``affinity``, ``sched_fifo`` and
+            ``gc_frozen``.
+        :rtype: dict
+        """
+        return dict(self._status)
+
+    def apply(self):
+        """
+        Apply the CPU affinity and the scheduling policy to the calling
+        thread. Settings which are not supported or not permitted are
+        skipped with a warning.
+        """
+        if self._cpus is not None:
+            try:
+                self._saved_affinity = os.sched_getaffinity(0)
+                os.sched_setaffinity(0, self._cpus)
+                self._status["affinity"] = True
+            except (AttributeError, OSError) as e:
+                log.warning("RealtimeMode: Failed to set CPU affinity: {}"
+                            .format(e))
+        if self._priority is not None:
+            try:
+                self._saved_scheduler = (os.sched_getscheduler(0),
+                                         os.sched_getparam(0))
+                os.sched_setscheduler(0, os.SCHED_FIFO,
+                                      os.sched_param(self._priority))
+                self._status["sched_fifo"] = True
+            except (AttributeError, OSError) as e:
+                self._saved_scheduler = None
+                log.warning("RealtimeMode: SCHED_FIFO not available, "
+                            "keeping normal scheduling: {}".format(e))
+
+    def restore(self):
+        """
+        Restore the CPU affinity and the scheduling policy changed by
+        :py:meth:`apply` of the calling thread, and release the freeze of
+        :py:meth:`freeze`. The objects are only unfrozen if no other
+        real-time mode of the process holds a freeze.
+        """
+        try:
+            if self._saved_scheduler is not None:
+                os.sched_setscheduler(0, *self._saved_scheduler)
+            if self._saved_affinity is not None:
+                os.sched_setaffinity(0, self._saved_affinity)
+        except OSError as e:
+            log.warning("RealtimeMode: Failed to restore scheduling: {}"
+                        .format(e))
+        self._saved_scheduler = None
+        self._saved_affinity = None
+        self._status["affinity"] = False
+        self._status["sched_fifo"] = False
+        if self._status["gc_frozen"]:
+            _GC_FREEZE.release()
+            self._status["gc_frozen"] = False
+
+    def freeze(self):
+        """
+        Collect the garbage and freeze all remaining objects, so later
+        collections do not scan them anymore. Call this after warm-up, i.e.
+        when all long-living objects (devices, commands, buffers) exist.
+        Does nothing if ``freeze_gc`` is disabled or not supported.
+        """
+        if not self._freeze_gc or not hasattr(gc, "freeze"):
+            return
+        _GC_FREEZE.freeze(acquire=not self._status["gc_frozen"])
+        self._status["gc_frozen"] = True
+
+    def sampling_window(self):
+        """
+        Get a context manager pausing the cyclic garbage collector, to be
+        used around time-critical code. Since the garbage collector is
+        process-wide, it stays paused until all overlapping sampling windows
+        (of any thread) are left:
+
+        .. code-block:: python
+
+            with realtime.sampling_window():
+                result = device.execute(command)
+
+        :rtype: context manager
+        """
+        return _SamplingWindow()
+
+    def add_jitter(self, jitter):
+        """
+        Add a jitter value to :py:attr:`histogram`.
+
+        :param float jitter: The jitter in Seconds.
+        """
+        self._histogram.add(jitter)
+
+
+def measure_jitter(period=0.001, count=1000, histogram=None, clock=None):
+    """
+    Measure the wakeup jitter of periodic sleeps in the calling thread, e.g.
+    to compare the timing with and without real-time mode.
+
+    :param float period: The period in Seconds.
+    :param int count: Number of periods.
+    :param ~sensirion_i2c_driver.realtime.JitterHistogram histogram:
+        Histogram to add the lateness of every wakeup to, or None to create
+        one with the default buckets.
+    :param clock:
+        Clock used for waiting, see :py:mod:`~sensirion_i2c_driver.clock`.
+        Defaults to None, which means to use the system clock.
+    :return: The histogram.
+    :rtype: ~sensirion_i2c_driver.realtime.JitterHistogram
+    """
+    clock = clock or SYSTEM_CLOCK
+    if histogram is None:
+        histogram = JitterHistogram()
+    deadline = clock.monotonic()
+    for _ in range(count):
+        deadline += period
+        delay = deadline - clock.monotonic()
+        if delay > 0:
+            clock.sleep(delay)
+        histogram.add(clock.monotonic() - deadline)
+    return histogram
+
+
+def _print_summary(name, histogram):
+    summary = histogram.as_dict()
+    print("{}: mean {:.1f} us, p99 {:.1f} us, max {:.1f} us".format(
+        name, summary["mean"] * 1e6, summary["p99"] * 1e6,
+        summary["max"] * 1e6))
+    print(histogram.format())
+
+
+def main(argv=None):
+    """
+    Command line entry point to measure the timing jitter of this system
+    with and without real-time mode.
+
+    :param list/None argv:
+        Command line arguments (without program name), or None to use
+        ``sys.argv``.
+    :return: The exit code.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m sensirion_i2c_driver.realtime",
+        description="Measure the wakeup jitter with and without real-time "
+                    "mode.")
+    parser.add_argument("--cpu", type=int, action="append",
+                        help="CPU to pin the thread to (repeatable)")
+    parser.add_argument("--priority", type=int,
+                        help="SCHED_FIFO priority (needs CAP_SYS_NICE)")
+    parser.add_argument("--period", type=float, default=0.001,
+                        help="Period in Seconds")
+    parser.add_argument("-n", "--count", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    _print_summary("Normal", measure_jitter(args.period, args.count))
+    realtime = RealtimeMode(cpus=args.cpu, priority=args.priority)
+    realtime.apply()
+    realtime.freeze()
+    status = realtime.status
+    try:
+        with realtime.sampling_window():
+            measure_jitter(args.period, args.count, realtime.histogram)
+    finally:
+        realtime.restore()
+    _print_summary("Real-time", realtime.histogram)
+    print("Real-time settings in effect: {}".format(", ".join(
+        sorted(k for k, v in status.items() if v)) or "none"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .bus_server import PROTOCOL_MAGIC, PROTOCOL_VERSION, HELLO_FRAME, \
+    REQUEST_FRAME, RESPONSE_FRAME, RESULT_FRAME, NONE_LENGTH, unpack_result
+import socket
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class RemoteTransceiver(object):
+    """
+    Transceiver which forwards all transceive operations to an
+    :py:class:`~sensirion_i2c_driver.bus_server.I2cBusServer` through a Unix
+    domain socket. This allows several processes to share the same I²C bus
+    without any further coordination.
+
+    This class implements the API version 1 (see
+    :py:class:`~sensirion_i2c_driver.transceiver_v1.I2cTransceiverV1`), so it
+    can be used with :py:class:`~sensirion_i2c_driver.connection.I2cConnection`
+    like any other transceiver.
+
+    .. note:: This class can be used in a "with"-statement, and it's
+              recommended to do so as it automatically closes the socket
+              after using it.
+    """
+
+    API_VERSION = 1  #: API version (accessed by I2cConnection)
+
+    # Status codes
+    STATUS_OK = 0  #: Status code for "transceive operation succeeded".
+    STATUS_CHANNEL_DISABLED = 1  #: Status code for "channel disabled error".
+    STATUS_NACK = 2  #: Status code for "not acknowledged error".
+    STATUS_TIMEOUT = 3  #: Status code for "timeout error".
+    STATUS_UNSPECIFIED_ERROR = 4  #: Status code for "unspecified error".
+
+    def __init__(self, socket_path, do_open=True):
+        """
+        Create a transceiver for a given server socket and (optionally)
+        connect to it.
+
+        :param str socket_path:
+            Path to the Unix domain socket of the bus server.
+        :param bool do_open:
+            Whether the connection should be opened immediately or not. If
+            ``False``, you will have to call
+            :py:meth:`~sensirion_i2c_driver.remote_transceiver.RemoteTransceiver.open`
+            manually before using the transceiver. Defaults to ``True``.
+        """
+        super(RemoteTransceiver, self).__init__()
+        self._socket_path = socket_path
+        self._socket = None
+        self._lock = threading.Lock()
+        self._rx_buffer = bytearray()
+        self._next_request_id = 0
+        self._channel_count = None
+        self._remote_description = ""
+        if do_open:
+            self.open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        """
+        Connect to the bus server (only needs to be called if ``do_open`` in
+        :py:meth:`~sensirion_i2c_driver.remote_transceiver.RemoteTransceiver.__init__`
+        was set to ``False``.
+        """
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(self._socket_path)
+        self._rx_buffer = bytearray()
+        magic, version, channel_count, description_length = \
+            HELLO_FRAME.unpack(self._receive(HELLO_FRAME.size))
+        if (magic != PROTOCOL_MAGIC) or (version != PROTOCOL_VERSION):
+            self.close()
+            raise IOError("Unsupported bus server protocol at '{}'."
+                          .format(self._socket_path))
+        self._channel_count = channel_count if channel_count > 0 else None
+        self._remote_description = \
+            self._receive(description_length).decode("utf-8", "replace")
+
+    def close(self):
+        """
+        Close the connection to the bus server.
+        """
+        self._socket.close()
+        self._socket = None
+
+    @property
+    def description(self):
+        """
+        Description of the transceiver.
+
+        For details (e.g. return value documentation), please refer to
+        :py:attr:`~sensirion_i2c_driver.transceiver_v1.I2cTransceiverV1.description`.
+        """
+        return "{} ({})".format(self._socket_path, self._remote_description)
+
+    @property
+    def channel_count(self):
+        """
+        Channel count of this transceiver, as reported by the server.
+
+        For details (e.g. return value documentation), please refer to
+        :py:attr:`~sensirion_i2c_driver.transceiver_v1.I2cTransceiverV1.channel_count`.
+        """
+        return self._channel_count
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        """
+        Transceive an I²C frame on the remote bus.
+
+        For details (e.g. parameter documentation), please refer to
+        :py:meth:`~sensirion_i2c_driver.transceiver_v1.I2cTransceiverV1.transceive`.
+
+        .. note:: Errors reported by the server are returned as ``IOError``
+                  objects containing the error message of the server.
+        """
+        assert type(slave_address) is int
+        assert (tx_data is None) or (type(tx_data) is bytes)
+        assert (rx_length is None) or (type(rx_length) is int)
+        assert type(read_delay) in [float, int]
+        assert type(timeout) in [float, int]
+
+        with self._lock:
+            request_id = self._next_request_id
+            self._next_request_id = (request_id + 1) & 0xFFFFFFFF
+            self._socket.sendall(REQUEST_FRAME.pack(
+                request_id,
+                slave_address,
+                len(tx_data) if tx_data is not None else NONE_LENGTH,
+                rx_length if rx_length is not None else NONE_LENGTH,
+                read_delay,
+                timeout,
+            ) + (tx_data or b""))
+            response_id, multi_channel, count = \
+                RESPONSE_FRAME.unpack(self._receive(RESPONSE_FRAME.size))
+            if response_id != request_id:
+                raise IOError("Received response for request {} while "
+                              "expecting {}.".format(response_id, request_id))
+            results = [self._receive_result() for _ in range(count)]
+        return results if multi_channel else results[0]
+
+    def _receive_result(self):
+        """
+        Receive and deserialize a single result frame.
+        """
+        header = self._receive(RESULT_FRAME.size)
+        _, error_length, rx_length = RESULT_FRAME.unpack(header)
+        body = self._receive(error_length + rx_length)
+        return unpack_result(header + body, 0)[0]
+
+    def _receive(self, length):
+        """
+        Receive exactly the given number of bytes from the server.
+        """
+        while len(self._rx_buffer) < length:
+            data = self._socket.recv(max(65536, length))
+            if not data:
+                raise IOError("Connection to bus server '{}' closed."
+                              .format(self._socket_path))
+            self._rx_buffer += data
+        data = bytes(self._rx_buffer[:length])
+        del self._rx_buffer[:length]
+        return data
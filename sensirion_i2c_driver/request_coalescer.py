@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+from .errors import I2cError
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class _Flight(object):
+    """
+    A request which is currently being executed.
+    """
+
+    def __init__(self):
+        super(_Flight, self).__init__()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class I2cRequestCoalescer(object):
+    """
+    Single-flight coalescing of identical concurrent requests, used by
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection` (see
+    :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.request_coalescer`).
+
+    If a request is executed while an identical request (same key) is already
+    running in another thread, it does not access the bus but waits for the
+    running request and returns its result. Optionally, results are also
+    served to identical requests arriving shortly after the running request
+    completed.
+    """
+
+    def __init__(self, freshness=0.0, clock=None):
+        """
+        Create a request coalescer.
+
+        :param float freshness:
+            Time (in Seconds) a completed result is served to identical
+            requests. Defaults to 0.0, i.e. only requests arriving while the
+            transaction is running are coalesced.
+        :param clock:
+            Clock used for the freshness window, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        """
+        super(I2cRequestCoalescer, self).__init__()
+        self._freshness = float(freshness)
+        self._clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._recent = {}
+        self._executed = 0
+        self._coalesced = 0
+        self._fresh_hits = 0
+
+    @property
+    def freshness(self):
+        """
+        Time (in Seconds) a completed result is served to identical requests.
+
+        :type: float
+        """
+        return self._freshness
+
+    @property
+    def stats(self):
+        """
+        Statistics about the coalescing.
+
+        :return:
+            Dict with the number of ``executed`` requests, the number of
+            requests which were ``coalesced`` with a running request, and the
+            number of requests served from a recently completed request
+            (``fresh_hits``).
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "fresh_hits": self._fresh_hits,
+            }
+
+    def execute(self, key, function, reusable=None):
+        """
+        Execute a function, or attach to an identical running execution.
+
+        :param hashable key:
+            Key identifying identical requests.
+        :param callable function:
+            Function without parameters which executes the request.
+        :param callable/None reusable:
+            Optional function which gets the result and returns whether it
+            may be served to identical requests arriving after completion
+            (e.g. False for error responses). None means that every result
+            is reusable.
+        :return: The return value of the function.
+        :raise:
+            The exception raised by the function, if any. If the function
+            was aborted by a non-``Exception`` (e.g. ``KeyboardInterrupt``),
+            it is raised in the executing thread only, and the coalesced
+            requests raise an
+            :py:class:`~sensirion_i2c_driver.errors.I2cError`.
+        """
+        leader = False
+        with self._lock:
+            if self._freshness > 0.0:
+                recent = self._recent.get(key)
+                if (recent is not None) and \
+                        (self._clock.monotonic() - recent[1] < self._freshness):
+                    self._fresh_hits += 1
+                    return recent[0]
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self._coalesced += 1
+            else:
+                flight = _Flight()
+                self._in_flight[key] = flight
+                self._executed += 1
+                leader = True
+        if leader:
+            try:
+                flight.result = function()
+            except Exception as e:
+                flight.error = e
+            except BaseException as e:
+                # E.g. KeyboardInterrupt: Only raised in the leader thread,
+                # but the waiting requests must fail as well
+                flight.error = I2cError(
+                    message="Coalesced request was aborted ({})."
+                    .format(type(e).__name__))
+                raise
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                    if (self._freshness > 0.0) and (flight.error is None) \
+                            and ((reusable is None) or
+                                 reusable(flight.result)):
+                        self._store_recent(key, flight.result)
+                flight.done.set()
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _store_recent(self, key, result):
+        """
+        Store a completed result and drop all expired results. Must be called
+        with the lock held.
+        """
+        now = self._clock.monotonic()
+        for k in [k for k, (_, completed) in self._recent.items()
+                  if now - completed >= self._freshness]:
+            del self._recent[k]
+        self._recent[key] = (result, now)
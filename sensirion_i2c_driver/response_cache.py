@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+from collections import OrderedDict
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class I2cResponseCache(object):
+    """
+    Bounded LRU cache for raw responses of idempotent commands, used by
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection` (see
+    :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.response_cache`).
+
+    Only commands which declare themselves as cacheable (see the
+    ``cache_ttl`` parameter of
+    :py:class:`~sensirion_i2c_driver.command.I2cCommand`) are cached. Entries
+    are identified by slave address, TX data and RX length.
+    """
+
+    def __init__(self, max_size=128, clock=None):
+        """
+        Create an empty response cache.
+
+        :param int max_size:
+            Maximum number of cached responses. If the cache is full, the
+            least recently used entry gets evicted.
+        :param clock:
+            Clock used for the expiry of entries, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        """
+        super(I2cResponseCache, self).__init__()
+        self._max_size = int(max_size)
+        self._clock = clock or SYSTEM_CLOCK
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_size(self):
+        """
+        Maximum number of cached responses.
+
+        :type: int
+        """
+        return self._max_size
+
+    @property
+    def stats(self):
+        """
+        Statistics about the cache usage.
+
+        :return:
+            Dict with the number of ``hits``, ``misses``, ``evictions`` and
+            the current ``size`` of the cache.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "size": len(self._entries),
+            }
+
+    def get(self, slave_address, tx_data, rx_length):
+        """
+        Get a cached response.
+
+        :param byte slave_address: The slave address.
+        :param bytes/None tx_data: The sent data.
+        :param int/None rx_length: The number of read bytes.
+        :return: The cached raw response, or None if there is no valid entry.
+        """
+        key = (slave_address, tx_data, rx_length)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, expiry = entry
+                if expiry > self._clock.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return list(response) if isinstance(response, tuple) \
+                        else response
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, slave_address, tx_data, rx_length, response, ttl):
+        """
+        Store a response in the cache.
+
+        :param byte slave_address: The slave address.
+        :param bytes/None tx_data: The sent data.
+        :param int/None rx_length: The number of read bytes.
+        :param response:
+            The raw response (bytes, or a list for multi-channel responses).
+        :param float ttl:
+            Time to live in Seconds, ``float('inf')`` to cache it forever.
+        """
+        key = (slave_address, tx_data, rx_length)
+        if isinstance(response, list):
+            response = tuple(response)
+        with self._lock:
+            self._entries[key] = (response, self._clock.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, slave_address=None):
+        """
+        Remove cached responses, for example after a device reset.
+
+        :param byte/None slave_address:
+            Only remove the entries of this slave address, or None to remove
+            all entries.
+        """
+        with self._lock:
+            if slave_address is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries
+                            if k[0] == slave_address]:
+                    del self._entries[key]
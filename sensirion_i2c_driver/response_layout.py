@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .errors import I2cChecksumError
+from collections import namedtuple
+import struct
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# Types of named fields, each decoded to exactly one value.
+_FIELD_TYPES = ("B", "b", "H", "h", "I", "i", "f")
+
+
+class ResponseField(object):
+    """
+    Declaration of a single field of a
+    :py:class:`~sensirion_i2c_driver.response_layout.ResponseLayout`.
+    """
+
+    def __init__(self, name, data_type, scale=None, offset=None):
+        """
+        Declare a response field.
+
+        :param str/None name:
+            Name of the field in the decoded tuple. None declares padding
+            (reserved bytes) which is skipped while decoding.
+        :param str data_type:
+            Big-endian :py:mod:`struct` type of the field. Supported are
+            ``"B"``, ``"b"``, ``"H"``, ``"h"``, ``"I"``, ``"i"`` and ``"f"``.
+            For padding, any number of ``"x"`` is allowed (e.g. ``"xx"``).
+        :param float/None scale:
+            Optional factor to convert the raw value into its physical unit.
+        :param float/None offset:
+            Optional offset added after scaling the raw value.
+        """
+        super(ResponseField, self).__init__()
+        self.name = name
+        self.data_type = data_type
+        self.scale = scale
+        self.offset = offset
+        self.size = struct.calcsize(">" + data_type)
+        if name is None:
+            supported = (len(data_type) > 0) and (set(data_type) == {"x"})
+        else:
+            supported = data_type in _FIELD_TYPES
+        if not supported:
+            raise ValueError("Unsupported response field type '{}'."
+                             .format(data_type))
+
+
+def _combine_unsigned(high, low):
+    return (high << 16) | low
+
+
+def _combine_signed(high, low):
+    value = (high << 16) | low
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+_FLOAT_FROM_WORDS = struct.Struct(">HH")
+_FLOAT = struct.Struct(">f")
+
+
+def _combine_float(high, low):
+    return _FLOAT.unpack(_FLOAT_FROM_WORDS.pack(high, low))[0]
+
+
+# Converters to combine two 16-bit words (separated by a CRC byte) to a
+# 32-bit value.
+_WORD_COMBINERS = {
+    "I": _combine_unsigned,
+    "i": _combine_signed,
+    "f": _combine_float,
+}
+
+
+class _CompiledLayout(object):
+    """
+    A response layout compiled for data with or without CRCs.
+    """
+
+    def __init__(self, fields, tuple_type, crc_interleaved):
+        super(_CompiledLayout, self).__init__()
+        raw_format = ">"
+        position = 0  # position in the data without CRCs
+        index = 0  # index in the tuple returned by struct.unpack()
+        converters = []  # (tuple index, combiner, scale, offset) per field
+        for field in fields:
+            combiner = None
+            if field.name is None:
+                types = ["x"] * field.size
+            elif not crc_interleaved:
+                types = [field.data_type]
+            elif (position % 2) + field.size <= 2:
+                types = [field.data_type]
+            elif (field.size == 4) and (position % 2 == 0):
+                types = ["H", "H"]
+                combiner = _WORD_COMBINERS[field.data_type]
+            else:
+                raise ValueError("Response field '{}' is not aligned to the "
+                                 "16-bit words.".format(field.name))
+            for t in types:
+                size = struct.calcsize(">" + t)
+                raw_format += t
+                position += size
+                if crc_interleaved and (position % 2 == 0):
+                    raw_format += "x"  # skip CRC byte
+            if field.name is not None:
+                converters.append((index, combiner, field.scale,
+                                   field.offset))
+                index += len(types)
+        if crc_interleaved and (position % 2 != 0):
+            raise ValueError("Response layout does not end on a 16-bit "
+                             "word boundary.")
+        self.struct = struct.Struct(raw_format)
+        self.tuple_type = tuple_type
+        # Fast path: if there are no combined or scaled fields, the unpacked
+        # tuple can be used as-is.
+        self.converters = None if all(
+            c[1:] == (None, None, None) for c in converters) else converters
+
+    def decode(self, data):
+        values = self.struct.unpack(data)
+        if self.converters is None:
+            return self.tuple_type._make(values)
+        result = []
+        for index, combiner, scale, offset in self.converters:
+            if combiner is not None:
+                value = combiner(values[index], values[index + 1])
+            else:
+                value = values[index]
+            if scale is not None:
+                value *= scale
+            if offset is not None:
+                value += offset
+            result.append(value)
+        return self.tuple_type._make(result)
+
+
+class ResponseLayout(object):
+    """
+    Declarative layout of the response of a
+    :py:class:`~sensirion_i2c_driver.sensirion_command.SensirionI2cCommand`.
+
+    The layout is compiled once into a :py:class:`struct.Struct` which
+    decodes the raw (CRC-interleaved) response directly, so no intermediate
+    copy without CRCs is needed. The decoded values are returned as a named
+    tuple.
+
+    Example:
+
+    .. code-block:: python
+
+        class ReadMeasurement(SensirionI2cCommand):
+            response_layout = ResponseLayout("Measurement", [
+                ResponseField("temperature", "h", scale=1.0 / 200.0),
+                ResponseField("humidity", "H", scale=1.0 / 100.0),
+            ])
+    """
+
+    def __init__(self, name, fields):
+        """
+        Create a response layout.
+
+        :param str name:
+            Name of the tuple type of the decoded responses.
+        :param list fields:
+            List of
+            :py:class:`~sensirion_i2c_driver.response_layout.ResponseField`
+            objects, in the order they are received.
+        """
+        super(ResponseLayout, self).__init__()
+        self._fields = list(fields)
+        self._tuple_type = namedtuple(
+            name, [f.name for f in self._fields if f.name is not None])
+        self._compiled = {}
+
+    @property
+    def fields(self):
+        """
+        The fields of the layout.
+
+        :type: list(~sensirion_i2c_driver.response_layout.ResponseField)
+        """
+        return self._fields
+
+    @property
+    def tuple_type(self):
+        """
+        The named tuple type of the decoded responses.
+
+        :type: type
+        """
+        return self._tuple_type
+
+    def rx_length(self, crc_interleaved=True):
+        """
+        Get the number of bytes of the raw response.
+
+        :param bool crc_interleaved:
+            Whether the response contains a CRC after every 16-bit word.
+        :return: The number of bytes to read.
+        :rtype: int
+        """
+        return self._compile(crc_interleaved).struct.size
+
+    def decode(self, data, crc=None):
+        """
+        Validate the CRCs of a raw response and decode it.
+
+        :param bytes data:
+            Received raw bytes from the read operation.
+        :param calleable crc:
+            The CRC calculator used by the command, or None if the data does
+            not contain CRCs.
+        :return: The decoded values.
+        :rtype: Named tuple (see
+            :py:attr:`~sensirion_i2c_driver.response_layout.ResponseLayout.tuple_type`)
+        :raise ~sensirion_i2c_driver.errors.I2cChecksumError:
+            If a received CRC was wrong.
+        """
+        compiled = self._compile(crc is not None)
+        if len(data) != compiled.struct.size:
+            raise ValueError("Received {} bytes, but the response layout "
+                             "needs {} bytes.".format(len(data),
+                                                      compiled.struct.size))
+        if crc is not None:
+            for i in range(2, len(data), 3):
+                expected_crc = crc(data[i - 2:i])
+                if data[i] != expected_crc:
+                    raise I2cChecksumError(data[i], expected_crc, data)
+        return compiled.decode(data)
+
+    def _compile(self, crc_interleaved):
+        compiled = self._compiled.get(crc_interleaved)
+        if compiled is None:
+            compiled = _CompiledLayout(self._fields, self._tuple_type,
+                                       crc_interleaved)
+            self._compiled[crc_interleaved] = compiled
+        return compiled
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .errors import I2cChecksumError, I2cNackError, \
+    I2cDeviceUnavailableError
+import random
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class I2cRetryPolicy(object):
+    """
+    Retry policy for failed commands, used by
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection` (see
+    :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.retry_policy`).
+
+    The number of retries is configured per exception type. Between the
+    attempts, the policy waits for an exponentially increasing, jittered
+    backoff time. Optionally, all retries of a command are limited by a total
+    deadline.
+
+    If a command fails with a checksum error and declares that its response
+    can be re-read (see the ``rereadable`` parameter of
+    :py:class:`~sensirion_i2c_driver.command.I2cCommand`), the retry only
+    repeats the read operation, without sending the command again and without
+    waiting for its read delay.
+    """
+
+    #: Default number of retries per exception type.
+    DEFAULT_MAX_RETRIES = {
+        I2cChecksumError: 2,
+        I2cNackError: 1,
+    }
+
+    def __init__(self, max_retries=None, backoff=0.0, backoff_factor=2.0,
+                 jitter=0.0, deadline=None, reread_on_checksum_error=True,
+                 rng=None):
+        """
+        Create a retry policy.
+
+        :param dict/None max_retries:
+            Dict with the maximum number of retries per exception type. The
+            most specific matching type of a raised exception is used, i.e.
+            subclasses are included. Exceptions without matching type are not
+            retried. None to use :py:attr:`DEFAULT_MAX_RETRIES`.
+        :param float backoff:
+            Time (in Seconds) to wait before the first retry.
+        :param float backoff_factor:
+            Factor to increase the backoff time after every retry.
+        :param float jitter:
+            Relative random variation of the backoff time, e.g. 0.2 for
+            ±20%. Defaults to 0.0 (no jitter).
+        :param float/None deadline:
+            Maximum total time (in Seconds) for all attempts of a command. No
+            further retry is started if it could not finish before the
+            deadline. None (the default) means no deadline.
+        :param bool reread_on_checksum_error:
+            Whether to only repeat the read operation on checksum errors of
+            commands which allow it.
+        :param random.Random/None rng:
+            Random number generator used for the jitter (mainly intended for
+            testing).
+        """
+        super(I2cRetryPolicy, self).__init__()
+        self._max_retries = dict(self.DEFAULT_MAX_RETRIES
+                                 if max_retries is None else max_retries)
+        self._backoff = float(backoff)
+        self._backoff_factor = float(backoff_factor)
+        self._jitter = float(jitter)
+        self._deadline = float(deadline) if deadline is not None else None
+        self._reread_on_checksum_error = bool(reread_on_checksum_error)
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._retries = 0
+        self._rereads = 0
+        self._exhausted = 0
+
+    @property
+    def deadline(self):
+        """
+        Maximum total time (in Seconds) for all attempts of a command, or
+        None.
+
+        :type: float/None
+        """
+        return self._deadline
+
+    @property
+    def stats(self):
+        """
+        Statistics about the retries.
+
+        :return:
+            Dict with the number of ``retries`` (including re-reads), the
+            number of ``rereads`` and the number of commands which failed
+            after retrying (``exhausted``).
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "retries": self._retries,
+                "rereads": self._rereads,
+                "exhausted": self._exhausted,
+            }
+
+    def retry_key(self, error):
+        """
+        Get the configured exception type matching an error.
+
+        :param Exception error: The raised exception.
+        :return:
+            The most specific configured exception type, or None if the error
+            must not be retried.
+        :rtype: type/None
+        """
+        if isinstance(error, I2cDeviceUnavailableError):
+            return None  # handled by the circuit breaker
+        for cls in type(error).__mro__:
+            if cls in self._max_retries:
+                return cls
+        return None
+
+    def max_retries(self, key):
+        """
+        Get the maximum number of retries for an exception type.
+
+        :param type key: The exception type (see :py:meth:`retry_key`).
+        :return: The maximum number of retries.
+        :rtype: int
+        """
+        return self._max_retries.get(key, 0)
+
+    def backoff_time(self, retry):
+        """
+        Get the time to wait before a retry.
+
+        :param int retry: Number of the retry (starting at 1).
+        :return: The backoff time in Seconds.
+        :rtype: float
+        """
+        delay = self._backoff * self._backoff_factor ** (retry - 1)
+        if self._jitter > 0.0:
+            delay *= self._rng.uniform(1.0 - self._jitter, 1.0 + self._jitter)
+        return max(delay, 0.0)
+
+    def is_reread(self, error, command):
+        """
+        Check whether a retry only needs to repeat the read operation.
+
+        :param Exception error: The raised exception.
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The failed command.
+        :rtype: bool
+        """
+        return self._reread_on_checksum_error and \
+            isinstance(error, I2cChecksumError) and \
+            command.rereadable and bool(command.rx_length)
+
+    def record_retry(self, reread):
+        """
+        Count a retry (called by the connection).
+
+        :param bool reread: Whether only the read operation is repeated.
+        """
+        with self._lock:
+            self._retries += 1
+            if reread:
+                self._rereads += 1
+
+    def record_exhausted(self):
+        """
+        Count a command which failed after retrying (called by the
+        connection).
+        """
+        with self._lock:
+            self._exhausted += 1
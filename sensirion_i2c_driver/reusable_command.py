@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .sensirion_command import SensirionI2cCommand
+
+
+class ReusableSensirionI2cCommand(SensirionI2cCommand):
+    """
+    Sensirion I²C command whose TX payload can be modified in place, for
+    example for set-point or configuration commands which are sent
+    repeatedly with changing values.
+
+    The TX data (including the CRCs) is built only once. Updating a payload
+    word with
+    :py:meth:`~sensirion_i2c_driver.reusable_command.ReusableSensirionI2cCommand.set_word`
+    rewrites only the two bytes of the word and its CRC, without creating a
+    new command object.
+
+    .. note:: Since transceivers expect the TX data as immutable ``bytes``,
+              :py:attr:`tx_data` returns a snapshot of the internal buffer.
+              The snapshot is only created again after the payload has been
+              modified, so sending the same values repeatedly does not
+              allocate any memory.
+    """
+
+    def __init__(self, command, tx_data, rx_length, read_delay, timeout, crc,
+                 command_bytes=2, post_processing_time=0.0, cache_ttl=None,
+                 rereadable=False):
+        """
+        Constructs a new reusable Sensirion I²C command.
+
+        For details (e.g. parameter documentation), please refer to
+        :py:meth:`~sensirion_i2c_driver.sensirion_command.SensirionI2cCommand.__init__`.
+        The initial ``tx_data`` determines the number of payload words, which
+        cannot be changed afterwards.
+        """
+        self._tx_buffer = None
+        self._tx_bytes = None
+        super(ReusableSensirionI2cCommand, self).__init__(
+            command=command,
+            tx_data=tx_data,
+            rx_length=rx_length,
+            read_delay=read_delay,
+            timeout=timeout,
+            crc=crc,
+            command_bytes=command_bytes,
+            post_processing_time=post_processing_time,
+            cache_ttl=cache_ttl,
+            rereadable=rereadable,
+        )
+        self._payload_offset = command_bytes if command is not None else 0
+        self._word_stride = 3 if crc is not None else 2
+
+    @property
+    def tx_data(self):
+        """
+        The data bytes to be sent to the device.
+
+        :type: bytes/None
+        """
+        if (self._tx_bytes is None) and (self._tx_buffer is not None):
+            self._tx_bytes = bytes(self._tx_buffer)
+        return self._tx_bytes
+
+    @tx_data.setter
+    def tx_data(self, value):
+        self._tx_buffer = bytearray(value) if value is not None else None
+        self._tx_bytes = value
+
+    @property
+    def word_count(self):
+        """
+        Number of 16-bit payload words.
+
+        :type: int
+        """
+        if self._tx_buffer is None:
+            return 0
+        return (len(self._tx_buffer) - self._payload_offset) // \
+            self._word_stride
+
+    def set_word(self, index, value):
+        """
+        Update a single 16-bit payload word (and its CRC) in place.
+
+        :param int index:
+            Index of the payload word (0 for the first word after the command
+            ID).
+        :param int value:
+            The new value. Negative values are encoded as two's complement.
+        """
+        if not 0 <= index < self.word_count:
+            raise IndexError("Payload word index {} out of range."
+                             .format(index))
+        position = self._payload_offset + index * self._word_stride
+        buffer = self._tx_buffer
+        high = (value >> 8) & 0xFF
+        low = value & 0xFF
+        if (buffer[position] == high) and (buffer[position + 1] == low):
+            return  # unchanged, keep the current snapshot
+        buffer[position] = high
+        buffer[position + 1] = low
+        if self._crc is not None:
+            buffer[position + 2] = self._crc(buffer[position:position + 2])
+        self._tx_bytes = None
+
+    def set_words(self, values, start=0):
+        """
+        Update several consecutive 16-bit payload words in place.
+
+        :param iterable values: The new values.
+        :param int start: Index of the first payload word to update.
+        """
+        for i, value in enumerate(values):
+            self.set_word(start + i, value)
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+import json
+import mmap
+import os
+import re
+import struct
+
+import logging
+log = logging.getLogger(__name__)
+
+
+_SCHEMA_FILE = "schema.json"
+_SCHEMA_VERSION = 1
+
+# Part header: magic, version, reserved, number of committed samples.
+_MAGIC = b"SCR1"
+_HEADER = struct.Struct("<4sHHQ")
+_COUNT_OFFSET = 8
+_COUNT = struct.Struct("<Q")
+
+_PART_NAME = "{:06d}"
+_PART_HEADER = re.compile(r"^(\d{6})\.hdr$")
+
+#: Name of the timestamp column, which is contained in every recording.
+TIMESTAMP_FIELD = "timestamp"
+
+#: Supported :py:mod:`struct` formats of the columns (stored little-endian).
+COLUMN_FORMATS = "bBhHiIqQfd?"
+
+
+def _column_file(path, part, name):
+    return os.path.join(path, (_PART_NAME + ".{}.col").format(part, name))
+
+
+def _header_file(path, part):
+    return os.path.join(path, (_PART_NAME + ".hdr").format(part))
+
+
+class _Column(object):
+    """
+    A memory-mapped column file of the current part of a recording.
+    """
+
+    def __init__(self, file_path, column_format):
+        super(_Column, self).__init__()
+        self.struct = struct.Struct("<" + column_format)
+        self.file_descriptor = os.open(file_path,
+                                       os.O_RDWR | os.O_CREAT | os.O_TRUNC,
+                                       0o644)
+        self.mmap = None
+
+    def resize(self, capacity):
+        if self.mmap is not None:
+            self.mmap.close()
+        size = capacity * self.struct.size
+        os.ftruncate(self.file_descriptor, size)
+        self.mmap = mmap.mmap(self.file_descriptor, size) if size else None
+
+    def close(self, count):
+        if self.mmap is not None:
+            self.mmap.flush()
+            self.mmap.close()
+            self.mmap = None
+        # Release the preallocated but unused space
+        os.ftruncate(self.file_descriptor, count * self.struct.size)
+        os.close(self.file_descriptor)
+
+
+class SampleRecorder(object):
+    """
+    Records timestamped samples (e.g. the interpreted responses of
+    :py:meth:`~sensirion_i2c_driver.device.I2cDevice.execute`) into
+    memory-mapped column files, to be analyzed later with
+    :py:class:`~sensirion_i2c_driver.sample_recorder.SampleRecording`.
+
+    A recording is a directory containing a ``schema.json`` file and one or
+    more parts. Every part consists of a small header file and one file per
+    field (plus one for the timestamps), each containing a fixed-width
+    little-endian array. Appending a sample just writes the values into the
+    memory-mapped files, no formatting and no syscalls are needed. The files
+    are preallocated in segments of ``segment_size`` samples.
+
+    The header contains the number of committed samples and is updated after
+    the values of a sample were written, so a crash never leaves partially
+    written samples in the recording. If the recorder is created on an
+    existing recording with the same fields, it continues with a new part.
+
+    With ``part_size``, a new part is started after the given number of
+    samples (rollover), and with ``max_parts`` the oldest parts are deleted
+    to limit the disk usage.
+
+    .. note:: This class can be used in a "with"-statement, and it's
+              recommended to do so as it automatically closes the files after
+              using it.
+    """
+
+    def __init__(self, path, fields, segment_size=65536, part_size=None,
+                 max_parts=None, clock=None):
+        """
+        Create a recording, or continue an existing one.
+
+        :param str path: Path of the recording directory.
+        :param list fields:
+            Tuples ``(name, format)`` of the sample values, with the
+            :py:mod:`struct` format of a single value (one of
+            :py:data:`COLUMN_FORMATS`), for example
+            ``[("temperature", "f"), ("humidity", "f")]``.
+        :param int segment_size:
+            Number of samples by which the column files grow.
+        :param int/None part_size:
+            Number of samples after which a new part is started, or None to
+            record everything into a single part.
+        :param int/None max_parts:
+            Maximum number of parts to keep (the oldest parts are deleted),
+            or None to keep all parts.
+        :param clock:
+            Clock used for the timestamps of the samples, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        """
+        super(SampleRecorder, self).__init__()
+        fields = [(str(name), str(fmt)) for name, fmt in fields]
+        for name, fmt in fields:
+            if (len(fmt) != 1) or (fmt not in COLUMN_FORMATS):
+                raise ValueError("Unsupported format '{}' of field '{}'."
+                                 .format(fmt, name))
+            if not re.match(r"^\w+$", name) or name == TIMESTAMP_FIELD:
+                raise ValueError("Invalid field name '{}'.".format(name))
+        if segment_size < 1:
+            raise ValueError("Segment size must be positive.")
+        self._path = path
+        self._fields = [(TIMESTAMP_FIELD, "d")] + fields
+        self._segment_size = int(segment_size)
+        self._part_size = part_size
+        self._max_parts = max_parts
+        self._clock = clock or SYSTEM_CLOCK
+        self._columns = []
+        self._header_fd = None
+        self._header = None
+        parts = self._init_directory()
+        self._part = parts[-1] + 1 if parts else 0
+        self._open_part()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def path(self):
+        """
+        Path of the recording directory.
+
+        :type: str
+        """
+        return self._path
+
+    @property
+    def fields(self):
+        """
+        Names and formats of the columns, including the timestamp.
+
+        :type: list(tuple)
+        """
+        return list(self._fields)
+
+    @property
+    def part(self):
+        """
+        Number of the part currently being written.
+
+        :type: int
+        """
+        return self._part
+
+    @property
+    def count(self):
+        """
+        Number of samples committed to the current part.
+
+        :type: int
+        """
+        return self._count
+
+    def append(self, values, timestamp=None):
+        """
+        Append a sample.
+
+        :param tuple/object values:
+            The values of the sample in the order of the fields (e.g. the
+            named tuple of a
+            :py:class:`~sensirion_i2c_driver.response_layout.ResponseLayout`).
+            A single value may be passed without wrapping it into a tuple.
+        :param float/None timestamp:
+            Timestamp of the sample in Seconds since the epoch, or None to use
+            the current time.
+        """
+        if not isinstance(values, tuple):
+            values = (values,)
+        if len(values) != len(self._columns) - 1:
+            raise ValueError("Expected {} values, got {}.".format(
+                len(self._columns) - 1, len(values)))
+        if timestamp is None:
+            timestamp = self._clock.time()
+        if (self._part_size is not None) and \
+                (self._count >= self._part_size):
+            self._rollover()
+        index = self._count
+        if index >= self._capacity:
+            self._grow()
+        for column, value in zip(self._columns, (timestamp,) + values):
+            column.struct.pack_into(column.mmap, index * column.struct.size,
+                                    value)
+        # Commit the sample only after all values are written
+        self._count = index + 1
+        _COUNT.pack_into(self._header, _COUNT_OFFSET, self._count)
+
+    def execute_and_append(self, device, command):
+        """
+        Execute a command on a device and append its interpreted response.
+
+        :param ~sensirion_i2c_driver.device.I2cDevice device:
+            The device to execute the command on.
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to execute.
+        :return: The interpreted response of the command.
+        """
+        response = device.execute(command)
+        self.append(response)
+        return response
+
+    def flush(self):
+        """
+        Write the memory-mapped data to disk (the column files first, then
+        the header), so the committed samples survive a power loss.
+        """
+        for column in self._columns:
+            if column.mmap is not None:
+                column.mmap.flush()
+        self._header.flush()
+
+    def close(self):
+        """
+        Flush and close the files of the current part.
+        """
+        if self._header is None:
+            return
+        self.flush()
+        self._close_part()
+
+    def _init_directory(self):
+        """
+        Create the recording directory and its schema, or validate the
+        schema of an existing recording.
+
+        :return: The numbers of the existing parts.
+        """
+        schema = {
+            "version": _SCHEMA_VERSION,
+            "fields": [[name, fmt] for name, fmt in self._fields],
+        }
+        schema_path = os.path.join(self._path, _SCHEMA_FILE)
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+        if os.path.exists(schema_path):
+            with open(schema_path, "r") as f:
+                if json.load(f) != schema:
+                    raise ValueError("'{}' contains a recording with other "
+                                     "fields.".format(self._path))
+            return _list_parts(self._path)
+        temp_path = schema_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(schema, f)
+        os.rename(temp_path, schema_path)
+        return []
+
+    def _open_part(self):
+        self._columns = [
+            _Column(_column_file(self._path, self._part, name), fmt)
+            for name, fmt in self._fields]
+        self._capacity = 0
+        self._count = 0
+        self._grow()
+        # Create the header last, so readers never see a part with missing
+        # column files
+        header_path = _header_file(self._path, self._part)
+        self._header_fd = os.open(header_path,
+                                  os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self._header_fd, _HEADER.size)
+        self._header = mmap.mmap(self._header_fd, _HEADER.size)
+        _HEADER.pack_into(self._header, 0, _MAGIC, _SCHEMA_VERSION, 0, 0)
+        log.debug("SampleRecorder: Started part {} of {}".format(
+            self._part, self._path))
+
+    def _close_part(self):
+        for column in self._columns:
+            column.close(self._count)
+        self._columns = []
+        self._header.close()
+        self._header = None
+        os.close(self._header_fd)
+        self._header_fd = None
+
+    def _grow(self):
+        self._capacity += self._segment_size
+        for column in self._columns:
+            column.resize(self._capacity)
+
+    def _rollover(self):
+        self.close()
+        self._part += 1
+        self._open_part()
+        if self._max_parts is not None:
+            parts = _list_parts(self._path)
+            for part in parts[:max(len(parts) - self._max_parts, 0)]:
+                _delete_part(self._path, part, self._fields)
+
+
+def _list_parts(path):
+    """
+    Get the numbers of the parts of a recording, in ascending order.
+    """
+    parts = []
+    for name in os.listdir(path):
+        match = _PART_HEADER.match(name)
+        if match:
+            parts.append(int(match.group(1)))
+    return sorted(parts)
+
+
+def _delete_part(path, part, fields):
+    # Delete the header first, so readers ignore the part immediately
+    os.remove(_header_file(path, part))
+    for name, _ in fields:
+        os.remove(_column_file(path, part, name))
+    log.debug("SampleRecorder: Deleted part {} of {}".format(part, path))
+
+
+class SampleRecording(object):
+    """
+    Reads a recording written by
+    :py:class:`~sensirion_i2c_driver.sample_recorder.SampleRecorder`, also
+    while it is still being written.
+
+    The columns can be read as NumPy arrays which are memory-mapped to the
+    column files, so even huge recordings are opened without copying (this
+    requires `NumPy <https://numpy.org>`_ to be installed). Without NumPy,
+    the samples can be iterated with :py:meth:`samples`.
+
+    Only committed samples are read, i.e. samples which were completely
+    written before opening the recording or calling :py:meth:`refresh`.
+    """
+
+    def __init__(self, path):
+        """
+        Open a recording.
+
+        :param str path: Path of the recording directory.
+        :raise IOError: If the directory does not contain a recording.
+        """
+        super(SampleRecording, self).__init__()
+        schema_path = os.path.join(path, _SCHEMA_FILE)
+        if not os.path.exists(schema_path):
+            raise IOError("'{}' is not a sample recording.".format(path))
+        with open(schema_path, "r") as f:
+            schema = json.load(f)
+        if schema.get("version") != _SCHEMA_VERSION:
+            raise IOError("Unsupported recording version in '{}'."
+                          .format(path))
+        self._path = path
+        self._fields = [(name, fmt) for name, fmt in schema["fields"]]
+        self._counts = []
+        self.refresh()
+
+    @property
+    def fields(self):
+        """
+        Names and formats of the columns, including the timestamp.
+
+        :type: list(tuple)
+        """
+        return list(self._fields)
+
+    @property
+    def parts(self):
+        """
+        Numbers of the parts of the recording and their number of committed
+        samples.
+
+        :type: list(tuple(int, int))
+        """
+        return list(self._counts)
+
+    def __len__(self):
+        return sum(count for _, count in self._counts)
+
+    def refresh(self):
+        """
+        Update the parts and sample counts, to read samples appended since
+        opening the recording.
+        """
+        counts = []
+        for part in _list_parts(self._path):
+            try:
+                with open(_header_file(self._path, part), "rb") as f:
+                    data = f.read(_HEADER.size)
+            except (IOError, OSError):
+                continue  # deleted by rollover in the meantime
+            if len(data) < _HEADER.size:
+                continue  # header not yet initialized
+            magic, _, _, count = _HEADER.unpack(data)
+            if magic == _MAGIC:
+                counts.append((part, count))
+        self._counts = counts
+
+    def column(self, name, part=None):
+        """
+        Get a column as NumPy array.
+
+        :param str name: The field name, or ``"timestamp"``.
+        :param int/None part:
+            Number of the part to read, or None to read all parts. A single
+            part is returned as read-only memory-mapped array (without
+            copying), multiple parts are concatenated into a new array.
+        :rtype: numpy.ndarray
+        """
+        # Delayed import since NumPy is an optional dependency
+        import numpy as np
+        dtype = np.dtype("<" + self._format(name))
+        counts = self._select(part)
+        arrays = []
+        for part, count in counts:
+            if count == 0:
+                continue
+            arrays.append(np.memmap(_column_file(self._path, part, name),
+                                    dtype=dtype, mode="r", shape=(count,)))
+        if len(arrays) == 1:
+            return arrays[0]
+        if not arrays:
+            return np.empty(0, dtype=dtype)
+        return np.concatenate(arrays)
+
+    def samples(self, part=None):
+        """
+        Iterate over the samples (without NumPy).
+
+        :param int/None part:
+            Number of the part to read, or None to read all parts.
+        :return: Tuples with the timestamp and the values of every sample.
+        :rtype: iterator
+        """
+        for part, count in self._select(part):
+            columns = []
+            for name, fmt in self._fields:
+                column_struct = struct.Struct("<" + fmt)
+                with open(_column_file(self._path, part, name), "rb") as f:
+                    data = f.read(count * column_struct.size)
+                columns.append([v[0] for v in
+                                column_struct.iter_unpack(data)])
+            for sample in zip(*columns):
+                yield sample
+
+    def _format(self, name):
+        for field, fmt in self._fields:
+            if field == name:
+                return fmt
+        raise KeyError("Recording has no field '{}'.".format(name))
+
+    def _select(self, part):
+        if part is None:
+            return self._counts
+        counts = [c for c in self._counts if c[0] == part]
+        if not counts:
+            raise KeyError("Recording has no part {}.".format(part))
+        return counts
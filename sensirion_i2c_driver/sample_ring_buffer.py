@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+from collections import namedtuple
+import mmap
+import os
+import struct
+import tempfile
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: A sample read from a ring buffer. ``sequence`` is the running number of
+#: the sample (starting at 1), ``timestamp`` the time it was published (in
+#: Seconds since the epoch) and ``values`` the tuple of published values.
+Sample = namedtuple("Sample", ["sequence", "timestamp", "values"])
+
+_MAGIC = b"SRB1"
+_VERSION = 1
+
+# File header: magic, version, format length, capacity, record size,
+# sequence number of the latest published sample, sample format, replaced
+# flag. The replaced flag is set when a new writer replaced the file.
+_HEADER = struct.Struct("<4sHHIIQ96s")
+_HEADER_SIZE = 128
+_SEQUENCE_OFFSET = 16
+_SEQUENCE = struct.Struct("<Q")
+_REPLACED_OFFSET = 120
+_REPLACED = struct.Struct("<I")
+
+# Maximum number of attempts to read the latest sample while the writer is
+# overwriting it.
+_READ_ATTEMPTS = 100
+
+# Record header: sequence lock, timestamp. The sequence lock is odd while the
+# record is being written and 2*n after sample n was completely written.
+_RECORD_HEADER = struct.Struct("<Qd")
+
+
+class _SampleRingBufferBase(object):
+    """
+    Common functionality of the ring buffer writer and reader.
+    """
+
+    def __init__(self):
+        super(_SampleRingBufferBase, self).__init__()
+        self._file_descriptor = None
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def capacity(self):
+        """
+        Number of samples the ring buffer can hold.
+
+        :type: int
+        """
+        return self._capacity
+
+    @property
+    def sample_format(self):
+        """
+        The :py:mod:`struct` format of the published values.
+
+        :type: str
+        """
+        return self._sample_struct.format
+
+    @property
+    def latest_sequence(self):
+        """
+        Sequence number of the latest published sample (0 if no sample was
+        published yet).
+
+        :type: int
+        """
+        return _SEQUENCE.unpack_from(self._mmap, _SEQUENCE_OFFSET)[0]
+
+    def close(self):
+        """
+        Unmap and close the ring buffer file.
+        """
+        self._mmap.close()
+        self._mmap = None
+        os.close(self._file_descriptor)
+        self._file_descriptor = None
+
+    def _init_layout(self, sample_format, capacity):
+        self._sample_struct = struct.Struct(sample_format)
+        self._capacity = capacity
+        # Align records to 8 bytes to keep the sequence locks aligned.
+        self._record_size = \
+            (_RECORD_HEADER.size + self._sample_struct.size + 7) & ~7
+
+    def _record_offset(self, sequence):
+        return _HEADER_SIZE + \
+            ((sequence - 1) % self._capacity) * self._record_size
+
+
+class SampleRingBufferWriter(_SampleRingBufferBase):
+    """
+    Publishes samples (e.g. the interpreted responses of
+    :py:meth:`~sensirion_i2c_driver.device.I2cDevice.execute`) into a
+    memory-mapped ring buffer with fixed-size records, which can be read by
+    any number of
+    :py:class:`~sensirion_i2c_driver.sample_ring_buffer.SampleRingBufferReader`
+    objects in other processes.
+
+    Every record is protected by a sequence lock, so readers never block the
+    writer and no locking syscalls are needed at all. There must be only one
+    writer per ring buffer.
+
+    A restarted writer builds a new file and atomically replaces the old one
+    (which is marked as replaced), so readers which still have the old file
+    mapped are never affected by a changed file size. They notice the
+    replacement on their next read and switch to the new file.
+
+    .. note:: This class can be used in a "with"-statement, and it's
+              recommended to do so as it automatically closes the file after
+              using it.
+    """
+
+    def __init__(self, path, sample_format, capacity, clock=None):
+        """
+        Create (or replace) a ring buffer file.
+
+        :param str path:
+            Path of the ring buffer file. To keep it in memory, use a file on
+            a tmpfs, for example ``/dev/shm/sensor-data``.
+        :param str sample_format:
+            The :py:mod:`struct` format of the values of a sample, for example
+            ``"<ff"`` for two floats.
+        :param int capacity:
+            Number of samples the ring buffer can hold. Older samples are
+            overwritten.
+        :param clock:
+            Clock used for the timestamps of the samples, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        """
+        super(SampleRingBufferWriter, self).__init__()
+        self._clock = clock or SYSTEM_CLOCK
+        self._init_layout(sample_format, capacity)
+        format_bytes = sample_format.encode("ascii")
+        if len(format_bytes) > 96:
+            raise ValueError("Sample format '{}' is too long."
+                             .format(sample_format))
+        size = _HEADER_SIZE + capacity * self._record_size
+        # Never resize the existing file since readers might have mapped it
+        # (accessing a mapping beyond the end of a file raises SIGBUS)
+        directory, name = os.path.split(os.path.abspath(path))
+        self._file_descriptor, temp_path = tempfile.mkstemp(
+            prefix="." + name + ".", dir=directory)
+        try:
+            os.fchmod(self._file_descriptor, 0o644)
+            os.ftruncate(self._file_descriptor, size)
+            self._mmap = mmap.mmap(self._file_descriptor, size)
+            _HEADER.pack_into(self._mmap, 0, _MAGIC, _VERSION,
+                              len(format_bytes), capacity, self._record_size,
+                              0, format_bytes)
+            previous = self._open_previous(path)
+            os.replace(temp_path, path)
+        except Exception:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            os.close(self._file_descriptor)
+            self._file_descriptor = None
+            os.unlink(temp_path)
+            raise
+        if previous is not None:
+            _REPLACED.pack_into(previous, _REPLACED_OFFSET, 1)
+            previous.close()
+        self._sequence = 0
+
+    @staticmethod
+    def _open_previous(path):
+        """
+        Map the header of an existing ring buffer file, to mark it as
+        replaced. Returns None if there is no ring buffer file.
+        """
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            return None
+        try:
+            if os.fstat(fd).st_size < _HEADER_SIZE:
+                return None
+            header = mmap.mmap(fd, _HEADER_SIZE)
+        finally:
+            os.close(fd)
+        if header[:len(_MAGIC)] != _MAGIC:
+            header.close()
+            return None
+        return header
+
+    def publish(self, values, timestamp=None):
+        """
+        Publish a sample.
+
+        :param tuple/object values:
+            The values of the sample, matching the sample format. A single
+            value may be passed without wrapping it into a tuple.
+        :param float/None timestamp:
+            Timestamp of the sample in Seconds since the epoch, or None to use
+            the current time.
+        :return: The sequence number of the published sample.
+        :rtype: int
+        """
+        if not isinstance(values, tuple):
+            values = (values,)
+        if timestamp is None:
+            timestamp = self._clock.time()
+        sequence = self._sequence + 1
+        offset = self._record_offset(sequence)
+        _RECORD_HEADER.pack_into(self._mmap, offset, 2 * sequence - 1,
+                                 timestamp)
+        self._sample_struct.pack_into(self._mmap,
+                                      offset + _RECORD_HEADER.size, *values)
+        _SEQUENCE.pack_into(self._mmap, offset, 2 * sequence)
+        _SEQUENCE.pack_into(self._mmap, _SEQUENCE_OFFSET, sequence)
+        self._sequence = sequence
+        return sequence
+
+    def execute_and_publish(self, device, command):
+        """
+        Execute a command on a device and publish its interpreted response.
+
+        :param ~sensirion_i2c_driver.device.I2cDevice device:
+            The device to execute the command on.
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to execute.
+        :return: The interpreted response of the command.
+        """
+        response = device.execute(command)
+        self.publish(response)
+        return response
+
+
+class SampleRingBufferReader(_SampleRingBufferBase):
+    """
+    Reads samples from a ring buffer written by a
+    :py:class:`~sensirion_i2c_driver.sample_ring_buffer.SampleRingBufferWriter`
+    (typically in another process).
+
+    Reading is lock-free: Samples are decoded directly from the shared memory
+    and validated with the sequence lock of their record. Samples which were
+    overwritten while reading are skipped.
+
+    If the writer is restarted (i.e. the file was replaced), the reader
+    switches to the new file on the next read. The sequence numbers then
+    start again at 1, see :py:attr:`restarts`.
+
+    .. note:: This class can be used in a "with"-statement, and it's
+              recommended to do so as it automatically closes the file after
+              using it.
+    """
+
+    def __init__(self, path):
+        """
+        Open an existing ring buffer file.
+
+        :param str path:
+            Path of the ring buffer file.
+        """
+        super(SampleRingBufferReader, self).__init__()
+        self._path = path
+        self._open()
+        self._last_sequence = self.latest_sequence
+        self._lost_samples = 0
+        self._restarts = 0
+
+    @property
+    def restarts(self):
+        """
+        Number of times the writer was restarted (i.e. the file was replaced)
+        since opening the ring buffer.
+
+        :type: int
+        """
+        return self._restarts
+
+    @property
+    def lost_samples(self):
+        """
+        Number of samples which were overwritten before
+        :py:meth:`~sensirion_i2c_driver.sample_ring_buffer.SampleRingBufferReader.read_new`
+        could read them.
+
+        :type: int
+        """
+        return self._lost_samples
+
+    def read_latest(self):
+        """
+        Read the latest published sample.
+
+        :return:
+            The latest sample, or None if no sample was published yet or the
+            latest sample could not be read consistently (e.g. because the
+            writer died while overwriting it).
+        :rtype: ~sensirion_i2c_driver.sample_ring_buffer.Sample/None
+        """
+        self._check_replaced()
+        for _ in range(_READ_ATTEMPTS):
+            sequence = self.latest_sequence
+            if sequence == 0:
+                return None
+            sample = self._read_record(sequence)
+            if sample is not None:
+                return sample
+        return None
+
+    def read_new(self):
+        """
+        Read all samples published since the last call of this method (or
+        since opening the ring buffer).
+
+        :return: The new samples, ordered by their sequence number.
+        :rtype: list(~sensirion_i2c_driver.sample_ring_buffer.Sample)
+        """
+        self._check_replaced()
+        latest = self.latest_sequence
+        first = max(self._last_sequence + 1, latest - self._capacity + 1)
+        self._lost_samples += first - (self._last_sequence + 1)
+        samples = []
+        for sequence in range(first, latest + 1):
+            sample = self._read_record(sequence)
+            if sample is not None:
+                samples.append(sample)
+            else:
+                self._lost_samples += 1
+        self._last_sequence = latest
+        return samples
+
+    def _open(self):
+        self._file_descriptor = os.open(self._path, os.O_RDONLY)
+        size = os.fstat(self._file_descriptor).st_size
+        if size < _HEADER_SIZE:
+            os.close(self._file_descriptor)
+            raise IOError("'{}' is not a sample ring buffer."
+                          .format(self._path))
+        self._mmap = mmap.mmap(self._file_descriptor, size,
+                               access=mmap.ACCESS_READ)
+        magic, version, format_length, capacity, _, _, format_bytes = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if (magic != _MAGIC) or (version != _VERSION):
+            self.close()
+            raise IOError("'{}' is not a sample ring buffer."
+                          .format(self._path))
+        self._init_layout(format_bytes[:format_length].decode("ascii"),
+                          capacity)
+
+    def _check_replaced(self):
+        """
+        Switch to the new file if the writer was restarted. All samples of
+        the new file are considered new.
+        """
+        if not _REPLACED.unpack_from(self._mmap, _REPLACED_OFFSET)[0]:
+            return
+        self.close()
+        self._open()
+        self._last_sequence = 0
+        self._restarts += 1
+        log.info("SampleRingBufferReader: Writer of '{}' was restarted."
+                 .format(self._path))
+
+    def _read_record(self, sequence):
+        """
+        Read a record and validate its sequence lock. Returns None if the
+        record does not (or no longer) contain the requested sample.
+        """
+        offset = self._record_offset(sequence)
+        lock, timestamp = _RECORD_HEADER.unpack_from(self._mmap, offset)
+        if lock != 2 * sequence:
+            return None
+        values = self._sample_struct.unpack_from(
+            self._mmap, offset + _RECORD_HEADER.size)
+        if _SEQUENCE.unpack_from(self._mmap, offset)[0] != lock:
+            return None
+        return Sample(sequence, timestamp, values)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+import heapq
+import itertools
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+#: Priority class for latency-critical commands (e.g. control loops).
+PRIORITY_REALTIME = 0
+#: Priority class for regular commands.
+PRIORITY_NORMAL = 1
+#: Priority class for bulk transfers (e.g. history downloads).
+PRIORITY_BULK = 2
+
+
+class _ClassStats(object):
+    """
+    Queueing statistics of a priority class.
+    """
+
+    def __init__(self):
+        super(_ClassStats, self).__init__()
+        self.count = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.deadline_misses = 0
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean_delay": self.total_delay / self.count if self.count else 0.0,
+            "max_delay": self.max_delay,
+            "deadline_misses": self.deadline_misses,
+        }
+
+
+class I2cSchedulerView(object):
+    """
+    A view of an :py:class:`~sensirion_i2c_driver.scheduler.I2cScheduler`
+    with a fixed priority class and deadline. It provides the same execute
+    methods as
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection`, so it can be
+    passed as connection to
+    :py:class:`~sensirion_i2c_driver.device.I2cDevice` objects.
+
+    Use :py:meth:`~sensirion_i2c_driver.scheduler.I2cScheduler.view` to
+    create views.
+    """
+
+    def __init__(self, scheduler, priority, deadline):
+        super(I2cSchedulerView, self).__init__()
+        self._scheduler = scheduler
+        self._priority = priority
+        self._deadline = deadline
+
+    @property
+    def scheduler(self):
+        """
+        The scheduler of this view.
+
+        :type: ~sensirion_i2c_driver.scheduler.I2cScheduler
+        """
+        return self._scheduler
+
+    @property
+    def is_multi_channel(self):
+        """
+        Whether the underlying connection returns multi-channel responses, see
+        :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.is_multi_channel`.
+
+        :type: bool
+        """
+        return self._scheduler.connection.is_multi_channel
+
+    def execute(self, slave_address, command, wait_post_process=True):
+        """
+        Execute a command with the priority class of this view.
+
+        For details, please refer to
+        :py:meth:`~sensirion_i2c_driver.scheduler.I2cScheduler.execute`.
+        """
+        return self._scheduler.execute(slave_address, command,
+                                       self._priority, self._deadline,
+                                       wait_post_process)
+
+    def execute_chunked(self, slave_address, command, chunk_size,
+                        wait_post_process=True):
+        """
+        Execute a command with chunked read and the priority class of this
+        view.
+
+        For details, please refer to
+        :py:meth:`~sensirion_i2c_driver.scheduler.I2cScheduler.execute_chunked`.
+        """
+        return self._scheduler.execute_chunked(
+            slave_address, command, chunk_size, self._priority,
+            self._deadline, wait_post_process)
+
+
+class I2cScheduler(object):
+    """
+    Priority scheduler for an
+    :py:class:`~sensirion_i2c_driver.connection.I2cConnection` shared by
+    several threads with different latency requirements.
+
+    Every command is executed in the calling thread, but only when the bus is
+    free and no command with higher priority is waiting. Commands are
+    ordered by priority class (:py:data:`PRIORITY_REALTIME`,
+    :py:data:`PRIORITY_NORMAL`, :py:data:`PRIORITY_BULK` or any other
+    integer, lower values first), then by deadline (earliest first), then in
+    order of arrival.
+
+    Long reads should be executed with :py:meth:`execute_chunked`: The bus
+    is released after every chunk, so waiting commands with higher priority
+    are dispatched at the next chunk boundary instead of after the whole
+    transfer.
+
+    .. note:: The bus is released while waiting for the post processing
+              time of a command, so commands to other devices can be
+              executed in the meantime. Commands must not be executed on the
+              connection directly while the scheduler is in use.
+    """
+
+    def __init__(self, connection):
+        """
+        Create a scheduler.
+
+        :param ~sensirion_i2c_driver.connection.I2cConnection connection:
+            The connection to schedule. Its clock (see
+            :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.clock`)
+            is used to measure the queueing delays.
+        """
+        super(I2cScheduler, self).__init__()
+        self._connection = connection
+        self._clock = connection.clock
+        self._condition = threading.Condition()
+        self._queue = []  # heap of (priority, deadline, sequence)
+        self._sequence = itertools.count()
+        self._busy = False
+        self._stats = {}
+
+    @property
+    def connection(self):
+        """
+        The scheduled connection.
+
+        :type: ~sensirion_i2c_driver.connection.I2cConnection
+        """
+        return self._connection
+
+    @property
+    def stats(self):
+        """
+        Queueing statistics per priority class.
+
+        :return:
+            Dict with a dict per priority class containing the number of
+            transactions (``count``), the ``mean_delay`` and ``max_delay``
+            between submitting and dispatching a transaction (in Seconds), and
+            the number of ``deadline_misses``. Chunked commands count one
+            transaction per chunk.
+        :rtype: dict
+        """
+        with self._condition:
+            return dict((priority, stats.as_dict())
+                        for priority, stats in self._stats.items())
+
+    def view(self, priority, deadline=None):
+        """
+        Create a view with a fixed priority class and deadline, which can be
+        used as connection of
+        :py:class:`~sensirion_i2c_driver.device.I2cDevice` objects.
+
+        :param int priority: The priority class.
+        :param float/None deadline: The relative deadline (in Seconds).
+        :rtype: ~sensirion_i2c_driver.scheduler.I2cSchedulerView
+        """
+        return I2cSchedulerView(self, priority, deadline)
+
+    def execute(self, slave_address, command, priority=PRIORITY_NORMAL,
+                deadline=None, wait_post_process=True):
+        """
+        Wait until the bus is available for the given priority class, then
+        execute a command.
+
+        :param byte slave_address:
+            The slave address of the device to communicate with.
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to execute.
+        :param int priority:
+            The priority class. Defaults to :py:data:`PRIORITY_NORMAL`.
+        :param float/None deadline:
+            Time (in Seconds, relative to now) until the command should be
+            completed. Within the same priority class, commands with earlier
+            deadline are dispatched first. Commands completed after their
+            deadline are counted in :py:attr:`stats`, but not aborted. None
+            (the default) means no deadline.
+        :param bool wait_post_process:
+            If ``True`` and the passed command needs some time for post
+            processing, this method waits until post processing is done (with
+            the bus released).
+        :return:
+            The response, see
+            :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute`.
+        """
+        deadline_time = self._acquire(priority, deadline)
+        try:
+            response = self._connection.execute(slave_address, command,
+                                                wait_post_process=False)
+        finally:
+            self._release(priority, deadline_time)
+        if wait_post_process and command.post_processing_time > 0.0:
+            self._clock.sleep(command.post_processing_time)
+        return response
+
+    def execute_chunked(self, slave_address, command, chunk_size,
+                        priority=PRIORITY_BULK, deadline=None,
+                        wait_post_process=True):
+        """
+        Execute a command with chunked read (see
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_chunked`),
+        releasing the bus after every chunk.
+
+        :param byte slave_address:
+            The slave address of the device to communicate with.
+        :param ~sensirion_i2c_driver.command.I2cCommand command:
+            The command to execute.
+        :param int chunk_size:
+            Maximum number of bytes to read per read operation.
+        :param int priority:
+            The priority class. Defaults to :py:data:`PRIORITY_BULK`.
+        :param float/None deadline:
+            Time (in Seconds, relative to the start) until the whole transfer
+            should be completed.
+        :param bool wait_post_process:
+            If ``True`` and the passed command needs some time for post
+            processing, this method waits until post processing is done
+            after the last chunk (with the bus released).
+        :return: A generator yielding the raw received chunks (bytes).
+        """
+        if deadline is not None:
+            deadline = self._clock.monotonic() + deadline
+        chunks = self._connection.execute_chunked(
+            slave_address, command, chunk_size, wait_post_process=False)
+        return self._schedule_chunks(chunks, command, priority, deadline,
+                                     wait_post_process)
+
+    def _schedule_chunks(self, chunks, command, priority, deadline,
+                         wait_post_process):
+        """
+        Generator reading the chunks of :py:meth:`execute_chunked`, acquiring
+        the bus for every chunk.
+        """
+        while True:
+            remaining = None if deadline is None \
+                else deadline - self._clock.monotonic()
+            deadline_time = self._acquire(priority, remaining)
+            try:
+                chunk = next(chunks, None)
+            finally:
+                self._release(priority, deadline_time)
+            if chunk is None:
+                break
+            yield chunk
+        if wait_post_process and command.post_processing_time > 0.0:
+            self._clock.sleep(command.post_processing_time)
+
+    def _acquire(self, priority, deadline):
+        """
+        Wait until the bus is free and the caller is the first in the queue.
+
+        :return: The absolute deadline, or None.
+        """
+        with self._condition:
+            submit_time = self._clock.monotonic()
+            deadline_time = submit_time + deadline \
+                if deadline is not None else None
+            entry = (priority,
+                     deadline_time if deadline_time is not None
+                     else float("inf"),
+                     next(self._sequence))
+            heapq.heappush(self._queue, entry)
+            try:
+                while self._busy or (self._queue[0] is not entry):
+                    self._condition.wait()
+            except BaseException:
+                # E.g. KeyboardInterrupt: Remove the entry, otherwise it
+                # would block all other waiting threads forever
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            self._busy = True
+            delay = self._clock.monotonic() - submit_time
+            stats = self._stats.setdefault(priority, _ClassStats())
+            stats.count += 1
+            stats.total_delay += delay
+            stats.max_delay = max(stats.max_delay, delay)
+            return deadline_time
+
+    def _release(self, priority, deadline_time):
+        """
+        Release the bus and wake up the waiting threads.
+        """
+        with self._condition:
+            if (deadline_time is not None) and \
+                    (self._clock.monotonic() > deadline_time):
+                self._stats[priority].deadline_misses += 1
+            self._busy = False
+            self._condition.notify_all()
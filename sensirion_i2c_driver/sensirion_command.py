@@ -17,10 +17,19 @@ class SensirionI2cCommand(I2cCommand):
     - Splitting TX data into command ID and payload data
     - Transparently inserts CRCs into TX data after every 2nd payload byte
     - Transparently verifies and removes CRCs from RX data after every 2nd byte
+    - Optionally decodes RX data according to a declarative
+      :py:attr:`response_layout`
     """
 
+    #: Optional :py:class:`~sensirion_i2c_driver.response_layout.ResponseLayout`
+    #: of the response. Derived classes can set this class attribute to let
+    #: :py:meth:`interpret_response` decode the response into a named tuple,
+    #: instead of returning the bytes without CRCs.
+    response_layout = None
+
     def __init__(self, command, tx_data, rx_length, read_delay, timeout, crc,
-                 command_bytes=2, post_processing_time=0.0):
+                 command_bytes=2, post_processing_time=0.0, cache_ttl=None,
+                 rereadable=False):
         """
         Constructs a new Sensirion I²C command.
 
@@ -66,6 +75,13 @@ class SensirionI2cCommand(I2cCommand):
             example after a device reset command, the device might need some
             time until it is ready again. Usually this is 0.0s, i.e. no post
             processing is needed.
+        :param float/None cache_ttl:
+            Time (in Seconds) the response of this command may be cached, see
+            :py:meth:`~sensirion_i2c_driver.command.I2cCommand.__init__`.
+        :param bool rereadable:
+            Whether the response can be read again without sending the command
+            again, see
+            :py:meth:`~sensirion_i2c_driver.command.I2cCommand.__init__`.
         """
         super(SensirionI2cCommand, self).__init__(
             tx_data=self._build_tx_data(command, command_bytes, tx_data, crc),
@@ -73,6 +89,8 @@ class SensirionI2cCommand(I2cCommand):
             read_delay=read_delay,
             timeout=timeout,
             post_processing_time=post_processing_time,
+            cache_ttl=cache_ttl,
+            rereadable=rereadable,
         )
         self._crc = crc
 
@@ -84,12 +102,16 @@ class SensirionI2cCommand(I2cCommand):
         :param bytes data:
             Received raw bytes from the read operation.
         :return:
-            The received bytes, or None if there is no data received.
+            The received bytes, or None if there is no data received. If
+            :py:attr:`response_layout` is set, the decoded values are
+            returned instead of the bytes.
         :rtype:
-            bytes or None
+            bytes, named tuple or None
         :raise ~sensirion_i2c_driver.errors.I2cChecksumError:
             If a received CRC was wrong.
         """
+        if (self.response_layout is not None) and (len(data) > 0):
+            return self.response_layout.decode(data, self._crc)
         if self._crc is None:
             return data  # data does not contain CRCs -> return it as-is
 
@@ -105,6 +127,37 @@ class SensirionI2cCommand(I2cCommand):
                 data_without_crc.append(data[i])
         return bytes(data_without_crc) if len(data_without_crc) else None
 
+    def interpret_response_chunks(self, chunks):
+        """
+        Validates the CRCs of a response received in chunks (see
+        :py:meth:`~sensirion_i2c_driver.connection.I2cConnection.execute_chunked`)
+        and yields the contained 16-bit words as soon as they are complete.
+        The chunks don't need to be aligned to the words.
+
+        :param iterable chunks:
+            Iterable of received raw bytes.
+        :return:
+            A generator yielding the received words as unsigned integers.
+        :rtype:
+            generator(int)
+        :raise ~sensirion_i2c_driver.errors.I2cChecksumError:
+            If a received CRC was wrong.
+        """
+        word_size = 3 if self._crc is not None else 2
+        pending = bytearray()
+        for chunk in chunks:
+            pending += chunk
+            end = len(pending) - (len(pending) % word_size)
+            for i in range(0, end, word_size):
+                if self._crc is not None:
+                    received_crc = pending[i + 2]
+                    expected_crc = self._crc(pending[i:i + 2])
+                    if received_crc != expected_crc:
+                        raise I2cChecksumError(received_crc, expected_crc,
+                                               bytes(pending[i:i + 3]))
+                yield (pending[i] << 8) | pending[i + 1]
+            del pending[:end]
+
     @staticmethod
     def _build_tx_data(command, command_bytes, tx_data, crc):
         """
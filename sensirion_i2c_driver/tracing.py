@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+import itertools
+import json
+import os
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class I2cTracer(object):
+    """
+    Recorder for the phases of I²C transactions (e.g. write, read delay,
+    read, response interpretation and post processing), which can be
+    exported as Chrome trace-event JSON for inspection in ``chrome://tracing``
+    or `Perfetto <https://ui.perfetto.dev>`_.
+
+    The tracer is opt-in: Assign it to
+    :py:attr:`~sensirion_i2c_driver.connection.I2cConnection.tracer` and/or
+    :py:attr:`~sensirion_i2c_driver.linux_i2c_transceiver.LinuxI2cTransceiver.tracer`.
+    Without tracer, the only overhead is a check for None per phase.
+
+    Events are stored in a preallocated ring buffer. If it is full, the
+    oldest events are overwritten. In the exported trace, every bus is shown
+    as a separate process with one track per thread.
+    """
+
+    def __init__(self, capacity=65536, clock=None):
+        """
+        Create a tracer.
+
+        :param int capacity: Maximum number of stored events.
+        :param clock:
+            Clock providing ``perf_counter_ns()`` for the timestamps, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        """
+        super(I2cTracer, self).__init__()
+        if capacity < 1:
+            raise ValueError("Capacity must be positive.")
+        self._capacity = int(capacity)
+        self._clock = clock or SYSTEM_CLOCK
+        self._events = [None] * self._capacity
+        self._counter = itertools.count()
+        self._count = 0
+        self._thread_names = {}
+        self.enabled = True  #: Set to False to pause recording (bool).
+
+    @property
+    def capacity(self):
+        """
+        Maximum number of stored events.
+
+        :type: int
+        """
+        return self._capacity
+
+    @property
+    def dropped(self):
+        """
+        Number of events overwritten because the buffer was full.
+
+        :type: int
+        """
+        return max(self._count - self._capacity, 0)
+
+    def now(self):
+        """
+        Get the current timestamp, to be passed as start of
+        :py:meth:`record`.
+
+        :return: Timestamp in Nanoseconds.
+        :rtype: int
+        """
+        return self._clock.perf_counter_ns()
+
+    def record(self, name, start, bus=None, args=None, end=None):
+        """
+        Record a completed phase.
+
+        :param str name: Name of the phase, e.g. ``"read"``.
+        :param int start: Start timestamp as returned by :py:meth:`now`.
+        :param str/None bus: Name of the bus (e.g. the device file).
+        :param dict/None args: Additional data shown for the event.
+        :param int/None end:
+            End timestamp, or None (the default) to use the current time.
+        """
+        if not self.enabled:
+            return
+        if end is None:
+            end = self._clock.perf_counter_ns()
+        thread = threading.current_thread()
+        if thread.ident not in self._thread_names:
+            self._thread_names[thread.ident] = thread.name
+        index = next(self._counter)
+        self._events[index % self._capacity] = \
+            (name, bus, thread.ident, start, end - start, args)
+        self._count = max(self._count, index + 1)
+
+    def clear(self):
+        """
+        Remove all recorded events.
+        """
+        self._events = [None] * self._capacity
+        self._counter = itertools.count()
+        self._count = 0
+
+    def events(self):
+        """
+        Get the recorded events in Chrome trace-event format.
+
+        :return:
+            List of trace events (dicts), including metadata events naming
+            the bus processes and thread tracks.
+        :rtype: list
+        """
+        count = self._count
+        if count > self._capacity:
+            start = count % self._capacity
+            records = self._events[start:] + self._events[:start]
+        else:
+            records = self._events[:count]
+        buses = {}
+        threads = set()
+        result = []
+        for record in records:
+            if record is None:
+                continue
+            name, bus, thread_id, start_ns, duration_ns, args = record
+            pid = buses.setdefault(bus, len(buses) + 1)
+            threads.add((pid, thread_id))
+            event = {
+                "name": name,
+                "cat": "i2c",
+                "ph": "X",
+                "ts": start_ns / 1000.0,
+                "dur": duration_ns / 1000.0,
+                "pid": pid,
+                "tid": thread_id,
+            }
+            if args:
+                event["args"] = args
+            result.append(event)
+        metadata = []
+        for bus, pid in sorted(buses.items(), key=lambda b: b[1]):
+            metadata.append({
+                "name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                "args": {"name": bus if bus is not None else "I2C"},
+            })
+        for pid, thread_id in sorted(threads):
+            metadata.append({
+                "name": "thread_name", "ph": "M", "pid": pid,
+                "tid": thread_id,
+                "args": {"name": self._thread_names.get(thread_id, "")},
+            })
+        return metadata + result
+
+    def dump(self, path):
+        """
+        Write the recorded events to a Chrome trace-event JSON file.
+
+        :param str path: Path of the JSON file.
+        """
+        content = {"traceEvents": self.events(), "displayTimeUnit": "ns"}
+        with open(path, "w") as f:
+            json.dump(content, f)
+        log.info("I2cTracer: Wrote {} events to {}".format(
+            len(content["traceEvents"]), os.path.abspath(path)))
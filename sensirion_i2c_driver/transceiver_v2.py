@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from .clock import SYSTEM_CLOCK
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class I2cTransceiverV2(object):
+    """
+    Interface to be implemented by every I²C transceiver with API version 2.
+
+    Compared to API version 1 (see
+    :py:class:`~sensirion_i2c_driver.transceiver_v1.I2cTransceiverV1`), a
+    single call transceives a whole batch of frames, the received data is
+    written into buffers provided by the caller, every frame gets a
+    completion timestamp, and multi-channel transceivers support channel
+    masks.
+    """
+
+    API_VERSION = 2  #: API version (accessed by I2cConnection)
+
+    # Status codes
+    STATUS_OK = 0  #: Status code for "transceive operation succeeded".
+    STATUS_CHANNEL_DISABLED = 1  #: Status code for "channel disabled error".
+    STATUS_NACK = 2  #: Status code for "not acknowledged error".
+    STATUS_TIMEOUT = 3  #: Status code for "timeout error".
+    STATUS_UNSPECIFIED_ERROR = 4  #: Status code for "unspecified error".
+
+    def __init__(self):
+        super(I2cTransceiverV2, self).__init__()
+
+    @property
+    def description(self):
+        """
+        Description of the transceiver (for logging/debugging purposes).
+        Should be a short one-line string.
+
+        :return: Description.
+        :rtype: str
+        """
+        return ""
+
+    @property
+    def channel_count(self):
+        """
+        Channel count of this transceiver. This is needed by
+        :py:class:`~sensirion_i2c_driver.connection.I2cConnection` to determine
+        whether this is a single-channel or multi-channel transceiver, and how
+        many channels it has (in case of multi-channel).
+
+        :return:
+            The channel count if it's a multi-channel transceiver, or None if
+            it's a single-channel transceiver.
+        :rtype: int/None
+        """
+        return None
+
+    def transceive_batch(self, frames, rx_buffers, channel_mask=None):
+        """
+        Transceive a batch of I²C frames synchronously, one after the other.
+
+        :param list frames:
+            The frames to transceive. Each frame is a tuple of
+            ``(slave_address, tx_data, rx_length, read_delay, timeout)`` with
+            the same meaning as the parameters of
+            :py:meth:`~sensirion_i2c_driver.transceiver_v1.I2cTransceiverV1.transceive`.
+        :param list rx_buffers:
+            One writable bytes-like object (e.g. a ``bytearray``) per frame,
+            where the received data gets written to. For multi-channel
+            transceivers, the buffer must have space for
+            ``rx_length * channel_count`` bytes and the data of channel ``i``
+            is written at offset ``i * rx_length``. For frames without RX
+            data, the buffer may be None.
+        :param int/list/None channel_mask:
+            Only for multi-channel transceivers: Bitmask of the channels to
+            use (bit ``i`` for channel ``i``), or a list with one bitmask per
+            frame. None (the default) means to use all channels.
+        :return:
+            One result per frame:
+
+            - A status code of the transceive operation
+            - In case of errors, the underlying (transceiver-dependent)
+              exception
+            - The completion timestamp in Seconds (hardware timestamp if
+              available, otherwise the monotonic time of the transceiver's
+              clock, see :py:mod:`~sensirion_i2c_driver.clock`)
+
+            If the status code is
+            :py:attr:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2.STATUS_OK`,
+            all ``rx_length`` bytes were received.
+        :rtype:
+            - If single-channel: list(tuple(int, Exception, float))
+            - If multi-channel: list(list(tuple(int, Exception, float))),
+              with None instead of a tuple for channels excluded by the
+              channel mask.
+        :raises:
+            Only raises a (transceiver-specific) exception if the operation
+            could not be executed at all. If a frame was executed but failed
+            with NACK or timeout, no exception is raised. These errors are
+            reported by the returned status code instead.
+        """
+        raise NotImplementedError()
+
+
+class I2cTransceiverV2Adapter(object):
+    """
+    Adapter to use an API version 1 transceiver (see
+    :py:class:`~sensirion_i2c_driver.transceiver_v1.I2cTransceiverV1`) with
+    the API version 2 (see
+    :py:class:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2`).
+
+    The frames of a batch are transceived one by one. Since API version 1
+    does not support channel masks, all channels are used and the results of
+    masked channels are discarded.
+    """
+
+    API_VERSION = 2  #: API version (accessed by I2cConnection)
+
+    # Status codes
+    STATUS_OK = 0  #: Status code for "transceive operation succeeded".
+    STATUS_CHANNEL_DISABLED = 1  #: Status code for "channel disabled error".
+    STATUS_NACK = 2  #: Status code for "not acknowledged error".
+    STATUS_TIMEOUT = 3  #: Status code for "timeout error".
+    STATUS_UNSPECIFIED_ERROR = 4  #: Status code for "unspecified error".
+
+    def __init__(self, transceiver, clock=None):
+        """
+        Create an adapter for a given transceiver.
+
+        :param transceiver:
+            An I²C transceiver object with API version 1.
+        :param clock:
+            Clock used for the completion timestamps, see
+            :py:mod:`~sensirion_i2c_driver.clock`. Defaults to None, which
+            means to use the system clock.
+        """
+        super(I2cTransceiverV2Adapter, self).__init__()
+        self._transceiver = transceiver
+        self._clock = clock or SYSTEM_CLOCK
+
+    @property
+    def transceiver(self):
+        """
+        The adapted API version 1 transceiver.
+        """
+        return self._transceiver
+
+    @property
+    def description(self):
+        """
+        Description of the adapted transceiver.
+
+        For details (e.g. return value documentation), please refer to
+        :py:attr:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2.description`.
+        """
+        return self._transceiver.description
+
+    @property
+    def channel_count(self):
+        """
+        Channel count of the adapted transceiver.
+
+        For details (e.g. return value documentation), please refer to
+        :py:attr:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2.channel_count`.
+        """
+        return self._transceiver.channel_count
+
+    def transceive_batch(self, frames, rx_buffers, channel_mask=None):
+        """
+        Transceive a batch of I²C frames with the adapted transceiver.
+
+        For details (e.g. parameter documentation), please refer to
+        :py:meth:`~sensirion_i2c_driver.transceiver_v2.I2cTransceiverV2.transceive_batch`.
+        """
+        channel_count = self._transceiver.channel_count
+        results = []
+        for i, (frame, rx_buffer) in enumerate(zip(frames, rx_buffers)):
+            slave_address, tx_data, rx_length, read_delay, timeout = frame
+            result = self._transceiver.transceive(
+                slave_address=slave_address,
+                tx_data=tx_data,
+                rx_length=rx_length,
+                read_delay=read_delay,
+                timeout=timeout,
+            )
+            timestamp = self._clock.monotonic()
+            if channel_count is None:
+                results.append(self._store(result, rx_buffer, 0, rx_length,
+                                           timestamp))
+                continue
+            mask = channel_mask[i] if isinstance(channel_mask, list) \
+                else channel_mask
+            results.append([
+                self._store(r, rx_buffer, ch * (rx_length or 0), rx_length,
+                            timestamp)
+                if (mask is None) or (mask & (1 << ch)) else None
+                for ch, r in enumerate(result)
+            ])
+        return results
+
+    def _store(self, result, rx_buffer, offset, rx_length, timestamp):
+        """
+        Copy the received data of a V1 result into the RX buffer and convert
+        the result to V2.
+        """
+        status, error, rx_data = result
+        if status == self.STATUS_OK and rx_length:
+            if len(rx_data) != rx_length:
+                return (self.STATUS_UNSPECIFIED_ERROR,
+                        IOError("Received {} bytes instead of {}.".format(
+                            len(rx_data), rx_length)),
+                        timestamp)
+            rx_buffer[offset:offset + rx_length] = rx_data
+        return status, error, timestamp
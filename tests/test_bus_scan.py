@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver.bus_scan import scan_buses
+import json
+import pytest
+
+
+class _FakeTransceiver(object):
+    API_VERSION = 2
+    channel_count = None
+
+    def __init__(self, devices, scans):
+        self.devices = devices
+        self.scans = scans
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def scan(self, addresses):
+        self.scans.append(list(addresses))
+        return [a for a in addresses if a in self.devices]
+
+
+class _FakeBoard(object):
+    """
+    Factory for fake transceivers of several buses.
+    """
+
+    def __init__(self, buses):
+        self.buses = buses  # device file -> list of addresses
+        self.scans = dict((f, []) for f in buses)
+
+    def __call__(self, device_file):
+        if device_file not in self.buses:
+            raise IOError("No such device: " + device_file)
+        return _FakeTransceiver(self.buses[device_file],
+                                self.scans[device_file])
+
+
+def _identify(connection, address):
+    return "device-{:02X}".format(address)
+
+
+def test_scan_buses():
+    board = _FakeBoard({"bus1": [0x44], "bus2": [0x10, 0x69]})
+    result = scan_buses(["bus1", "bus2"], identify=_identify,
+                        transceiver_factory=board)
+    assert result == {
+        "bus1": {0x44: "device-44"},
+        "bus2": {0x10: "device-10", 0x69: "device-69"},
+    }
+
+
+def test_scan_buses_identify_error():
+    def identify(connection, address):
+        raise IOError("NACK")
+    board = _FakeBoard({"bus1": [0x44]})
+    assert scan_buses(["bus1"], identify=identify,
+                      transceiver_factory=board) == {"bus1": {0x44: None}}
+
+
+def test_scan_buses_error():
+    board = _FakeBoard({"bus1": [0x44]})
+    with pytest.raises(IOError):
+        scan_buses(["bus1", "bus2"], transceiver_factory=board)
+
+
+def test_scan_buses_cache(tmpdir):
+    cache_file = str(tmpdir.join("cache.json"))
+    board = _FakeBoard({"bus1": [0x44, 0x62]})
+    first = scan_buses(["bus1"], cache_file=cache_file, identify=_identify,
+                       transceiver_factory=board)
+    with open(cache_file) as f:
+        assert json.load(f) == {
+            "version": 1,
+            "buses": {"bus1": {"0x44": "device-44", "0x62": "device-62"}},
+        }
+
+    # Second startup only validates the cached addresses
+    identified = []
+    second = scan_buses(["bus1"], cache_file=cache_file,
+                        identify=lambda c, a: identified.append(a),
+                        transceiver_factory=board)
+    assert second == first
+    assert identified == []
+    assert board.scans["bus1"][-1] == [0x44, 0x62]
+
+    # Removed device -> full scan again
+    board.buses["bus1"].remove(0x62)
+    third = scan_buses(["bus1"], cache_file=cache_file, identify=_identify,
+                       transceiver_factory=board)
+    assert third == {"bus1": {0x44: "device-44"}}
+    assert len(board.scans["bus1"][-1]) == 0x70
+
+
+def test_scan_buses_refresh(tmpdir):
+    cache_file = str(tmpdir.join("cache.json"))
+    board = _FakeBoard({"bus1": [0x44]})
+    scan_buses(["bus1"], cache_file=cache_file, transceiver_factory=board)
+    board.buses["bus1"].append(0x62)
+    assert scan_buses(["bus1"], cache_file=cache_file,
+                      transceiver_factory=board) == {"bus1": {0x44: None}}
+    assert scan_buses(["bus1"], cache_file=cache_file, refresh=True,
+                      transceiver_factory=board) == \
+        {"bus1": {0x44: None, 0x62: None}}
+
+
+def test_scan_buses_invalid_cache(tmpdir):
+    cache_file = tmpdir.join("cache.json")
+    cache_file.write("garbage")
+    board = _FakeBoard({"bus1": [0x44]})
+    assert scan_buses(["bus1"], cache_file=str(cache_file),
+                      transceiver_factory=board) == {"bus1": {0x44: None}}
+    assert json.loads(cache_file.read())["version"] == 1
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver.bus_server import I2cBusServer, HELLO_FRAME, \
+    REQUEST_FRAME, RESPONSE_FRAME, NONE_LENGTH, pack_result, unpack_result
+from mock import MagicMock
+import os
+import pytest
+import socket
+import threading
+
+
+def _create_transceiver(channel_count=None):
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = channel_count
+    transceiver.description = "fake"
+    return transceiver
+
+
+def _receive_exactly(sock, length):
+    data = b""
+    while len(data) < length:
+        data += sock.recv(length - len(data))
+    return data
+
+
+def test_pack_unpack_result():
+    data = b"xx" + pack_result(2, Exception("NACK"), b"\x11\x22")
+    result, offset = unpack_result(data, 2)
+    assert offset == len(data)
+    assert result[0] == 2
+    assert str(result[1]) == "NACK"
+    assert result[2] == b"\x11\x22"
+
+
+def test_pack_unpack_result_without_error():
+    result, _ = unpack_result(pack_result(0, None, b""), 0)
+    assert result == (0, None, b"")
+
+
+def test_pipelined_requests_are_executed_in_order(tmpdir):
+    socket_path = str(tmpdir.join("bus.sock"))
+    transceiver = _create_transceiver()
+    transceiver.transceive.side_effect = [
+        (0, None, b"\x01"),
+        (2, Exception("NACK"), b""),
+    ]
+    with I2cBusServer(transceiver, socket_path) as server:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+        server.handle_events(timeout=1.0)
+        hello = _receive_exactly(client, HELLO_FRAME.size + 4)
+        assert hello[HELLO_FRAME.size:] == b"fake"
+        client.sendall(
+            REQUEST_FRAME.pack(7, 0x42, 1, 1, 0.0, 0.0) + b"\x55" +
+            REQUEST_FRAME.pack(8, 0x43, NONE_LENGTH, NONE_LENGTH, 0.1, 0.0))
+        while transceiver.transceive.call_count < 2:
+            server.handle_events(timeout=1.0)
+        data = _receive_exactly(client, 2 * RESPONSE_FRAME.size + 2 * 5 + 5)
+        client.close()
+    args = [kwargs for args, kwargs in transceiver.transceive.call_args_list]
+    assert args == [
+        {
+            "slave_address": 0x42,
+            "tx_data": b"\x55",
+            "rx_length": 1,
+            "read_delay": 0.0,
+            "timeout": 0.0,
+        },
+        {
+            "slave_address": 0x43,
+            "tx_data": None,
+            "rx_length": None,
+            "read_delay": 0.1,
+            "timeout": 0.0,
+        },
+    ]
+    assert RESPONSE_FRAME.unpack_from(data, 0) == (7, 0, 1)
+    result, offset = unpack_result(data, RESPONSE_FRAME.size)
+    assert result == (0, None, b"\x01")
+    assert RESPONSE_FRAME.unpack_from(data, offset) == (8, 0, 1)
+    result, offset = unpack_result(data, offset + RESPONSE_FRAME.size)
+    assert result[0] == 2
+    assert offset == len(data)
+
+
+def test_transceiver_exception_is_returned_as_error(tmpdir):
+    socket_path = str(tmpdir.join("bus.sock"))
+    transceiver = _create_transceiver()
+    transceiver.transceive.side_effect = OSError("bus broken")
+    with I2cBusServer(transceiver, socket_path) as server:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+        server.handle_events(timeout=1.0)
+        _receive_exactly(client, HELLO_FRAME.size + 4)
+        client.sendall(REQUEST_FRAME.pack(1, 0x42, 0, 0, 0.0, 0.0))
+        while transceiver.transceive.call_count < 1:
+            server.handle_events(timeout=1.0)
+        data = _receive_exactly(client, RESPONSE_FRAME.size + 5 + 10)
+        client.close()
+    result, _ = unpack_result(data, RESPONSE_FRAME.size)
+    assert result[0] == 4
+    assert str(result[1]) == "bus broken"
+
+
+def test_realtime_mode(tmpdir):
+    socket_path = str(tmpdir.join("bus.sock"))
+    realtime = MagicMock()
+    with I2cBusServer(_create_transceiver(), socket_path,
+                      realtime=realtime) as server:
+        timer = threading.Timer(0.05, server.shutdown)
+        timer.start()
+        server.serve_forever()
+        timer.join()
+    realtime.apply.assert_called_once_with()
+    realtime.freeze.assert_called_once_with()
+    realtime.restore.assert_called_once_with()
+    assert realtime.sampling_window.call_count >= 1
+
+
+def test_stale_socket_is_replaced(tmpdir):
+    socket_path = str(tmpdir.join("bus.sock"))
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()  # leaves the socket file behind
+    with I2cBusServer(_create_transceiver(), socket_path):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+        client.close()
+
+
+def test_running_server_is_not_replaced(tmpdir):
+    socket_path = str(tmpdir.join("bus.sock"))
+    with I2cBusServer(_create_transceiver(), socket_path):
+        with pytest.raises(IOError):
+            I2cBusServer(_create_transceiver(), socket_path)
+        assert os.path.exists(socket_path)
+
+
+def test_other_file_is_not_removed(tmpdir):
+    path = tmpdir.join("bus.sock")
+    path.write("data")
+    with pytest.raises(IOError):
+        I2cBusServer(_create_transceiver(), str(path))
+    assert path.read() == "data"
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand, I2cBusTiming, \
+    I2cAdmissionController, I2cRateLimiter
+from sensirion_i2c_driver.clock import VirtualClock
+from mock import MagicMock
+import pytest
+
+
+def test_wire_time():
+    timing = I2cBusTiming(100e3)
+    # write: start + 3 bytes, read: repeated start + 4 bytes, stop
+    command = I2cCommand(b"\x01\x02", 3, 0.01, 0.0)
+    assert timing.wire_time(command) == pytest.approx(66 / 100e3)
+    assert timing.wire_time(I2cCommand(None, None, 0.0, 0.0)) == 0.0
+    assert I2cBusTiming(400e3).wire_time(command) == \
+        pytest.approx(66 / 400e3)
+
+
+def test_cost():
+    timing = I2cBusTiming(100e3, transfer_overhead=0.001)
+    command = I2cCommand(b"\x01\x02", 3, 0.01, 0.0, post_processing_time=0.1)
+    cost = timing.cost(command)
+    assert cost.wire_time == pytest.approx(0.00066)
+    assert cost.read_delay == 0.01
+    assert cost.post_processing_time == 0.1
+    assert cost.occupancy == pytest.approx(0.00066 + 0.002 + 0.01)
+
+
+def test_invalid_frequency():
+    with pytest.raises(ValueError):
+        I2cBusTiming(0)
+
+
+def test_utilization():
+    timing = I2cBusTiming(100e3)
+    trigger = I2cCommand(b"\x01\x02", None, 0.0, 0.0)  # 29 cycles
+    fetch = I2cCommand(None, 3, 0.0, 0.0)  # 38 cycles
+    assert timing.utilization([([trigger, fetch], 0.01)]) == \
+        pytest.approx(67e-5 / 0.01)
+    assert timing.utilization([(trigger, 0.001), (fetch, 0.001)]) == \
+        pytest.approx(0.67)
+
+
+def test_admission_controller():
+    controller = I2cAdmissionController(I2cBusTiming(100e3), 0.5)
+    command = I2cCommand(b"\x01", None, 0.0008, 0.0)  # 1 ms occupancy
+    assert controller.fits(command, 0.004)
+    assert controller.admit(command, 0.004)
+    assert controller.utilization == pytest.approx(0.25)
+    assert controller.admit(command, 0.005)
+    assert not controller.fits(command, 0.01)
+    assert not controller.admit(command, 0.01)
+    assert controller.workload == [(command, 0.004), (command, 0.005)]
+    controller.remove(command, 0.004)
+    assert controller.utilization == pytest.approx(0.2)
+    with pytest.raises(ValueError):
+        controller.remove(command, 0.004)
+
+
+def test_rate_limiter():
+    clock = VirtualClock()
+    limiter = I2cRateLimiter(I2cBusTiming(100e3), utilization=0.5,
+                             burst=0.002, clock=clock)
+    command = I2cCommand(b"\x01", None, 0.0008, 0.0)  # 1 ms occupancy
+    limiter.acquire([command, command])  # burst
+    assert clock.monotonic() == 0.0
+    limiter.acquire([command])
+    assert clock.monotonic() == pytest.approx(0.002)
+    for _ in range(10):
+        limiter.acquire([command])
+    assert clock.monotonic() == pytest.approx(0.022)
+    assert limiter.stats["throttled"] == 11
+    assert limiter.stats["total_wait"] == pytest.approx(0.022)
+
+
+def test_rate_limiter_invalid_utilization():
+    with pytest.raises(ValueError):
+        I2cRateLimiter(I2cBusTiming(), 0.0)
+
+
+def test_connection_rate_limiter():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (0, None, b"\x11")
+    clock = VirtualClock()
+    connection = I2cConnection(transceiver, clock=clock)
+    connection.rate_limiter = I2cRateLimiter(
+        I2cBusTiming(100e3), utilization=0.1, burst=0.0, clock=clock)
+    command = I2cCommand(None, 1, 0.0008, 0.0)  # 1 ms occupancy
+    connection.execute(0x42, command)
+    assert clock.monotonic() == pytest.approx(0.01)
+    connection.execute_batch([(0x42, command), (0x43, command)])
+    assert clock.monotonic() == pytest.approx(0.03)
+    list(connection.execute_chunked(0x42, command, 1))
+    assert clock.monotonic() == pytest.approx(0.04)
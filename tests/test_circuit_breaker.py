@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand
+from sensirion_i2c_driver.circuit_breaker import I2cCircuitBreaker
+from sensirion_i2c_driver.errors import I2cNackError, \
+    I2cDeviceUnavailableError, I2cTransceiveError
+from sensirion_i2c_driver.clock import VirtualClock
+from mock import MagicMock, patch
+import pytest
+
+
+@patch("time.monotonic")
+def test_state_transitions(monotonic):
+    monotonic.return_value = 0.0
+    breaker = I2cCircuitBreaker(failure_threshold=2, initial_backoff=1.0,
+                                max_backoff=3.0, backoff_factor=2.0)
+    assert breaker.state(0x42) == I2cCircuitBreaker.STATE_CLOSED
+    breaker.record_failure(0x42)
+    assert breaker.allow(0x42) is True
+    breaker.record_failure(0x42)
+    assert breaker.state(0x42) == I2cCircuitBreaker.STATE_OPEN
+    assert breaker.allow(0x42) is False
+    monotonic.return_value = 1.0
+    assert breaker.allow(0x42) is True  # probe
+    assert breaker.state(0x42) == I2cCircuitBreaker.STATE_HALF_OPEN
+    assert breaker.allow(0x42) is False  # only one probe at a time
+    breaker.record_failure(0x42)  # backoff 2.0
+    monotonic.return_value = 2.9
+    assert breaker.allow(0x42) is False
+    monotonic.return_value = 3.0
+    assert breaker.allow(0x42) is True
+    breaker.record_failure(0x42)  # backoff limited to 3.0
+    monotonic.return_value = 6.0
+    assert breaker.allow(0x42) is True
+    breaker.record_success(0x42)
+    assert breaker.state(0x42) == I2cCircuitBreaker.STATE_CLOSED
+    assert breaker.stats == {
+        "rejected": 3,
+        "transitions": {
+            "closed->open": 1,
+            "open->half-open": 3,
+            "half-open->open": 2,
+            "half-open->closed": 1,
+        },
+    }
+
+
+def test_success_resets_failure_count():
+    breaker = I2cCircuitBreaker(failure_threshold=2)
+    breaker.record_failure(0x42)
+    breaker.record_success(0x42)
+    breaker.record_failure(0x42)
+    assert breaker.state(0x42) == I2cCircuitBreaker.STATE_CLOSED
+
+
+def test_reset():
+    breaker = I2cCircuitBreaker(failure_threshold=1)
+    breaker.record_failure(0x42)
+    breaker.record_failure(0x43)
+    breaker.reset(0x42)
+    assert breaker.state(0x42) == I2cCircuitBreaker.STATE_CLOSED
+    assert breaker.state(0x43) == I2cCircuitBreaker.STATE_OPEN
+    breaker.reset()
+    assert breaker.state(0x43) == I2cCircuitBreaker.STATE_CLOSED
+
+
+def test_connection_fails_fast():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (2, Exception("NACK"), b"")
+    connection = I2cConnection(transceiver)
+    connection.circuit_breaker = I2cCircuitBreaker(failure_threshold=2,
+                                                   initial_backoff=60.0)
+    command = I2cCommand(b"\x55", 1, 0.1, 0.0)
+    for _ in range(2):
+        with pytest.raises(I2cNackError):
+            connection.execute(0x42, command)
+    with pytest.raises(I2cDeviceUnavailableError) as e:
+        connection.execute(0x42, command)
+    assert isinstance(e.value, I2cTransceiveError)
+    assert e.value.slave_address == 0x42
+    assert transceiver.transceive.call_count == 2
+
+
+def test_connection_fails_fast_multi_channel():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = 2
+    transceiver.transceive.return_value = [
+        (2, Exception("NACK"), b""),
+        (2, Exception("NACK"), b""),
+    ]
+    connection = I2cConnection(transceiver)
+    connection.circuit_breaker = I2cCircuitBreaker(failure_threshold=1)
+    command = I2cCommand(b"\x55", 1, 0.1, 0.0)
+    connection.execute(0x42, command)
+    response = connection.execute(0x42, command)
+    assert [type(r) for r in response] == [I2cDeviceUnavailableError] * 2
+    assert transceiver.transceive.call_count == 1
+
+
+def test_connection_partial_multi_channel_failure_is_success():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = 2
+    transceiver.transceive.return_value = [
+        (0, None, b"\x11"),
+        (2, Exception("NACK"), b""),
+    ]
+    connection = I2cConnection(transceiver)
+    connection.circuit_breaker = I2cCircuitBreaker(failure_threshold=1)
+    connection.execute(0x42, I2cCommand(b"\x55", 1, 0.1, 0.0))
+    assert connection.circuit_breaker.state(0x42) == \
+        I2cCircuitBreaker.STATE_CLOSED
+
+
+def test_connection_probe_raising_exception():
+    clock = VirtualClock()
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (2, Exception("NACK"), b"")
+    breaker = I2cCircuitBreaker(failure_threshold=1, initial_backoff=1.0,
+                                clock=clock)
+    connection = I2cConnection(transceiver)
+    connection.circuit_breaker = breaker
+    command = I2cCommand(b"\x55", 1, 0.1, 0.0)
+    with pytest.raises(I2cNackError):
+        connection.execute(0x42, command)
+    clock.advance(1.0)
+    transceiver.transceive.side_effect = OSError("Bus error")
+    with pytest.raises(OSError):
+        connection.execute(0x42, command)
+    assert breaker.state(0x42) == I2cCircuitBreaker.STATE_OPEN
+    clock.advance(2.0)
+    transceiver.transceive.side_effect = None
+    transceiver.transceive.return_value = (0, None, b"\x11")
+    assert connection.execute(0x42, command) == b"\x11"
+    assert breaker.state(0x42) == I2cCircuitBreaker.STATE_CLOSED
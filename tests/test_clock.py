@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand
+from sensirion_i2c_driver.clock import SystemClock, VirtualClock
+from sensirion_i2c_driver.circuit_breaker import I2cCircuitBreaker
+from sensirion_i2c_driver.response_cache import I2cResponseCache
+from sensirion_i2c_driver.transceiver_v2 import I2cTransceiverV2Adapter
+from mock import MagicMock, patch
+import pytest
+
+
+@patch("time.sleep")
+def test_system_clock(sleep):
+    clock = SystemClock()
+    assert clock.monotonic() <= clock.monotonic()
+    assert clock.time() > 1e9
+    clock.sleep(0.5)
+    sleep.assert_called_once_with(0.5)
+
+
+def test_virtual_clock():
+    clock = VirtualClock(start=10.0, epoch=1000.0)
+    assert clock.monotonic() == 10.0
+    assert clock.time() == 1010.0
+    clock.sleep(2.5)
+    assert clock.monotonic() == 12.5
+    clock.advance(0.5)
+    assert clock.time() == 1013.0
+    with pytest.raises(ValueError):
+        clock.advance(-1.0)
+
+
+def _create_transceiver():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (0, None, b"\x11")
+    return transceiver
+
+
+@patch("time.sleep")
+def test_connection_post_processing_in_virtual_time(sleep):
+    clock = VirtualClock()
+    connection = I2cConnection(_create_transceiver(), clock=clock)
+    assert connection.clock is clock
+    command = I2cCommand(b"\x55", 1, 0.1, 0.0, post_processing_time=0.9)
+    for _ in range(3600):  # one hour of polling at 1 Hz
+        connection.execute(0x42, command)
+    assert clock.monotonic() == pytest.approx(3600 * 0.9)
+    sleep.assert_not_called()
+
+
+def test_components_use_virtual_time():
+    clock = VirtualClock()
+    cache = I2cResponseCache(clock=clock)
+    cache.put(0x42, b"\x55", 1, b"\x11", 10.0)
+    breaker = I2cCircuitBreaker(failure_threshold=1, initial_backoff=5.0,
+                                clock=clock)
+    breaker.record_failure(0x42)
+    assert breaker.allow(0x42) is False
+    clock.advance(10.0)
+    assert cache.get(0x42, b"\x55", 1) is None
+    assert breaker.allow(0x42) is True
+
+
+def test_adapter_timestamps_in_virtual_time():
+    clock = VirtualClock(start=42.0)
+    adapter = I2cTransceiverV2Adapter(_create_transceiver(), clock=clock)
+    results = adapter.transceive_batch([(0x42, b"\x55", 1, 0.0, 0.0)],
+                                       [bytearray(1)])
+    assert results == [(0, None, 42.0)]
+
+
+def test_perf_counter_ns():
+    assert SystemClock().perf_counter_ns() > 0
+    clock = VirtualClock(start=1.5)
+    assert clock.perf_counter_ns() == 1500000000
@@ -104,3 +104,16 @@ def test_interpret_response_bytes():
     response = cmd.interpret_response(b"\x55\x66")
     assert type(response) is bytes
     assert response == b"\x55\x66"
+
+
+def test_cache_ttl():
+    assert I2cCommand(b"", None, 0.0, 0.0).cache_ttl is None
+    assert I2cCommand(b"", None, 0.0, 0.0, cache_ttl=5).cache_ttl == 5.0
+    assert I2cCommand(b"", None, 0.0, 0.0,
+                      cache_ttl=I2cCommand.CACHE_FOREVER).cache_ttl == \
+        float("inf")
+
+
+def test_rereadable():
+    assert I2cCommand(b"", None, 0.0, 0.0).rereadable is False
+    assert I2cCommand(b"", 3, 0.0, 0.0, rereadable=True).rereadable is True
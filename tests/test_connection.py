@@ -2,8 +2,9 @@
 # (c) Copyright 2019 Sensirion AG, Switzerland
 
 from __future__ import absolute_import, division, print_function
-from sensirion_i2c_driver import I2cConnection, I2cCommand
+from sensirion_i2c_driver import I2cConnection, I2cCommand, I2cDevice
 from sensirion_i2c_driver.errors import I2cNackError, I2cTimeoutError
+from sensirion_i2c_driver.response_cache import I2cResponseCache
 from mock import MagicMock
 import pytest
 
@@ -159,3 +160,330 @@ def test_v1_single_channel_execute_wait_post_process_false():
     response = connection.execute(0x42, I2cCommand(b"\x55", 3, 0.1, 0.2, 0.1),
                                   wait_post_process=False)
     assert response == b"\x11\x22\x33"
+
+
+def test_v1_single_channel_execute_cached():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (0, None, b"\x11\x22\x33")
+    connection = I2cConnection(transceiver)
+    connection.response_cache = I2cResponseCache()
+    command = I2cCommand(b"\x55", 3, 0.1, 0.2,
+                         cache_ttl=I2cCommand.CACHE_FOREVER)
+    assert connection.execute(0x42, command) == b"\x11\x22\x33"
+    assert connection.execute(0x42, command) == b"\x11\x22\x33"
+    assert transceiver.transceive.call_count == 1
+    assert connection.response_cache.stats["hits"] == 1
+    connection.response_cache.invalidate(0x42)
+    assert connection.execute(0x42, command) == b"\x11\x22\x33"
+    assert transceiver.transceive.call_count == 2
+
+
+def test_v1_single_channel_execute_not_cacheable():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (0, None, b"\x11\x22\x33")
+    connection = I2cConnection(transceiver)
+    connection.response_cache = I2cResponseCache()
+    command = I2cCommand(b"\x55", 3, 0.1, 0.2)
+    connection.execute(0x42, command)
+    connection.execute(0x42, command)
+    assert transceiver.transceive.call_count == 2
+    assert len(connection.response_cache) == 0
+
+
+def test_v1_single_channel_execute_error_not_cached():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (2, Exception("NACK"), b"")
+    connection = I2cConnection(transceiver)
+    connection.response_cache = I2cResponseCache()
+    command = I2cCommand(b"\x55", 3, 0.1, 0.2, cache_ttl=10.0)
+    with pytest.raises(I2cNackError):
+        connection.execute(0x42, command)
+    assert len(connection.response_cache) == 0
+
+
+def test_v1_single_channel_execute_chunked():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.side_effect = [
+        (0, None, b"\x11\x22"),
+        (0, None, b"\x33\x44"),
+        (0, None, b"\x55"),
+    ]
+    connection = I2cConnection(transceiver)
+    chunks = connection.execute_chunked(
+        0x42, I2cCommand(b"\x55", 5, 0.1, 0.2), chunk_size=2)
+    assert list(chunks) == [b"\x11\x22", b"\x33\x44", b"\x55"]
+    args = [kwargs for args, kwargs in transceiver.transceive.call_args_list]
+    assert args == [
+        {
+            "slave_address": 0x42,
+            "tx_data": b"\x55",
+            "rx_length": 2,
+            "read_delay": 0.1,
+            "timeout": 0.2,
+        },
+        {
+            "slave_address": 0x42,
+            "tx_data": None,
+            "rx_length": 2,
+            "read_delay": 0.0,
+            "timeout": 0.2,
+        },
+        {
+            "slave_address": 0x42,
+            "tx_data": None,
+            "rx_length": 1,
+            "read_delay": 0.0,
+            "timeout": 0.2,
+        },
+    ]
+
+
+def test_v1_single_channel_execute_chunked_error():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.side_effect = [
+        (0, None, b"\x11\x22"),
+        (2, Exception("NACK"), b""),
+    ]
+    connection = I2cConnection(transceiver)
+    chunks = connection.execute_chunked(
+        0x42, I2cCommand(b"\x55", 4, 0.1, 0.2), chunk_size=2)
+    assert next(chunks) == b"\x11\x22"
+    with pytest.raises(I2cNackError):
+        next(chunks)
+
+
+def test_v1_multi_channel_execute_chunked():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = 2
+    connection = I2cConnection(transceiver)
+    with pytest.raises(ValueError):
+        connection.execute_chunked(
+            0x42, I2cCommand(b"\x55", 4, 0.1, 0.2), chunk_size=2)
+
+
+def test_execute_chunked_invalid_chunk_size():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    connection = I2cConnection(transceiver)
+    device = I2cDevice(connection, 0x42)
+    # Raised at the call site, not only when iterating
+    with pytest.raises(ValueError):
+        connection.execute_chunked(
+            0x42, I2cCommand(b"\x55", 4, 0.1, 0.2), chunk_size=0)
+    with pytest.raises(ValueError):
+        device.execute_chunked(I2cCommand(b"\x55", 4, 0.1, 0.2), 0)
+    transceiver.transceive.assert_not_called()
+
+
+def _create_v2_transceiver(channel_count, results, rx_data):
+    def transceive_batch(frames, rx_buffers, channel_mask=None):
+        for rx_buffer, data in zip(rx_buffers, rx_data):
+            if rx_buffer is not None:
+                rx_buffer[:len(data)] = data
+        return results
+
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 2
+    transceiver.STATUS_OK = 0
+    transceiver.channel_count = channel_count
+    transceiver.transceive_batch.side_effect = transceive_batch
+    return transceiver
+
+
+def test_v2_single_channel_is_multi_channel():
+    transceiver = _create_v2_transceiver(None, [], [])
+    connection = I2cConnection(transceiver)
+    assert connection.is_multi_channel is False
+
+
+def test_v2_single_channel_execute():
+    transceiver = _create_v2_transceiver(None, [(0, None, 1.0)],
+                                         [b"\x11\x22\x33"])
+    connection = I2cConnection(transceiver)
+    response = connection.execute(0x42, I2cCommand(b"\x55", 3, 0.1, 0.2))
+    assert response == b"\x11\x22\x33"
+    args, kwargs = transceiver.transceive_batch.call_args
+    assert args[0] == [(0x42, b"\x55", 3, 0.1, 0.2)]
+
+
+def test_v2_single_channel_error():
+    transceiver = _create_v2_transceiver(
+        None, [(3, Exception("timeout"), 1.0)], [b""])
+    connection = I2cConnection(transceiver)
+    with pytest.raises(I2cTimeoutError):
+        connection.execute(0x42, I2cCommand(b"\x55", 3, 0.1, 0.2))
+
+
+def test_v2_multi_channel_execute():
+    transceiver = _create_v2_transceiver(
+        2, [[(0, None, 1.0), (2, Exception("NACK"), 1.0)]], [b"\x11\x22"])
+    connection = I2cConnection(transceiver)
+    response = connection.execute(0x42, I2cCommand(b"\x55", 1, 0.1, 0.2))
+    assert response[0] == b"\x11"
+    assert type(response[1]) is I2cNackError
+
+
+def test_v2_execute_batch():
+    transceiver = _create_v2_transceiver(
+        None, [(0, None, 1.0), (2, Exception("NACK"), 1.0)],
+        [b"\x11", b""])
+    connection = I2cConnection(transceiver)
+    responses = connection.execute_batch([
+        (0x42, I2cCommand(b"\x55", 1, 0.0, 0.2)),
+        (0x43, I2cCommand(b"\x66", None, 0.0, 0.2)),
+    ])
+    assert transceiver.transceive_batch.call_count == 1
+    assert responses[0] == b"\x11"
+    assert type(responses[1]) is I2cNackError
+
+
+def test_v2_execute_batch_split_at_post_processing():
+    transceiver = _create_v2_transceiver(None, [(0, None, 1.0)], [b""])
+    connection = I2cConnection(transceiver)
+    connection.execute_batch([
+        (0x42, I2cCommand(b"\x55", None, 0.0, 0.2, 0.001)),
+        (0x43, I2cCommand(b"\x66", None, 0.0, 0.2)),
+    ])
+    assert transceiver.transceive_batch.call_count == 2
+
+
+def test_v1_execute_batch():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.side_effect = [
+        (0, None, b"\x11"),
+        (3, Exception("timeout"), b""),
+    ]
+    connection = I2cConnection(transceiver)
+    responses = connection.execute_batch([
+        (0x42, I2cCommand(b"\x55", 1, 0.0, 0.2)),
+        (0x43, I2cCommand(b"\x66", 1, 0.0, 0.2)),
+    ])
+    assert responses[0] == b"\x11"
+    assert type(responses[1]) is I2cTimeoutError
+
+
+def test_v2_execute_per_channel():
+    transceiver = _create_v2_transceiver(
+        3,
+        [
+            [(0, None, 1.0), None, (2, Exception("NACK"), 1.0)],
+            [None, (0, None, 1.0), None],
+        ],
+        [b"\x11\x00\x33", b"\x00\x22\x00"])
+    connection = I2cConnection(transceiver)
+    read_a = I2cCommand(b"\x01", 1, 0.0, 0.2)
+    read_b = I2cCommand(b"\x02", 1, 0.0, 0.2)
+    responses = connection.execute_per_channel([
+        (0x42, read_a),
+        (0x42, read_b),
+        (0x42, read_a),
+    ])
+    assert transceiver.transceive_batch.call_count == 1
+    args, kwargs = transceiver.transceive_batch.call_args
+    assert args[0] == [(0x42, b"\x01", 1, 0.0, 0.2),
+                       (0x42, b"\x02", 1, 0.0, 0.2)]
+    assert args[2] == [0b101, 0b010]
+    assert responses[0] == b"\x11"
+    assert responses[1] == b"\x22"
+    assert type(responses[2]) is I2cNackError
+
+
+def test_v1_execute_per_channel():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = 3
+    transceiver.transceive.side_effect = [
+        [(0, None, b"\x11"), (0, None, b"\x12"), (0, None, b"\x13")],
+        [(0, None, b"\x21"), (0, None, b"\x22"), (0, None, b"\x23")],
+    ]
+    connection = I2cConnection(transceiver)
+    responses = connection.execute_per_channel([
+        (0x42, I2cCommand(b"\x01", 1, 0.0, 0.2)),
+        None,
+        (0x43, I2cCommand(b"\x01", 1, 0.0, 0.2)),
+    ])
+    assert transceiver.transceive.call_count == 2
+    assert responses == [b"\x11", None, b"\x23"]
+
+
+def test_execute_per_channel_single_channel():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    connection = I2cConnection(transceiver)
+    with pytest.raises(ValueError):
+        connection.execute_per_channel([None])
+
+
+def test_execute_per_channel_wrong_request_count():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = 2
+    connection = I2cConnection(transceiver)
+    with pytest.raises(ValueError):
+        connection.execute_per_channel([None])
+
+
+def test_scan_uses_transceiver_scan():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 2
+    transceiver.channel_count = None
+    transceiver.scan.return_value = [0x44]
+    connection = I2cConnection(transceiver)
+    assert connection.scan() == [0x44]
+    transceiver.scan.assert_called_once_with(
+        list(I2cConnection.SCAN_ADDRESSES))
+    assert I2cConnection.SCAN_ADDRESSES[0] == 0x08
+    assert I2cConnection.SCAN_ADDRESSES[-1] == 0x77
+
+
+def test_v1_single_channel_scan():
+    transceiver = MagicMock(spec=["API_VERSION", "channel_count",
+                                  "transceive"])
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.side_effect = lambda slave_address, **kwargs: \
+        (0, None, b"") if slave_address == 0x44 else (2, None, b"")
+    connection = I2cConnection(transceiver)
+    assert connection.scan([0x43, 0x44, 0x45]) == [0x44]
+    assert transceiver.transceive.call_args[1] == dict(
+        slave_address=0x45, tx_data=b"", rx_length=None, read_delay=0.0,
+        timeout=0.0)
+
+
+def test_v1_single_channel_scan_error():
+    transceiver = MagicMock(spec=["API_VERSION", "channel_count",
+                                  "transceive"])
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (4, Exception("error"), b"")
+    connection = I2cConnection(transceiver)
+    with pytest.raises(Exception):
+        connection.scan([0x44])
+
+
+def test_v1_multi_channel_scan():
+    transceiver = MagicMock(spec=["API_VERSION", "channel_count",
+                                  "transceive"])
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = 2
+    transceiver.transceive.side_effect = lambda slave_address, **kwargs: [
+        (0, None, b""),
+        (0, None, b"") if slave_address == 0x44 else (2, None, b""),
+    ]
+    connection = I2cConnection(transceiver)
+    assert connection.scan([0x44, 0x45]) == [[0x44, 0x45], [0x44]]
@@ -24,3 +24,12 @@ def test_multi_channel():
     connection.execute.return_value = ["bar1", "bar2"]
     device = I2cDevice(connection, 0x42)
     assert device.execute(I2cCommand(b"\x55", 3, 0.1, 0.2)) == ["bar1", "bar2"]
+
+
+def test_execute_chunked():
+    connection = MagicMock()
+    connection.execute_chunked.return_value = iter([b"\x11", b"\x22"])
+    device = I2cDevice(connection, 0x42)
+    command = I2cCommand(b"\x55", 2, 0.1, 0.2)
+    assert list(device.execute_chunked(command, 1)) == [b"\x11", b"\x22"]
+    connection.execute_chunked.assert_called_once_with(0x42, command, 1)
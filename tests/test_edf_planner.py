@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand, I2cDevice
+from sensirion_i2c_driver.clock import VirtualClock
+from sensirion_i2c_driver.edf_planner import EdfPlanner, PeriodicTask
+from sensirion_i2c_driver.errors import I2cNackError
+from sensirion_i2c_driver.realtime import RealtimeMode
+from mock import patch
+import gc
+import pytest
+
+
+class _SimulatedBus(object):
+    """
+    Fake API V1 transceiver where every transfer takes 1 ms of virtual time.
+    """
+
+    API_VERSION = 1
+    channel_count = None
+
+    def __init__(self, clock, missing=()):
+        self.clock = clock
+        self.missing = missing
+        self.frames = []
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        self.frames.append((self.clock.monotonic(), slave_address, tx_data))
+        self.clock.advance(0.001 + read_delay)
+        if slave_address in self.missing:
+            return 2, None, b""
+        return 0, None, bytes(bytearray([slave_address] * (rx_length or 0)))
+
+
+TRIGGER = I2cCommand(b"\x01", None, 0.0, 0.0, post_processing_time=0.05)
+FETCH = I2cCommand(b"\x02", 1, 0.0, 0.0)
+
+
+def _create(addresses, missing=()):
+    clock = VirtualClock()
+    bus = _SimulatedBus(clock, missing)
+    connection = I2cConnection(bus, clock=clock)
+    return clock, bus, [I2cDevice(connection, a) for a in addresses]
+
+
+def test_task_defaults():
+    _, _, devices = _create([0x44])
+    task = PeriodicTask(devices[0], TRIGGER, FETCH, 0.1)
+    assert task.measurement_time == 0.05
+    assert task.name == "0x44"
+    with pytest.raises(ValueError):
+        PeriodicTask(devices[0], TRIGGER, FETCH, 0.0)
+
+
+def test_duplicate_task_names():
+    _, _, devices = _create([0x44, 0x44])
+    tasks = [PeriodicTask(d, TRIGGER, FETCH, 0.1) for d in devices]
+    with pytest.raises(ValueError):
+        EdfPlanner(tasks)
+    tasks[1].name = "0x44 (bus 2)"
+    assert sorted(EdfPlanner(tasks).stats["tasks"]) == ["0x44", "0x44 (bus 2)"]
+
+
+def test_measurements_overlap():
+    clock, bus, devices = _create(range(0x40, 0x50))
+    results = []
+    tasks = [PeriodicTask(d, TRIGGER, FETCH, 0.1, jitter_tolerance=0.02,
+                          callback=lambda t, r: results.append(r))
+             for d in devices]
+    planner = EdfPlanner(tasks, clock=clock)
+    planner.run(duration=10.0)
+    stats = planner.stats
+    for task_stats in stats["tasks"].values():
+        assert task_stats["jobs"] == 100
+        assert task_stats["deadline_misses"] == 0
+        assert task_stats["max_jitter"] <= 0.02
+    # 16 devices * 2 transfers * 1 ms per 100 ms period
+    assert stats["utilization"] == pytest.approx(0.32, abs=0.01)
+    assert len(results) == 1600
+    assert results[0] == b"\x40"
+
+
+def test_fetch_waits_for_measurement_time():
+    clock, bus, devices = _create([0x44])
+    planner = EdfPlanner([PeriodicTask(devices[0], TRIGGER, FETCH, 0.1)],
+                         clock=clock)
+    planner.run(duration=0.25)
+    assert [(round(t, 3), tx) for t, _, tx in bus.frames] == [
+        (0.0, b"\x01"), (0.051, b"\x02"),
+        (0.1, b"\x01"), (0.151, b"\x02"),
+        (0.2, b"\x01"),
+    ]
+
+
+def test_earliest_deadline_first():
+    clock, bus, devices = _create([0x44, 0x45])
+    tasks = [
+        PeriodicTask(devices[0], TRIGGER, FETCH, 1.0, jitter_tolerance=0.5),
+        PeriodicTask(devices[1], TRIGGER, FETCH, 1.0, jitter_tolerance=0.1),
+    ]
+    EdfPlanner(tasks, clock=clock).run(duration=0.01)
+    assert [a for _, a, _ in bus.frames] == [0x45, 0x44]
+
+
+def test_deadline_misses():
+    clock, bus, devices = _create([0x44])
+    trigger = I2cCommand(b"\x01", None, 0.0, 0.0, post_processing_time=0.15)
+    planner = EdfPlanner([PeriodicTask(devices[0], trigger, FETCH, 0.1)],
+                         clock=clock)
+    planner.run(duration=1.0)
+    stats = planner.stats["tasks"]["0x44"]
+    assert stats["fetch_misses"] == stats["jobs"]
+    assert stats["skipped"] > 0
+    assert stats["deadline_misses"] >= stats["jobs"]
+
+
+def test_errors_reported_to_callback():
+    clock, bus, devices = _create([0x44], missing=[0x44])
+    results = []
+    planner = EdfPlanner([PeriodicTask(
+        devices[0], TRIGGER, FETCH, 0.1,
+        callback=lambda t, r: results.append(r))], clock=clock)
+    planner.run(duration=0.3)
+    assert len(results) == 3
+    assert all(isinstance(r, I2cNackError) for r in results)
+    assert planner.stats["tasks"]["0x44"]["errors"] == 3
+
+
+def test_stop_from_callback():
+    clock, bus, devices = _create([0x44])
+    planners = []
+    task = PeriodicTask(devices[0], FETCH, None, 0.1,
+                        callback=lambda t, r: planners[0].stop())
+    planner = EdfPlanner([task], clock=clock)
+    planners.append(planner)
+    planner.run()
+    assert planner.stats["tasks"]["0x44"]["jobs"] == 1
+
+
+@patch("gc.freeze", create=True)
+def test_realtime_mode(freeze):
+    clock, bus, devices = _create([0x44, 0x45])
+    gc_states = []
+    realtime = RealtimeMode()
+    tasks = [PeriodicTask(d, TRIGGER, FETCH, 0.1,
+                          callback=lambda t, r: gc_states.append(
+                              gc.isenabled()))
+             for d in devices]
+    planner = EdfPlanner(tasks, clock=clock, realtime=realtime)
+    planner.run(duration=1.0)
+    assert gc.isenabled()
+    assert gc_states == [False] * 20  # callbacks run in sampling windows
+    freeze.assert_called_once_with()  # after the first job of every task
+    # One jitter value per trigger command
+    triggers = [f for f in bus.frames if f[2] == b"\x01"]
+    assert realtime.histogram.count == len(triggers)
+    assert realtime.histogram.as_dict()["max"] == pytest.approx(0.001)
@@ -3,7 +3,8 @@
 
 from __future__ import absolute_import, division, print_function
 from sensirion_i2c_driver.errors import I2cError, I2cChecksumError, \
-    I2cTransceiveError, I2cChannelDisabledError, I2cNackError, I2cTimeoutError
+    I2cTransceiveError, I2cChannelDisabledError, I2cNackError, \
+    I2cTimeoutError, I2cDeviceUnavailableError
 
 
 def test_i2c_error():
@@ -60,3 +61,11 @@ def test_i2c_timeout_error():
     expected_msg = "I2C transceive failed: Timeout."
     assert error.error_message == expected_msg
     assert str(error) == expected_msg
+
+
+def test_device_unavailable_error():
+    error = I2cDeviceUnavailableError(0x42)
+    assert isinstance(error, I2cTransceiveError)
+    assert error.slave_address == 0x42
+    assert error.transceiver_error is None
+    assert "0x42" in str(error)
@@ -2,7 +2,18 @@
 # (c) Copyright 2019 Sensirion AG, Switzerland
 
 from __future__ import absolute_import, division, print_function
-from sensirion_i2c_driver import LinuxI2cTransceiver
+from sensirion_i2c_driver import LinuxI2cTransceiver, I2cConnection, I2cCommand
+from sensirion_i2c_driver.clock import VirtualClock
+from sensirion_i2c_driver.tracing import I2cTracer
+from sensirion_i2c_driver.linux_i2c_transceiver import I2C_RDWR, I2C_M_RD, \
+    I2C_RETRIES, I2C_SLAVE, I2C_TIMEOUT, _ADAPTER_POOL
+from mock import patch
+import errno
+import fcntl
+import os
+import pytest
+import threading
+import time
 
 
 def test_open_close_file(tmpdir):
@@ -11,3 +22,439 @@ def test_open_close_file(tmpdir):
     with LinuxI2cTransceiver(str(device_file)) as transceiver:
         assert transceiver.description == str(device_file)
         assert transceiver.channel_count is None
+
+
+@pytest.fixture
+def loopback_device(tmpdir):
+    # A FIFO echoes written data back when reading it, which allows to test
+    # the transceiver without I²C hardware.
+    device_file = str(tmpdir.join("loopback"))
+    os.mkfifo(device_file)
+    with patch("fcntl.ioctl") as ioctl:
+        yield device_file, ioctl
+
+
+def test_api_version():
+    assert LinuxI2cTransceiver.API_VERSION == 2
+
+
+def test_transceive_v1(loopback_device):
+    device_file, ioctl = loopback_device
+    with LinuxI2cTransceiver(device_file) as transceiver:
+        result = transceiver.transceive(0x42, b"\x11\x22", 2, 0.0, 0.0)
+    assert result == (0, None, b"\x11\x22")
+    assert ioctl.call_args[0][1:] == (0x0703, 0x42)
+
+
+def test_single_frame_stop_between_write_and_read(loopback_device):
+    # A single frame must not be sent as combined I2C_RDWR transfer since
+    # some sensors require a STOP condition between write and read.
+    device_file, ioctl = loopback_device
+    with LinuxI2cTransceiver(device_file) as transceiver:
+        result = I2cConnection(transceiver).execute(
+            0x44, I2cCommand(b"\x24\x00", 2, 0.0, 0.0))
+    assert result == b"\x24\x00"
+    assert [c[0][1] for c in ioctl.call_args_list] == [I2C_SLAVE]
+
+
+class _FakeBus(object):
+    """
+    Fake ioctl function which simulates I²C devices responding to I2C_RDWR.
+    """
+
+    def __init__(self, devices):
+        self.devices = devices  # slave address -> data to read
+        self.calls = []  # list of messages per I2C_RDWR call
+        self.settings = []  # list of (request, value) of other ioctl calls
+        self.error = None  # error to raise on I2C_RDWR
+
+    def __call__(self, fd, request, arg):
+        if request != I2C_RDWR:
+            self.settings.append((request, arg))
+            return
+        if self.error is not None:
+            raise self.error
+        messages = []
+        for i in range(arg.nmsgs):
+            msg = arg.msgs[i]
+            if msg.addr not in self.devices:
+                raise OSError(errno.EREMOTEIO, "Remote I/O error")
+            if msg.flags & I2C_M_RD:
+                data = self.devices[msg.addr][:msg.len]
+                for k in range(msg.len):
+                    msg.buf[k] = data[k]
+                messages.append(("r", msg.addr, msg.len))
+            else:
+                data = bytes(bytearray(msg.buf[k] for k in range(msg.len)))
+                messages.append(("w", msg.addr, data))
+        self.calls.append(messages)
+
+
+def test_transceive_batch_packs_frames(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11\x22", 0x43: b"\x33"})
+    buffers = [bytearray(2), None, bytearray(1), None]
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus,
+                             repeated_start=True) as transceiver:
+        results = transceiver.transceive_batch([
+            (0x42, b"\x01\x02", 2, 0.0, 0.0),
+            (0x43, b"\x03", None, 0.0, 0.0),
+            (0x43, None, 1, 0.0, 0.0),
+            (0x43, b"", None, 0.0, 0.0),
+        ], buffers)
+    assert bus.calls == [[
+        ("w", 0x42, b"\x01\x02"),
+        ("r", 0x42, 2),
+        ("w", 0x43, b"\x03"),
+        ("r", 0x43, 1),
+        ("w", 0x43, b""),
+    ]]
+    assert [r[0] for r in results] == [0, 0, 0, 0]
+    assert buffers[0] == b"\x11\x22"
+    assert buffers[2] == b"\x33"
+
+
+def test_transceive_batch_stop_between_write_and_read(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11\x22", 0x43: b"\x33"})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus) as transceiver:
+        results = transceiver.transceive_batch([
+            (0x42, b"\x01\x02", 2, 0.0, 0.0),
+            (0x43, b"\x03", None, 0.0, 0.0),
+            (0x43, None, 1, 0.0, 0.0),
+            (0x43, b"\x04", 1, 0.0, 0.0),
+        ], [bytearray(2), None, bytearray(1), bytearray(1)])
+    assert bus.calls == [
+        [("w", 0x42, b"\x01\x02")],
+        [("r", 0x42, 2), ("w", 0x43, b"\x03"), ("r", 0x43, 1),
+         ("w", 0x43, b"\x04")],
+        [("r", 0x43, 1)],
+    ]
+    assert [r[0] for r in results] == [0, 0, 0, 0]
+
+
+def test_transceive_batch_single_frame_repeated_start(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11\x22"})
+    buffers = [bytearray(2)]
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus,
+                             repeated_start=True) as transceiver:
+        transceiver.transceive_batch([(0x42, b"\x01", 2, 0.0, 0.0)],
+                                     buffers)
+    assert bus.calls == [[("w", 0x42, b"\x01"), ("r", 0x42, 2)]]
+    assert buffers[0] == b"\x11\x22"
+
+
+def test_transceive_batch_splits_at_read_delay(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11"})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus) as transceiver:
+        results = transceiver.transceive_batch([
+            (0x42, b"\x01", 1, 0.001, 0.0),
+            (0x42, b"\x02", None, 0.0, 0.0),
+        ], [bytearray(1), None])
+    assert bus.calls == [
+        [("w", 0x42, b"\x01")],
+        [("r", 0x42, 1), ("w", 0x42, b"\x02")],
+    ]
+    assert [r[0] for r in results] == [0, 0]
+
+
+def test_transceive_batch_splits_at_message_limit(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b""})
+    frames = [(0x42, b"\x01", None, 0.0, 0.0)] * 50
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus) as transceiver:
+        results = transceiver.transceive_batch(frames, [None] * 50)
+    assert [len(c) for c in bus.calls] == [42, 8]
+    assert len(results) == 50
+
+
+def test_transceive_batch_nack(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11"})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus) as transceiver:
+        results = transceiver.transceive_batch([
+            (0x43, b"\x01", 1, 0.001, 0.0),
+            (0x42, None, 1, 0.0, 0.0),
+        ], [bytearray(1), bytearray(1)])
+    assert results[0][0] == LinuxI2cTransceiver.STATUS_NACK
+    assert results[1][0] == LinuxI2cTransceiver.STATUS_OK
+    # The read of the failed frame must not be executed
+    assert bus.calls == [[("r", 0x42, 1)]]
+
+
+def test_transceive_batch_applies_timeout_and_retries(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11"})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus,
+                             retries=3, repeated_start=True) as transceiver:
+        transceiver.transceive_batch([
+            (0x42, b"\x01", None, 0.001, 0.05),
+            (0x42, b"\x01", None, 0.001, 0.021),
+        ], [None, None])
+        transceiver.transceive_batch([
+            (0x42, b"\x01", None, 0.0, 0.05),
+        ], [None])
+        transceiver.transceive_batch([
+            (0x42, b"\x01", None, 0.0, 0.0),
+        ], [None])
+    assert bus.settings == [
+        (I2C_RETRIES, 3),
+        (I2C_TIMEOUT, 5),
+        (I2C_TIMEOUT, 3),
+        (I2C_TIMEOUT, 5),
+    ]
+
+
+def test_transceive_batch_timeout_error(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11"})
+    bus.error = OSError(errno.ETIMEDOUT, "Connection timed out")
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus,
+                             repeated_start=True) as transceiver:
+        results = transceiver.transceive_batch([
+            (0x42, b"\x01", 1, 0.0, 0.01),
+        ], [bytearray(1)])
+    assert results[0][0] == LinuxI2cTransceiver.STATUS_TIMEOUT
+
+
+def test_transceive_v1_applies_timeout(loopback_device):
+    device_file, ioctl = loopback_device
+    with LinuxI2cTransceiver(device_file) as transceiver:
+        transceiver.transceive(0x42, b"\x11", 1, 0.0, 0.1)
+        transceiver.transceive(0x42, b"\x11", 1, 0.0, 0.1)
+    requests = [c[0][1:] for c in ioctl.call_args_list]
+    # The unchanged slave address is not set again
+    assert requests == [
+        (I2C_TIMEOUT, 10),
+        (0x0703, 0x42),
+    ]
+
+
+def test_scan(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x44: b"", 0x69: b""})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus) as transceiver:
+        assert transceiver.scan(range(0x40, 0x70)) == [0x44, 0x69]
+    assert bus.calls == [[("w", 0x44, b"")], [("w", 0x69, b"")]]
+
+
+def test_scan_unsupported(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({})
+    bus.error = OSError(errno.EOPNOTSUPP, "Operation not supported")
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus) as transceiver:
+        with pytest.raises(OSError):
+            transceiver.scan([0x44])
+
+
+@patch("time.sleep")
+def test_transceive_batch_virtual_clock(sleep, tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    clock = VirtualClock()
+    bus = _FakeBus({0x42: b"\x11"})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus,
+                             clock=clock) as transceiver:
+        results = transceiver.transceive_batch(
+            [(0x42, b"\x01", 1, 0.1, 0.0)], [bytearray(1)])
+    assert results == [(0, None, pytest.approx(0.1))]
+    sleep.assert_not_called()
+
+
+def test_tracer_records_phases(loopback_device):
+    device_file, ioctl = loopback_device
+    tracer = I2cTracer(clock=VirtualClock())
+    with LinuxI2cTransceiver(device_file, tracer=tracer) as transceiver:
+        transceiver.transceive(0x42, b"\x11", 1, 0.001, 0.0)
+    assert transceiver.tracer is tracer
+    assert [e["name"] for e in tracer.events() if e["ph"] == "X"] == \
+        ["set_address", "write", "read_delay", "read"]
+
+
+def test_tracer_records_batch_ioctls(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    tracer = I2cTracer(clock=VirtualClock())
+    bus = _FakeBus({0x42: b"\x11"})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus, tracer=tracer,
+                             repeated_start=True) as transceiver:
+        transceiver.transceive_batch([(0x42, b"\x01", 1, 0.001, 0.0)],
+                                     [bytearray(1)])
+    phases = [e for e in tracer.events() if e["ph"] == "X"]
+    assert [(e["name"], e.get("args")) for e in phases] == [
+        ("ioctl", {"messages": 1}),
+        ("read_delay", {"requested_us": 1000.0}),
+        ("ioctl", {"messages": 1}),
+    ]
+
+
+def test_shared_file_descriptor(loopback_device):
+    device_file, ioctl = loopback_device
+    link = device_file + "-link"
+    os.symlink(device_file, link)
+    a = LinuxI2cTransceiver(device_file, shared=True)
+    b = LinuxI2cTransceiver(link, shared=True, retries=2)
+    adapter = _ADAPTER_POOL.get(device_file)
+    assert a.shared and b.shared
+    assert adapter is _ADAPTER_POOL.get(link)
+    assert adapter.references == 2
+    assert not adapter.is_open  # opened lazily
+    assert a.transceive(0x42, b"\x11", 1, 0.0, 0.0) == (0, None, b"\x11")
+    assert b.transceive(0x42, b"\x22", 1, 0.0, 0.0) == (0, None, b"\x22")
+    assert b.transceive(0x43, b"\x33", 1, 0.0, 0.0) == (0, None, b"\x33")
+    assert a.transceive(0x43, b"\x44", 1, 0.0, 0.0) == (0, None, b"\x44")
+    assert [c[0][1:] for c in ioctl.call_args_list] == [
+        (I2C_SLAVE, 0x42),
+        (I2C_RETRIES, 2),
+        (I2C_SLAVE, 0x43),
+    ]
+    assert len(set(c[0][0] for c in ioctl.call_args_list)) == 1
+    a.close()
+    assert adapter.is_open
+    b.close()
+    assert not adapter.is_open
+    assert _ADAPTER_POOL.get(device_file) is None
+
+
+def test_separate_file_descriptors(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11"})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus, retries=1,
+                             repeated_start=True) as a:
+        with LinuxI2cTransceiver(str(device_file), ioctl=bus,
+                                 retries=1, repeated_start=True) as b:
+            assert not b.shared
+            a.transceive_batch([(0x42, b"\x01", None, 0.0, 0.0)], [None])
+            b.transceive_batch([(0x42, b"\x01", None, 0.0, 0.0)], [None])
+    assert _ADAPTER_POOL.get(str(device_file)) is None
+    # The kernel stores the settings per adapter, not per file descriptor
+    assert bus.settings == [(I2C_RETRIES, 1)]
+    assert _ADAPTER_POOL.get_settings(str(device_file)) is None
+
+
+def test_settings_applied_again_after_close(tmpdir):
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11"})
+    for _ in range(2):
+        with LinuxI2cTransceiver(str(device_file), ioctl=bus,
+                                 retries=2) as transceiver:
+            transceiver.transceive(0x42, b"\x01", None, 0.0, 0.05)
+    assert bus.settings.count((I2C_RETRIES, 2)) == 2
+    assert bus.settings.count((I2C_TIMEOUT, 5)) == 2
+
+
+def test_bus_lock_applies_settings_on_every_transfer(tmpdir):
+    # Other processes might change the settings of the adapter, so they are
+    # applied again on every transfer while holding the bus lock
+    device_file = tmpdir.join("device")
+    device_file.ensure()
+    bus = _FakeBus({0x42: b"\x11"})
+    with LinuxI2cTransceiver(str(device_file), ioctl=bus, retries=2,
+                             bus_lock=True,
+                             repeated_start=True) as transceiver:
+        transceiver.transceive(0x42, b"\x01", None, 0.0, 0.05)
+        transceiver.transceive_batch([(0x42, b"\x01", 1, 0.0, 0.05)] * 2,
+                                     [bytearray(1), bytearray(1)])
+    assert [s for s in bus.settings if s[0] != I2C_SLAVE] == \
+        [(I2C_RETRIES, 2), (I2C_TIMEOUT, 5)] * 2
+
+
+class _LockProbe(object):
+    """
+    Checks whether the device file is locked by trying to lock it through
+    another file descriptor, as another process would do.
+    """
+
+    def __init__(self, device_file):
+        self.fd = os.open(device_file, os.O_RDWR)
+        self.results = []
+
+    def probe(self, name):
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            self.results.append((name, True))
+        else:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self.results.append((name, False))
+
+
+def test_bus_lock_released_during_read_delay(tmpdir):
+    device_file = str(tmpdir.join("device"))
+    open(device_file, "w").close()
+    probe = _LockProbe(device_file)
+    bus = _FakeBus({0x42: b"\x11"})
+
+    def ioctl(fd, request, arg):
+        probe.probe("ioctl")
+        return bus(fd, request, arg)
+
+    clock = VirtualClock()
+    clock.sleep = lambda seconds: probe.probe("read_delay")
+    with LinuxI2cTransceiver(device_file, ioctl=ioctl, clock=clock,
+                             bus_lock=True,
+                             repeated_start=True) as transceiver:
+        assert transceiver.bus_lock is True
+        results = transceiver.transceive_batch(
+            [(0x42, b"\x01", 1, 0.01, 0.0)], [bytearray(1)])
+        stats = transceiver.lock_stats
+    os.close(probe.fd)
+    assert results[0][0] == LinuxI2cTransceiver.STATUS_OK
+    assert probe.results == [
+        ("ioctl", True),
+        ("read_delay", False),
+        ("ioctl", True),
+    ]
+    assert stats["acquisitions"] == 2
+
+
+def test_bus_lock_waits_for_other_process(tmpdir):
+    device_file = str(tmpdir.join("device"))
+    open(device_file, "w").close()
+    other = os.open(device_file, os.O_RDWR)
+    fcntl.flock(other, fcntl.LOCK_EX)
+    bus = _FakeBus({0x42: b""})
+    with LinuxI2cTransceiver(device_file, ioctl=bus, bus_lock=True,
+                             repeated_start=True) as transceiver:
+        thread = threading.Thread(target=transceiver.transceive_batch, args=(
+            [(0x42, b"\x01", None, 0.0, 0.0)], [None]))
+        thread.start()
+        time.sleep(0.05)
+        assert bus.calls == []
+        fcntl.flock(other, fcntl.LOCK_UN)
+        thread.join()
+        stats = transceiver.lock_stats
+    os.close(other)
+    assert len(bus.calls) == 1
+    assert stats["acquisitions"] == 1
+    assert stats["max_wait"] >= 0.04
+    assert stats["total_hold"] < stats["total_wait"]
+
+
+def test_bus_lock_transceive_v1(loopback_device):
+    device_file, ioctl = loopback_device
+    tracer = I2cTracer(clock=VirtualClock())
+    with LinuxI2cTransceiver(device_file, bus_lock=True, tracer=tracer,
+                             clock=VirtualClock()) as transceiver:
+        result = transceiver.transceive(0x42, b"\x11", 1, 0.001, 0.0)
+        stats = transceiver.lock_stats
+    assert result == (0, None, b"\x11")
+    assert stats["acquisitions"] == 2  # write and read phase
+    assert transceiver.lock_stats == stats  # still available after closing
+    assert [e["name"] for e in tracer.events() if e["ph"] == "X"] == [
+        "lock_wait", "set_address", "write", "read_delay", "lock_wait",
+        "read"]
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand, I2cDevice, \
+    I2cMultiplexer
+from sensirion_i2c_driver.errors import I2cNackError
+from mock import MagicMock
+import pytest
+import threading
+
+
+class _FakeMuxBus(object):
+    """
+    Fake API V1 transceiver with a multiplexer at 0x70 and devices at 0x44
+    on some channels.
+    """
+
+    API_VERSION = 1
+    channel_count = None
+
+    def __init__(self, channels_with_device):
+        self.channels_with_device = channels_with_device
+        self.selected = 0
+        self.frames = []
+        self.mux_error = False
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        self.frames.append((slave_address, tx_data))
+        if slave_address == 0x70:
+            if self.mux_error:
+                return 2, None, b""
+            self.selected = bytearray(tx_data)[0].bit_length() - 1
+            return 0, None, b""
+        if self.selected not in self.channels_with_device:
+            return 2, None, b""
+        return 0, None, bytes(bytearray([self.selected] * (rx_length or 0)))
+
+
+def _create_mux(channels_with_device=range(8)):
+    bus = _FakeMuxBus(list(channels_with_device))
+    return bus, I2cMultiplexer(I2cConnection(bus), mux_address=0x70)
+
+
+def test_select_only_on_channel_change():
+    bus, mux = _create_mux()
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    assert mux.channel(2).execute(0x44, command) == b"\x02"
+    assert mux.channel(2).execute(0x44, command) == b"\x02"
+    assert mux.channel(5).execute(0x44, command) == b"\x05"
+    assert bus.frames == [
+        (0x70, b"\x04"), (0x44, b"\x01"), (0x44, b"\x01"),
+        (0x70, b"\x20"), (0x44, b"\x01"),
+    ]
+    assert mux.selected_channel == 5
+    assert mux.stats == {"selects": 2, "skipped": 1}
+
+
+def test_device_on_channel():
+    bus, mux = _create_mux()
+    device = I2cDevice(mux.channel(3), 0x44)
+    assert device.execute(I2cCommand(b"\x01", 2, 0.0, 0.0)) == b"\x03\x03"
+    assert device.connection.index == 3
+    assert device.connection.multiplexer is mux
+    assert device.connection.is_multi_channel is False
+
+
+def test_error_invalidates_selection():
+    bus, mux = _create_mux(channels_with_device=[1])
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    with pytest.raises(I2cNackError):
+        mux.channel(0).execute(0x44, command)
+    assert mux.selected_channel is None
+    mux.channel(0).execute(0x70, I2cCommand(b"\x01", None, 0.0, 0.0))
+    assert bus.frames[-2:] == [(0x70, b"\x01"), (0x70, b"\x01")]
+
+
+def test_select_error():
+    bus, mux = _create_mux()
+    bus.mux_error = True
+    with pytest.raises(I2cNackError):
+        mux.select(1)
+    assert mux.selected_channel is None
+
+
+def test_invalidate():
+    bus, mux = _create_mux()
+    mux.select(1)
+    mux.invalidate()
+    mux.select(1)
+    assert bus.frames == [(0x70, b"\x02")] * 2
+
+
+def test_execute_batch_groups_by_channel():
+    bus, mux = _create_mux(channels_with_device=[0, 1, 2])
+    mux.select(2)
+    del bus.frames[:]
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    responses = mux.execute_batch([
+        (0, 0x44, command),
+        (2, 0x44, command),
+        (0, 0x44, command),
+        (1, 0x44, command),
+    ])
+    assert responses == [b"\x00", b"\x02", b"\x00", b"\x01"]
+    assert [f[0] for f in bus.frames] == [0x44, 0x70, 0x44, 0x44, 0x70, 0x44]
+    assert mux.selected_channel == 1
+
+
+def test_execute_batch_returns_errors():
+    bus, mux = _create_mux(channels_with_device=[0])
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    responses = mux.channel(1).execute_batch([(0x44, command)])
+    assert isinstance(responses[0], I2cNackError)
+    assert mux.selected_channel is None
+    bus.mux_error = True
+    responses = mux.execute_batch([(0, 0x44, command)])
+    assert isinstance(responses[0], I2cNackError)
+
+
+def test_execute_chunked():
+    connection = MagicMock()
+    connection.execute.return_value = None
+    connection.execute_chunked.return_value = iter([b"\x01", b"\x02"])
+    mux = I2cMultiplexer(connection)
+    command = I2cCommand(b"\x01", 2, 0.0, 0.0)
+    chunks = list(mux.channel(4).execute_chunked(0x44, command, 1))
+    assert chunks == [b"\x01", b"\x02"]
+    assert connection.execute.call_args[0][1].tx_data == b"\x10"
+    connection.execute_chunked.assert_called_once_with(0x44, command, 1,
+                                                       True)
+
+
+def test_execute_chunked_selects_immediately():
+    bus, mux = _create_mux()
+    mux.channel(3).execute_chunked(0x44, I2cCommand(b"\x01", 2, 0.0, 0.0),
+                                   1)
+    assert mux.selected_channel == 3
+    assert bus.frames == [(0x70, b"\x08")]
+    with pytest.raises(ValueError):
+        mux.channel(3).execute_chunked(
+            0x44, I2cCommand(b"\x01", 2, 0.0, 0.0), 0)
+
+
+def test_execute_chunked_interleaved_with_other_channel():
+    bus, mux = _create_mux()
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    chunks = mux.channel(2).execute_chunked(
+        0x44, I2cCommand(b"\x02", 2, 0.0, 0.0), 1)
+    assert next(chunks) == b"\x02"
+    # Resuming the generator in another thread must not fail
+    thread = threading.Thread(target=mux.channel(5).execute,
+                              args=(0x44, command))
+    thread.start()
+    thread.join(5.0)
+    result = []
+    thread = threading.Thread(target=lambda: result.extend(chunks))
+    thread.start()
+    thread.join(5.0)
+    assert result == [b"\x02"]
+    assert bus.frames == [
+        (0x70, b"\x04"), (0x44, b"\x02"),
+        (0x70, b"\x20"), (0x44, b"\x01"),
+        (0x70, b"\x04"), (0x44, None),
+    ]
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, CrcCalculator
+from sensirion_i2c_driver.clock import VirtualClock
+from sensirion_i2c_driver.errors import I2cChecksumError
+from sensirion_i2c_driver.transceiver_v2 import I2cTransceiverV2Adapter
+from sensirion_i2c_driver.profile import ProfileCommand, \
+    SimulatedTransceiver, TransceiverRecorder, RecordedTransceiver, \
+    profile, find_min_read_delay, format_table, main
+from mock import MagicMock
+import json
+import pytest
+
+
+def _connection(min_read_delay=0.0):
+    clock = VirtualClock()
+    transceiver = SimulatedTransceiver([0x44], clock,
+                                       min_read_delay=min_read_delay)
+    return I2cConnection(transceiver, clock=clock)
+
+
+def test_parse_command():
+    cmd = ProfileCommand.parse("2400,6,0.016")
+    assert cmd.tx_data == b"\x24\x00"
+    assert cmd.rx_length == 6
+    assert cmd.read_delay == 0.016
+    assert cmd.name == "2400/6@16ms"
+    assert ProfileCommand.parse("3f").rx_length is None
+    with pytest.raises(ValueError):
+        ProfileCommand.parse("24,6,0.1,1")
+
+
+def test_crc_validation():
+    cmd = ProfileCommand(b"\x24\x00", 3, 0.0, CrcCalculator(8, 0x31, 0xFF))
+    assert cmd.interpret_response(b"\x00\x00\x81") == b"\x00\x00\x81"
+    with pytest.raises(I2cChecksumError):
+        cmd.interpret_response(b"\x00\x00\x00")
+
+
+def test_profile():
+    connection = _connection(min_read_delay=0.01)
+    commands = [ProfileCommand.parse("2400,6,0.016"),
+                ProfileCommand.parse("2400,6,0.001")]
+    report = profile(connection, [0x44, 0x45], commands, iterations=10)
+    assert report["iterations"] == 10
+    assert report["throughput"] > 0
+    assert len(report["results"]) == 4
+    ok = report["results"][0]
+    assert ok["address"] == "0x44"
+    assert ok["count"] == 10
+    assert ok["error_rate"] == 0.0
+    # 93 cycles at 100 kHz (3 + 7 bytes) and the read delay
+    assert ok["latency_ms"]["p50"] == pytest.approx(16.93, abs=1e-3)
+    assert report["results"][1]["errors"] == {"I2cNackError": 10}
+    assert report["results"][2]["error_rate"] == 1.0
+    assert report["sleep_overshoot_us"] is None
+
+
+def test_find_min_read_delay():
+    connection = _connection(min_read_delay=0.0123)
+    command = ProfileCommand.parse("2400,6,0.016")
+    delay = find_min_read_delay(connection, 0x44, command, trials=2,
+                                resolution=0.0001)
+    assert 0.0123 <= delay <= 0.0124
+    assert find_min_read_delay(connection, 0x44,
+                               command.with_read_delay(0.01)) is None
+    assert find_min_read_delay(_connection(), 0x44, command) == 0.0
+
+
+def test_record_replay(tmpdir):
+    path = str(tmpdir.join("recording.json"))
+    clock = VirtualClock()
+    recorder = TransceiverRecorder(
+        SimulatedTransceiver([0x44], clock, min_read_delay=0.01), clock)
+    commands = [ProfileCommand.parse("2400,6,0.016"),
+                ProfileCommand.parse("2400,6,0.001")]
+    recorded = profile(I2cConnection(recorder, clock=clock), [0x44],
+                       commands, iterations=3)
+    recorder.save(path)
+
+    clock = VirtualClock()
+    transceiver = RecordedTransceiver(path, clock)
+    assert transceiver.description == "replay of simulated@100000Hz"
+    replayed = profile(I2cConnection(transceiver, clock=clock), [0x44],
+                       commands, iterations=3)
+    assert replayed["results"] == recorded["results"]
+    report = profile(I2cConnection(transceiver, clock=clock), [0x45],
+                     commands, iterations=1)
+    assert report["results"][0]["error_rate"] == 1.0
+
+
+def test_record_replay_api_v2(tmpdir):
+    # The recorder must not change how the frames are transferred
+    path = str(tmpdir.join("recording.json"))
+    clock = VirtualClock()
+    transceiver = I2cTransceiverV2Adapter(
+        SimulatedTransceiver([0x44], clock, min_read_delay=0.01), clock)
+    transceiver.transceive_batch = MagicMock(
+        wraps=transceiver.transceive_batch)
+    recorder = TransceiverRecorder(transceiver, clock)
+    assert recorder.API_VERSION == 2
+    commands = [ProfileCommand.parse("2400,6,0.016"),
+                ProfileCommand.parse("2400,6,0.001")]
+    recorded = profile(I2cConnection(recorder, clock=clock), [0x44],
+                       commands, iterations=3)
+    assert transceiver.transceive_batch.call_count == 6
+    assert recorded["results"][0]["latency_ms"]["p50"] == \
+        pytest.approx(16.93, abs=1e-3)
+    recorder.save(path)
+
+    clock = VirtualClock()
+    transceiver = RecordedTransceiver(path, clock)
+    assert transceiver.API_VERSION == 2
+    replayed = profile(I2cConnection(transceiver, clock=clock), [0x44],
+                       commands, iterations=3)
+    assert replayed["results"] == recorded["results"]
+
+
+def test_format_table():
+    report = profile(_connection(), [0x44],
+                     [ProfileCommand.parse("2400,6,0.016")], iterations=2)
+    report["results"][0]["min_read_delay"] = 0.0
+    lines = format_table(report).splitlines()
+    assert lines[0].startswith("Address")
+    assert lines[1].split() == ["0x44", "2400/6@16ms", "2", "0.00", "16.930",
+                                "16.930", "16.930", "16.930", "0.000"]
+    assert lines[2].startswith("Throughput:")
+
+
+def test_main_json(capsys):
+    assert main(["--simulate", "-a", "0x44", "-c", "2400,6,0.016", "--crc",
+                 "-n", "5", "--simulated-read-delay", "0.01",
+                 "--find-read-delay", "--format", "json"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["transceiver"] == "simulated@100000Hz"
+    result = report["results"][0]
+    assert result["count"] == 5
+    assert result["error_rate"] == 0.0
+    assert result["min_read_delay"] == pytest.approx(0.01, abs=1e-4)
+
+
+def test_main_record_and_replay(tmpdir, capsys):
+    path = str(tmpdir.join("recording.json"))
+    main(["--simulate", "-a", "0x44", "-c", "2400,6,0.016", "-n", "2",
+          "--record", path])
+    recorded = capsys.readouterr().out
+    assert main(["--replay", path, "-a", "0x44", "-c", "2400,6,0.016",
+                 "-n", "2"]) == 0
+    replayed = capsys.readouterr().out
+    assert replayed.splitlines()[0] == \
+        "Transceiver: replay of simulated@100000Hz"
+    assert replayed.splitlines()[1:] == recorded.splitlines()[1:]
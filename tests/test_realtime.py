@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver.clock import VirtualClock
+from sensirion_i2c_driver.realtime import JitterHistogram, RealtimeMode, \
+    measure_jitter
+from mock import patch
+import gc
+import os
+import pytest
+import threading
+
+
+def test_histogram():
+    histogram = JitterHistogram(bucket_width=0.001, bucket_count=3)
+    assert histogram.percentile(50.0) is None
+    for jitter in [-0.0001, 0.0005, 0.0015, 0.0015, 0.0025, 0.01]:
+        histogram.add(jitter)
+    assert histogram.buckets == [2, 2, 1]
+    assert histogram.overflow == 1
+    assert histogram.count == 6
+    assert histogram.percentile(50.0) == pytest.approx(0.002)
+    assert histogram.percentile(100.0) == float("inf")
+    summary = histogram.as_dict()
+    assert summary["max"] == 0.01
+    assert summary["mean"] == pytest.approx(0.0159 / 6)
+    lines = histogram.format(width=10).splitlines()
+    assert lines[0] == "<   1000.0 us        2 ##########"
+    assert lines[-1] == ">=  3000.0 us        1 #####"
+    histogram.clear()
+    assert histogram.count == 0
+    assert histogram.buckets == [0, 0, 0]
+
+
+def test_sampling_window_pauses_gc():
+    realtime = RealtimeMode()
+    assert gc.isenabled()
+    with realtime.sampling_window():
+        assert not gc.isenabled()
+        with realtime.sampling_window():
+            assert not gc.isenabled()
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+
+def test_overlapping_sampling_windows_of_threads():
+    # Windows of different threads may end in any order, the collector must
+    # stay paused until the last one ends
+    first = RealtimeMode().sampling_window()
+    second = RealtimeMode().sampling_window()
+    first.__enter__()
+    thread = threading.Thread(target=second.__enter__)
+    thread.start()
+    thread.join(5.0)
+    first.__exit__(None, None, None)
+    assert not gc.isenabled()
+    thread = threading.Thread(target=second.__exit__, args=(None,) * 3)
+    thread.start()
+    thread.join(5.0)
+    assert gc.isenabled()
+
+
+@patch("os.sched_setscheduler", side_effect=PermissionError(1, "EPERM"),
+       create=True)
+@patch("os.sched_setaffinity", create=True)
+@patch("os.sched_getaffinity", return_value={0, 1}, create=True)
+def test_apply_degrades_gracefully(getaffinity, setaffinity, setscheduler):
+    realtime = RealtimeMode(cpus=[1], priority=50)
+    realtime.apply()
+    assert realtime.status == {"affinity": True, "sched_fifo": False,
+                               "gc_frozen": False}
+    setaffinity.assert_called_once_with(0, {1})
+    assert setscheduler.call_args[0][1] == os.SCHED_FIFO
+    realtime.restore()
+    setaffinity.assert_called_with(0, {0, 1})
+    assert realtime.status["affinity"] is False
+
+
+@patch("gc.unfreeze", create=True)
+@patch("gc.freeze", create=True)
+def test_freeze(freeze, unfreeze):
+    RealtimeMode(freeze_gc=False).freeze()
+    freeze.assert_not_called()
+    realtime = RealtimeMode()
+    realtime.freeze()
+    freeze.assert_called_once_with()
+    assert realtime.status["gc_frozen"] is True
+    realtime.restore()
+    unfreeze.assert_called_once_with()
+    assert realtime.status["gc_frozen"] is False
+    realtime.restore()
+    assert unfreeze.call_count == 1
+
+
+@patch("gc.unfreeze", create=True)
+@patch("gc.freeze", create=True)
+def test_freeze_of_several_modes(freeze, unfreeze):
+    # The objects must stay frozen until all modes are restored
+    first, second = RealtimeMode(), RealtimeMode()
+    first.freeze()
+    first.freeze()
+    second.freeze()
+    first.restore()
+    unfreeze.assert_not_called()
+    assert second.status["gc_frozen"] is True
+    second.restore()
+    unfreeze.assert_called_once_with()
+    RealtimeMode(freeze_gc=False).restore()
+    assert unfreeze.call_count == 1
+
+
+def test_measure_jitter():
+    histogram = measure_jitter(period=0.01, count=20, clock=VirtualClock())
+    assert histogram.count == 20
+    assert histogram.as_dict()["max"] == pytest.approx(0.0, abs=1e-9)
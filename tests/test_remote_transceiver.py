@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand
+from sensirion_i2c_driver.bus_server import I2cBusServer
+from sensirion_i2c_driver.errors import I2cNackError
+from sensirion_i2c_driver.remote_transceiver import RemoteTransceiver
+from mock import MagicMock
+import pytest
+import threading
+
+
+@pytest.fixture
+def server(tmpdir):
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.description = "fake"
+    server = I2cBusServer(transceiver, str(tmpdir.join("bus.sock")))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server, transceiver
+    server.shutdown()
+    thread.join()
+    server.close()
+
+
+def test_description_and_channel_count(server):
+    server, _ = server
+    with RemoteTransceiver(server.socket_path) as transceiver:
+        assert transceiver.description == server.socket_path + " (fake)"
+        assert transceiver.channel_count is None
+
+
+def test_execute_through_connection(server):
+    server, transceiver = server
+    transceiver.transceive.return_value = (0, None, b"\x11\x22\x33")
+    with RemoteTransceiver(server.socket_path) as remote:
+        connection = I2cConnection(remote)
+        response = connection.execute(0x42, I2cCommand(b"\x55", 3, 0.1, 0.2))
+    assert response == b"\x11\x22\x33"
+    args = [kwargs for args, kwargs in transceiver.transceive.call_args_list]
+    assert args == [
+        {
+            "slave_address": 0x42,
+            "tx_data": b"\x55",
+            "rx_length": 3,
+            "read_delay": 0.1,
+            "timeout": 0.2,
+        },
+    ]
+
+
+def test_execute_nack_through_connection(server):
+    server, transceiver = server
+    transceiver.transceive.return_value = (2, Exception("NACK"), b"")
+    with RemoteTransceiver(server.socket_path) as remote:
+        connection = I2cConnection(remote)
+        with pytest.raises(I2cNackError):
+            connection.execute(0x42, I2cCommand(b"\x55", 3, 0.1, 0.2))
+
+
+def test_multiple_clients(server):
+    server, transceiver = server
+    transceiver.transceive.return_value = (0, None, b"\x01")
+    remotes = [RemoteTransceiver(server.socket_path) for _ in range(3)]
+    for remote in remotes:
+        assert remote.transceive(0x42, None, 1, 0.0, 0.0) == (0, None, b"\x01")
+        remote.close()
+    assert transceiver.transceive.call_count == 3
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand
+from sensirion_i2c_driver.errors import I2cError
+from sensirion_i2c_driver.request_coalescer import I2cRequestCoalescer
+from mock import MagicMock, patch
+import pytest
+import threading
+
+
+def test_execute_returns_result():
+    coalescer = I2cRequestCoalescer()
+    assert coalescer.execute("key", lambda: 42) == 42
+    assert coalescer.execute("key", lambda: 43) == 43
+    assert coalescer.stats == {"executed": 2, "coalesced": 0, "fresh_hits": 0}
+
+
+def test_execute_raises_error():
+    def fail():
+        raise IOError("failed")
+    coalescer = I2cRequestCoalescer()
+    with pytest.raises(IOError):
+        coalescer.execute("key", fail)
+
+
+def test_concurrent_identical_requests_are_coalesced():
+    coalescer = I2cRequestCoalescer()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def leader_function():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "result"
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(coalescer.execute("key",
+                                                        leader_function)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(
+        coalescer.execute("key", lambda: calls.append(1))))
+        for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while coalescer.stats["coalesced"] < 3:
+        pass
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    assert coalescer.stats == {"executed": 1, "coalesced": 3, "fresh_hits": 0}
+
+
+def test_aborted_leader_fails_coalesced_requests():
+    coalescer = I2cRequestCoalescer(freshness=10.0)
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def leader_function():
+        started.set()
+        release.wait()
+        raise KeyboardInterrupt()
+
+    def run_leader():
+        try:
+            coalescer.execute("key", leader_function)
+        except KeyboardInterrupt as e:
+            errors.append(e)
+
+    def run_follower():
+        try:
+            coalescer.execute("key", lambda: "unexpected")
+        except I2cError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run_leader)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=run_follower)
+    follower.start()
+    while coalescer.stats["coalesced"] < 1:
+        pass
+    release.set()
+    for thread in [leader, follower]:
+        thread.join()
+    assert sorted(type(e).__name__ for e in errors) == \
+        ["I2cError", "KeyboardInterrupt"]
+    assert coalescer.execute("key", lambda: "result") == "result"
+
+
+@patch("time.monotonic")
+def test_freshness_window(monotonic):
+    coalescer = I2cRequestCoalescer(freshness=0.5)
+    monotonic.return_value = 10.0
+    assert coalescer.execute("key", lambda: 1) == 1
+    monotonic.return_value = 10.4
+    assert coalescer.execute("key", lambda: 2) == 1
+    monotonic.return_value = 10.5
+    assert coalescer.execute("key", lambda: 3) == 3
+    assert coalescer.stats == {"executed": 2, "coalesced": 0, "fresh_hits": 1}
+
+
+def test_connection_uses_coalescer_for_reads_only():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (0, None, b"\x11")
+    connection = I2cConnection(transceiver)
+    connection.request_coalescer = I2cRequestCoalescer(freshness=60.0)
+    read = I2cCommand(b"\x55", 1, 0.0, 0.0)
+    write = I2cCommand(b"\x66", None, 0.0, 0.0)
+    assert connection.execute(0x42, read) == b"\x11"
+    assert connection.execute(0x42, read) == b"\x11"
+    connection.execute(0x42, write)
+    connection.execute(0x42, write)
+    assert transceiver.transceive.call_count == 3
+
+
+def test_connection_does_not_reuse_errors():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (2, Exception("NACK"), b"")
+    connection = I2cConnection(transceiver)
+    connection.always_multi_channel_response = True
+    connection.request_coalescer = I2cRequestCoalescer(freshness=60.0)
+    read = I2cCommand(b"\x55", 1, 0.0, 0.0)
+    connection.execute(0x42, read)
+    connection.execute(0x42, read)
+    assert transceiver.transceive.call_count == 2
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver.response_cache import I2cResponseCache
+from mock import patch
+
+
+def test_get_miss():
+    cache = I2cResponseCache()
+    assert cache.get(0x42, b"\x01", 3) is None
+    assert cache.stats == {"hits": 0, "misses": 1, "evictions": 0, "size": 0}
+
+
+def test_put_get_hit():
+    cache = I2cResponseCache()
+    cache.put(0x42, b"\x01", 3, b"\x11\x22\x33", 10.0)
+    assert cache.get(0x42, b"\x01", 3) == b"\x11\x22\x33"
+    assert cache.get(0x42, b"\x01", 2) is None
+    assert cache.get(0x43, b"\x01", 3) is None
+    assert cache.stats == {"hits": 1, "misses": 2, "evictions": 0, "size": 1}
+
+
+def test_multi_channel_response_is_copied():
+    cache = I2cResponseCache()
+    response = [b"\x11", b"\x22"]
+    cache.put(0x42, b"\x01", 1, response, 10.0)
+    response.append(b"\x33")
+    cached = cache.get(0x42, b"\x01", 1)
+    assert cached == [b"\x11", b"\x22"]
+    assert type(cached) is list
+
+
+@patch("time.monotonic")
+def test_ttl_expiry(monotonic):
+    cache = I2cResponseCache()
+    monotonic.return_value = 100.0
+    cache.put(0x42, b"\x01", 3, b"\x11", 1.0)
+    monotonic.return_value = 100.9
+    assert cache.get(0x42, b"\x01", 3) == b"\x11"
+    monotonic.return_value = 101.0
+    assert cache.get(0x42, b"\x01", 3) is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = I2cResponseCache(max_size=2)
+    cache.put(0x42, b"\x01", 1, b"\x11", float("inf"))
+    cache.put(0x42, b"\x02", 1, b"\x22", float("inf"))
+    cache.get(0x42, b"\x01", 1)  # makes entry 2 the least recently used
+    cache.put(0x42, b"\x03", 1, b"\x33", float("inf"))
+    assert cache.get(0x42, b"\x01", 1) == b"\x11"
+    assert cache.get(0x42, b"\x02", 1) is None
+    assert cache.get(0x42, b"\x03", 1) == b"\x33"
+    assert cache.stats["evictions"] == 1
+
+
+def test_invalidate_address():
+    cache = I2cResponseCache()
+    cache.put(0x42, b"\x01", 1, b"\x11", float("inf"))
+    cache.put(0x43, b"\x01", 1, b"\x22", float("inf"))
+    cache.invalidate(0x42)
+    assert cache.get(0x42, b"\x01", 1) is None
+    assert cache.get(0x43, b"\x01", 1) == b"\x22"
+    cache.invalidate()
+    assert len(cache) == 0
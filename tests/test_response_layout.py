@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import SensirionI2cCommand, CrcCalculator
+from sensirion_i2c_driver.errors import I2cChecksumError
+from sensirion_i2c_driver.response_layout import ResponseLayout, \
+    ResponseField
+import pytest
+import struct
+
+CRC = CrcCalculator(8, 0x31, 0xFF)
+
+
+def _with_crc(data):
+    result = bytearray()
+    for i in range(0, len(data), 2):
+        result += data[i:i + 2]
+        result.append(CRC(data[i:i + 2]))
+    return bytes(result)
+
+
+def test_decode_words():
+    layout = ResponseLayout("Measurement", [
+        ResponseField("a", "H"),
+        ResponseField("b", "h"),
+    ])
+    data = _with_crc(b"\xBE\xEF\xFF\xFE")
+    assert layout.rx_length() == 6
+    assert layout.decode(data, CRC) == (0xBEEF, -2)
+    assert layout.decode(data, CRC).b == -2
+
+
+def test_decode_without_crc():
+    layout = ResponseLayout("Measurement", [
+        ResponseField("a", "B"),
+        ResponseField("b", "I"),
+    ])
+    assert layout.rx_length(crc_interleaved=False) == 5
+    assert layout.decode(b"\x01\x00\x00\x01\x00") == (1, 256)
+
+
+def test_decode_32bit_values_and_scaling():
+    layout = ResponseLayout("Measurement", [
+        ResponseField("u32", "I"),
+        ResponseField("i32", "i"),
+        ResponseField("f32", "f"),
+        ResponseField("scaled", "H", scale=0.5, offset=-10.0),
+    ])
+    raw = struct.pack(">Iif", 0x12345678, -5, 1.5) + b"\x00\x64"
+    result = layout.decode(_with_crc(raw), CRC)
+    assert result == (0x12345678, -5, 1.5, 40.0)
+    assert layout.tuple_type._fields == ("u32", "i32", "f32", "scaled")
+
+
+def test_decode_bytes_and_padding():
+    layout = ResponseLayout("Status", [
+        ResponseField("flags", "B"),
+        ResponseField(None, "x"),
+        ResponseField(None, "xx"),
+        ResponseField("value", "H"),
+    ])
+    data = _with_crc(b"\x05\x00\xAA\xBB\x01\x02")
+    assert layout.decode(data, CRC) == (5, 0x0102)
+
+
+def test_decode_wrong_crc():
+    layout = ResponseLayout("Measurement", [ResponseField("a", "H")])
+    with pytest.raises(I2cChecksumError):
+        layout.decode(b"\xBE\xEF\x00", CRC)
+
+
+def test_decode_wrong_length():
+    layout = ResponseLayout("Measurement", [ResponseField("a", "H")])
+    with pytest.raises(ValueError):
+        layout.decode(b"\xBE\xEF", CRC)
+
+
+def test_unaligned_field():
+    layout = ResponseLayout("Measurement", [
+        ResponseField("a", "B"),
+        ResponseField("b", "H"),
+        ResponseField(None, "x"),
+    ])
+    with pytest.raises(ValueError):
+        layout.rx_length()
+
+
+def test_unsupported_type():
+    with pytest.raises(ValueError):
+        ResponseField("a", "Q")
+    # Padding in named fields would shift the decoded values
+    with pytest.raises(ValueError):
+        ResponseField("a", "xx")
+    with pytest.raises(ValueError):
+        ResponseField("a", "xB")
+    with pytest.raises(ValueError):
+        ResponseField(None, "H")
+
+
+def test_sensirion_command_with_response_layout():
+    class ReadMeasurement(SensirionI2cCommand):
+        response_layout = ResponseLayout("Measurement", [
+            ResponseField("temperature", "h", scale=0.01),
+        ])
+
+        def __init__(self):
+            super(ReadMeasurement, self).__init__(
+                0x1234, None, 3, 0.0, 0.0, CRC)
+
+    command = ReadMeasurement()
+    assert command.interpret_response(_with_crc(b"\x09\xC4")) == (25.0,)
+    assert command.interpret_response(b"") is None
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand, \
+    SensirionI2cCommand, CrcCalculator
+from sensirion_i2c_driver.retry_policy import I2cRetryPolicy
+from sensirion_i2c_driver.circuit_breaker import I2cCircuitBreaker
+from sensirion_i2c_driver.errors import I2cError, I2cNackError, \
+    I2cTimeoutError, I2cChecksumError, I2cDeviceUnavailableError
+from mock import MagicMock, patch, call
+import random
+import pytest
+
+CRC = CrcCalculator(8, 0x31, 0xFF)
+NACK = (2, Exception("NACK"), b"")
+
+
+def _create_connection(results):
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.transceive.side_effect = results
+    return transceiver, I2cConnection(transceiver)
+
+
+def test_retry_key_uses_most_specific_type():
+    policy = I2cRetryPolicy({I2cError: 1, I2cNackError: 3})
+    assert policy.retry_key(I2cNackError(None, b"")) is I2cNackError
+    assert policy.retry_key(I2cTimeoutError(None, b"")) is I2cError
+    assert policy.retry_key(ValueError()) is None
+    assert policy.retry_key(I2cDeviceUnavailableError(0x42)) is None
+    assert policy.max_retries(I2cNackError) == 3
+
+
+def test_backoff_time():
+    policy = I2cRetryPolicy(backoff=0.1, backoff_factor=2.0)
+    assert [policy.backoff_time(i) for i in (1, 2, 3)] == \
+        pytest.approx([0.1, 0.2, 0.4])
+
+
+def test_backoff_time_jitter():
+    policy = I2cRetryPolicy(backoff=1.0, jitter=0.2, rng=random.Random(1))
+    for _ in range(100):
+        assert 0.8 <= policy.backoff_time(1) <= 1.2
+
+
+@patch("time.sleep")
+def test_connection_retries_nack(sleep):
+    transceiver, connection = _create_connection([NACK, (0, None, b"\x11")])
+    connection.retry_policy = I2cRetryPolicy({I2cNackError: 2}, backoff=0.01)
+    assert connection.execute(0x42, I2cCommand(b"\x55", 1, 0.1, 0.0)) == \
+        b"\x11"
+    assert transceiver.transceive.call_count == 2
+    sleep.assert_called_once_with(0.01)
+    assert connection.retry_policy.stats == \
+        {"retries": 1, "rereads": 0, "exhausted": 0}
+
+
+def test_connection_retries_exhausted():
+    transceiver, connection = _create_connection([NACK] * 3)
+    connection.retry_policy = I2cRetryPolicy({I2cNackError: 2})
+    with pytest.raises(I2cNackError):
+        connection.execute(0x42, I2cCommand(b"\x55", 1, 0.1, 0.0))
+    assert transceiver.transceive.call_count == 3
+    assert connection.retry_policy.stats == \
+        {"retries": 2, "rereads": 0, "exhausted": 1}
+
+
+def test_connection_does_not_retry_other_errors():
+    transceiver, connection = _create_connection(
+        [(3, Exception("timeout"), b"")])
+    connection.retry_policy = I2cRetryPolicy({I2cNackError: 2})
+    with pytest.raises(I2cTimeoutError):
+        connection.execute(0x42, I2cCommand(b"\x55", 1, 0.1, 0.0))
+    assert transceiver.transceive.call_count == 1
+    assert connection.retry_policy.stats["exhausted"] == 0
+
+
+@patch("time.monotonic")
+def test_connection_retry_deadline(monotonic):
+    monotonic.return_value = 0.0
+    transceiver, connection = _create_connection([NACK] * 3)
+    connection.retry_policy = I2cRetryPolicy({I2cNackError: 5}, deadline=0.5)
+
+    def transceive(**kwargs):
+        monotonic.return_value += 0.3
+        return NACK
+    transceiver.transceive.side_effect = transceive
+    with pytest.raises(I2cNackError):
+        connection.execute(0x42, I2cCommand(b"\x55", 1, 0.1, 0.0))
+    assert transceiver.transceive.call_count == 2
+
+
+def test_connection_rereads_on_checksum_error():
+    transceiver, connection = _create_connection([
+        (0, None, b"\xBE\xEF\x00"),  # wrong CRC
+        (0, None, b"\xBE\xEF\x92"),
+    ])
+    connection.retry_policy = I2cRetryPolicy()
+    command = SensirionI2cCommand(0x1234, None, 3, 0.1, 0.0, CRC,
+                                  rereadable=True)
+    assert connection.execute(0x42, command) == b"\xBE\xEF"
+    assert transceiver.transceive.call_args_list == [
+        call(slave_address=0x42, tx_data=b"\x12\x34", rx_length=3,
+             read_delay=0.1, timeout=0.0),
+        call(slave_address=0x42, tx_data=None, rx_length=3,
+             read_delay=0.0, timeout=0.0),
+    ]
+    assert connection.retry_policy.stats == \
+        {"retries": 1, "rereads": 1, "exhausted": 0}
+
+
+def test_connection_resends_non_rereadable_command():
+    transceiver, connection = _create_connection([
+        (0, None, b"\xBE\xEF\x00"),
+        (0, None, b"\xBE\xEF\x00"),
+        (0, None, b"\xBE\xEF\x92"),
+    ])
+    connection.retry_policy = I2cRetryPolicy({I2cChecksumError: 1})
+    command = SensirionI2cCommand(0x1234, None, 3, 0.1, 0.0, CRC)
+    with pytest.raises(I2cChecksumError):
+        connection.execute(0x42, command)
+    assert [c[1]["tx_data"] for c in transceiver.transceive.call_args_list] \
+        == [b"\x12\x34", b"\x12\x34"]
+
+
+def test_connection_does_not_retry_multi_channel():
+    transceiver, connection = _create_connection([[NACK, NACK]])
+    transceiver.channel_count = 2
+    connection.retry_policy = I2cRetryPolicy({I2cNackError: 2})
+    response = connection.execute(0x42, I2cCommand(b"\x55", 1, 0.1, 0.0))
+    assert [type(r) for r in response] == [I2cNackError] * 2
+    assert transceiver.transceive.call_count == 1
+
+
+def test_connection_does_not_retry_open_circuit():
+    transceiver, connection = _create_connection([NACK] * 3)
+    connection.circuit_breaker = I2cCircuitBreaker(failure_threshold=1,
+                                                   initial_backoff=60.0)
+    connection.retry_policy = I2cRetryPolicy({I2cNackError: 5})
+    with pytest.raises(I2cDeviceUnavailableError):
+        connection.execute(0x42, I2cCommand(b"\x55", 1, 0.1, 0.0))
+    assert transceiver.transceive.call_count == 1
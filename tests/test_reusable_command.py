@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import SensirionI2cCommand, CrcCalculator
+from sensirion_i2c_driver.reusable_command import \
+    ReusableSensirionI2cCommand
+import pytest
+
+CRC = CrcCalculator(8, 0x31, 0xFF)
+
+
+def test_initial_tx_data_equals_sensirion_command():
+    cmd = ReusableSensirionI2cCommand(0x1337, b"\xBE\xEF\x00\x00", None,
+                                      0.0, 0.0, CRC)
+    ref = SensirionI2cCommand(0x1337, b"\xBE\xEF\x00\x00", None, 0.0, 0.0,
+                              CRC)
+    assert type(cmd.tx_data) is bytes
+    assert cmd.tx_data == ref.tx_data
+    assert cmd.word_count == 2
+
+
+def test_set_word():
+    cmd = ReusableSensirionI2cCommand(0x1337, b"\x00\x00\x00\x00", None,
+                                      0.0, 0.0, CRC)
+    cmd.set_word(1, 0xBEEF)
+    ref = SensirionI2cCommand(0x1337, b"\x00\x00\xBE\xEF", None, 0.0, 0.0,
+                              CRC)
+    assert cmd.tx_data == ref.tx_data
+
+
+def test_set_words_negative_value():
+    cmd = ReusableSensirionI2cCommand(0x1337, b"\x00\x00\x00\x00", None,
+                                      0.0, 0.0, CRC)
+    cmd.set_words([-2, 0x1234])
+    ref = SensirionI2cCommand(0x1337, b"\xFF\xFE\x12\x34", None, 0.0, 0.0,
+                              CRC)
+    assert cmd.tx_data == ref.tx_data
+
+
+def test_snapshot_is_reused_if_unchanged():
+    cmd = ReusableSensirionI2cCommand(0x1337, b"\x00\x01", None, 0.0, 0.0,
+                                      CRC)
+    snapshot = cmd.tx_data
+    cmd.set_word(0, 0x0001)
+    assert cmd.tx_data is snapshot
+    cmd.set_word(0, 0x0002)
+    assert cmd.tx_data is not snapshot
+
+
+def test_without_crc_and_command():
+    cmd = ReusableSensirionI2cCommand(None, b"\x00\x00\x00\x00", None,
+                                      0.0, 0.0, None)
+    cmd.set_word(1, 0xABCD)
+    assert cmd.tx_data == b"\x00\x00\xAB\xCD"
+
+
+def test_set_word_out_of_range():
+    cmd = ReusableSensirionI2cCommand(0x1337, b"\x00\x00", None, 0.0, 0.0,
+                                      CRC)
+    with pytest.raises(IndexError):
+        cmd.set_word(1, 0)
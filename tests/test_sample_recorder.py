@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver.clock import VirtualClock
+from sensirion_i2c_driver.sample_recorder import SampleRecorder, \
+    SampleRecording
+from collections import namedtuple
+from mock import MagicMock
+import os
+import pytest
+
+FIELDS = [("temperature", "f"), ("status", "H")]
+
+
+def test_append_and_read(tmpdir):
+    path = str(tmpdir.join("recording"))
+    with SampleRecorder(path, FIELDS, segment_size=2) as recorder:
+        recorder.append((21.5, 1), timestamp=10.0)
+        recorder.append((22.0, 2), timestamp=11.0)
+        recorder.append((22.5, 3), timestamp=12.0)  # grows the files
+        assert recorder.count == 3
+        assert os.path.getsize(os.path.join(path, "000000.status.col")) == 8
+        # Committed samples are readable while recording
+        recording = SampleRecording(path)
+        assert len(recording) == 3
+        recorder.append((23.0, 4), timestamp=13.0)
+        assert len(recording) == 3
+        recording.refresh()
+        assert len(recording) == 4
+    # Preallocated space is released when closing
+    assert os.path.getsize(os.path.join(path, "000000.status.col")) == 8
+    recording = SampleRecording(path)
+    assert recording.fields == [("timestamp", "d")] + FIELDS
+    assert recording.parts == [(0, 4)]
+    assert list(recording.samples()) == [
+        (10.0, 21.5, 1), (11.0, 22.0, 2), (12.0, 22.5, 3), (13.0, 23.0, 4)]
+
+
+def test_uncommitted_samples_are_ignored(tmpdir):
+    path = str(tmpdir.join("recording"))
+    recorder = SampleRecorder(path, FIELDS)
+    recorder.append((1.0, 1), timestamp=1.0)
+    # Simulate a crash after writing the values but before the commit
+    recorder._columns[1].struct.pack_into(recorder._columns[1].mmap, 4, 2.0)
+    assert list(SampleRecording(path).samples()) == [(1.0, 1.0, 1)]
+    recorder.close()
+
+
+def test_rollover(tmpdir):
+    path = str(tmpdir.join("recording"))
+    with SampleRecorder(path, FIELDS, part_size=2,
+                        max_parts=2) as recorder:
+        for i in range(7):
+            recorder.append((float(i), i), timestamp=float(i))
+        assert recorder.part == 3
+    recording = SampleRecording(path)
+    assert recording.parts == [(2, 2), (3, 1)]
+    assert [s[2] for s in recording.samples()] == [4, 5, 6]
+    assert [s[2] for s in recording.samples(part=2)] == [4, 5]
+    with pytest.raises(KeyError):
+        list(recording.samples(part=0))
+
+
+def test_continue_recording(tmpdir):
+    path = str(tmpdir.join("recording"))
+    with SampleRecorder(path, FIELDS) as recorder:
+        recorder.append((1.0, 1), timestamp=1.0)
+    with SampleRecorder(path, FIELDS) as recorder:
+        assert recorder.part == 1
+        recorder.append((2.0, 2), timestamp=2.0)
+    assert list(SampleRecording(path).samples()) == [
+        (1.0, 1.0, 1), (2.0, 2.0, 2)]
+    with pytest.raises(ValueError):
+        SampleRecorder(path, [("temperature", "f")])
+
+
+def test_invalid_fields(tmpdir):
+    path = str(tmpdir.join("recording"))
+    with pytest.raises(ValueError):
+        SampleRecorder(path, [("temperature", "e")])
+    with pytest.raises(ValueError):
+        SampleRecorder(path, [("timestamp", "d")])
+    with SampleRecorder(path, FIELDS) as recorder:
+        with pytest.raises(ValueError):
+            recorder.append(1.0)
+
+
+def test_execute_and_append(tmpdir):
+    path = str(tmpdir.join("recording"))
+    Response = namedtuple("Response", ["temperature", "status"])
+    device = MagicMock()
+    device.execute.return_value = Response(1.5, 3)
+    with SampleRecorder(path, FIELDS,
+                        clock=VirtualClock(epoch=100.0)) as recorder:
+        assert recorder.execute_and_append(device, "cmd") == (1.5, 3)
+    assert list(SampleRecording(path).samples()) == [(100.0, 1.5, 3)]
+    device.execute.assert_called_once_with("cmd")
+
+
+def test_open_invalid_recording(tmpdir):
+    with pytest.raises(IOError):
+        SampleRecording(str(tmpdir))
+
+
+def test_numpy_columns(tmpdir):
+    np = pytest.importorskip("numpy")
+    path = str(tmpdir.join("recording"))
+    with SampleRecorder(path, FIELDS, part_size=3) as recorder:
+        for i in range(5):
+            recorder.append((i / 2.0, i), timestamp=float(i))
+    recording = SampleRecording(path)
+    part = recording.column("status", part=0)
+    assert isinstance(part, np.memmap)
+    assert part.dtype == np.dtype("<u2")
+    assert list(part) == [0, 1, 2]
+    assert list(recording.column("temperature")) == [0.0, 0.5, 1.0, 1.5, 2.0]
+    assert recording.column("timestamp").dtype == np.float64
+    with pytest.raises(KeyError):
+        recording.column("humidity")
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver.sample_ring_buffer import SampleRingBufferWriter, \
+    SampleRingBufferReader
+from mock import MagicMock
+import pytest
+
+
+def test_read_latest(tmpdir):
+    path = str(tmpdir.join("ring"))
+    with SampleRingBufferWriter(path, "<hf", 4) as writer:
+        with SampleRingBufferReader(path) as reader:
+            assert reader.sample_format == "<hf"
+            assert reader.capacity == 4
+            assert reader.read_latest() is None
+            writer.publish((-5, 1.5), timestamp=10.0)
+            writer.publish((7, 2.5), timestamp=11.0)
+            sample = reader.read_latest()
+    assert sample.sequence == 2
+    assert sample.timestamp == 11.0
+    assert sample.values == (7, 2.5)
+
+
+def test_read_new(tmpdir):
+    path = str(tmpdir.join("ring"))
+    with SampleRingBufferWriter(path, "<H", 4) as writer:
+        with SampleRingBufferReader(path) as reader:
+            writer.publish(1)
+            writer.publish(2)
+            assert [s.values for s in reader.read_new()] == [(1,), (2,)]
+            assert reader.read_new() == []
+            writer.publish(3)
+            assert [s.values for s in reader.read_new()] == [(3,)]
+            assert reader.lost_samples == 0
+
+
+def test_read_new_with_overrun(tmpdir):
+    path = str(tmpdir.join("ring"))
+    with SampleRingBufferWriter(path, "<H", 3) as writer:
+        with SampleRingBufferReader(path) as reader:
+            for i in range(5):
+                writer.publish(i)
+            samples = reader.read_new()
+    assert [s.sequence for s in samples] == [3, 4, 5]
+    assert [s.values for s in samples] == [(2,), (3,), (4,)]
+    assert reader.lost_samples == 2
+
+
+def test_multiple_readers(tmpdir):
+    path = str(tmpdir.join("ring"))
+    with SampleRingBufferWriter(path, "<H", 3) as writer:
+        readers = [SampleRingBufferReader(path) for _ in range(3)]
+        writer.publish(42)
+        for reader in readers:
+            assert [s.values for s in reader.read_new()] == [(42,)]
+            reader.close()
+
+
+def test_execute_and_publish(tmpdir):
+    path = str(tmpdir.join("ring"))
+    device = MagicMock()
+    device.execute.return_value = (1.0, 2.0)
+    with SampleRingBufferWriter(path, "<ff", 3) as writer:
+        assert writer.execute_and_publish(device, "cmd") == (1.0, 2.0)
+        with SampleRingBufferReader(path) as reader:
+            assert reader.read_latest().values == (1.0, 2.0)
+    device.execute.assert_called_once_with("cmd")
+
+
+def test_open_invalid_file(tmpdir):
+    path = tmpdir.join("invalid")
+    path.write(b"\x00" * 256, mode="wb")
+    with pytest.raises(IOError):
+        SampleRingBufferReader(str(path))
+
+
+def test_writer_restart_with_smaller_capacity(tmpdir):
+    # Readers must not access the old mapping beyond the new file size
+    path = str(tmpdir.join("ring"))
+    with SampleRingBufferWriter(path, "<H", 100) as writer:
+        writer.publish(1)
+        reader = SampleRingBufferReader(path)
+    with SampleRingBufferWriter(path, "<H", 1) as writer:
+        writer.publish(2)
+        assert [s.values for s in reader.read_new()] == [(2,)]
+        assert reader.capacity == 1
+        assert reader.restarts == 1
+    reader.close()
+    assert tmpdir.listdir() == [tmpdir.join("ring")]
+
+
+def test_writer_restart_with_same_capacity(tmpdir):
+    path = str(tmpdir.join("ring"))
+    with SampleRingBufferWriter(path, "<H", 4) as writer:
+        reader = SampleRingBufferReader(path)
+        writer.publish(1)
+        writer.publish(2)
+        assert len(reader.read_new()) == 2
+    with reader:
+        with SampleRingBufferWriter(path, "<H", 4) as writer:
+            writer.publish(3)
+            samples = reader.read_new()
+            assert [(s.sequence, s.values) for s in samples] == [(1, (3,))]
+            assert reader.read_latest().values == (3,)
+            assert reader.lost_samples == 0
+
+
+def test_read_latest_while_writer_died(tmpdir):
+    path = str(tmpdir.join("ring"))
+    with SampleRingBufferWriter(path, "<H", 1) as writer:
+        writer.publish(1)
+        # Simulate a writer which died while writing the next sample
+        writer._sample_struct = MagicMock()
+        writer._sample_struct.pack_into.side_effect = RuntimeError()
+        with pytest.raises(RuntimeError):
+            writer.publish(2)
+        with SampleRingBufferReader(path) as reader:
+            assert reader.read_latest() is None
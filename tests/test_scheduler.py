@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand, I2cDevice
+from sensirion_i2c_driver.clock import VirtualClock
+from sensirion_i2c_driver.errors import I2cNackError
+from sensirion_i2c_driver.scheduler import I2cScheduler, PRIORITY_REALTIME, \
+    PRIORITY_NORMAL, PRIORITY_BULK
+from mock import patch
+import threading
+import time
+import pytest
+
+
+class _BlockingTransceiver(object):
+    """
+    Fake API V1 transceiver which records the executed frames and blocks
+    transfers to address 0x10 until released.
+    """
+
+    API_VERSION = 1
+    channel_count = None
+
+    def __init__(self):
+        self.frames = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def transceive(self, slave_address, tx_data, rx_length, read_delay,
+                   timeout):
+        if slave_address == 0x10:
+            self.started.set()
+            self.release.wait(5.0)
+        self.frames.append((slave_address, tx_data))
+        if slave_address == 0x7F:
+            return 2, None, b""
+        return 0, None, b"\x00" * (rx_length or 0)
+
+
+def _wait_for_queue(scheduler, length):
+    for _ in range(500):
+        if len(scheduler._queue) == length:
+            return
+        time.sleep(0.01)
+    raise AssertionError("Queue did not reach length {}".format(length))
+
+
+def test_higher_priority_dispatched_first():
+    transceiver = _BlockingTransceiver()
+    scheduler = I2cScheduler(I2cConnection(transceiver))
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    threads = [threading.Thread(target=scheduler.execute,
+                                args=(0x10, command))]
+    threads[0].start()
+    transceiver.started.wait(5.0)
+    for address, priority in [(0x20, PRIORITY_BULK),
+                              (0x21, PRIORITY_NORMAL),
+                              (0x22, PRIORITY_REALTIME)]:
+        threads.append(threading.Thread(
+            target=scheduler.execute, args=(address, command, priority)))
+        threads[-1].start()
+        _wait_for_queue(scheduler, len(threads) - 1)
+    transceiver.release.set()
+    for thread in threads:
+        thread.join(5.0)
+    assert [f[0] for f in transceiver.frames] == [0x10, 0x22, 0x21, 0x20]
+    stats = scheduler.stats
+    assert stats[PRIORITY_BULK]["count"] == 1
+    assert stats[PRIORITY_BULK]["max_delay"] > 0.0
+
+
+def test_earlier_deadline_dispatched_first():
+    transceiver = _BlockingTransceiver()
+    scheduler = I2cScheduler(I2cConnection(transceiver))
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    threads = [threading.Thread(target=scheduler.execute,
+                                args=(0x10, command))]
+    threads[0].start()
+    transceiver.started.wait(5.0)
+    for address, deadline in [(0x20, None), (0x21, 10.0), (0x22, 1.0)]:
+        threads.append(threading.Thread(
+            target=scheduler.execute,
+            args=(address, command, PRIORITY_NORMAL, deadline)))
+        threads[-1].start()
+        _wait_for_queue(scheduler, len(threads) - 1)
+    transceiver.release.set()
+    for thread in threads:
+        thread.join(5.0)
+    assert [f[0] for f in transceiver.frames] == [0x10, 0x22, 0x21, 0x20]
+
+
+def test_chunks_interleaved_with_higher_priority():
+    transceiver = _BlockingTransceiver()
+    scheduler = I2cScheduler(I2cConnection(transceiver))
+    chunks = scheduler.execute_chunked(0x30, I2cCommand(b"\x02", 3, 0.0, 0.0),
+                                       1)
+    assert next(chunks) == b"\x00"
+    scheduler.execute(0x22, I2cCommand(b"\x01", 1, 0.0, 0.0),
+                      PRIORITY_REALTIME)
+    assert list(chunks) == [b"\x00", b"\x00"]
+    assert transceiver.frames == [
+        (0x30, b"\x02"), (0x22, b"\x01"), (0x30, None), (0x30, None)]
+    assert scheduler.stats[PRIORITY_BULK]["count"] == 4  # incl. end
+
+
+def test_post_processing_outside_of_bus_lock():
+    clock = VirtualClock()
+    scheduler = I2cScheduler(I2cConnection(_BlockingTransceiver(),
+                                           clock=clock))
+    scheduler.execute(0x20, I2cCommand(b"\x01", None, 0.0, 0.0,
+                                       post_processing_time=0.5))
+    assert clock.monotonic() == 0.5
+    assert scheduler._busy is False
+
+
+def test_deadline_miss():
+    clock = VirtualClock()
+    transceiver = _BlockingTransceiver()
+    transceiver.transceive = \
+        lambda **kwargs: (clock.advance(0.2), (0, None, b"\x00"))[1]
+    scheduler = I2cScheduler(I2cConnection(transceiver, clock=clock))
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    scheduler.execute(0x20, command, PRIORITY_REALTIME, deadline=0.5)
+    assert scheduler.stats[PRIORITY_REALTIME]["deadline_misses"] == 0
+    scheduler.execute(0x20, command, PRIORITY_REALTIME, deadline=0.1)
+    assert scheduler.stats[PRIORITY_REALTIME]["deadline_misses"] == 1
+
+
+def test_error_releases_bus():
+    scheduler = I2cScheduler(I2cConnection(_BlockingTransceiver()))
+    with pytest.raises(I2cNackError):
+        scheduler.execute(0x7F, I2cCommand(b"\x01", 1, 0.0, 0.0))
+    assert scheduler.execute(0x20, I2cCommand(b"\x01", 1, 0.0, 0.0)) == \
+        b"\x00"
+
+
+def test_view_as_device_connection():
+    transceiver = _BlockingTransceiver()
+    scheduler = I2cScheduler(I2cConnection(transceiver))
+    device = I2cDevice(scheduler.view(PRIORITY_REALTIME, 0.05), 0x44)
+    assert device.execute(I2cCommand(b"\x01", 1, 0.0, 0.0)) == b"\x00"
+    assert list(device.execute_chunked(I2cCommand(b"\x01", 2, 0.0, 0.0),
+                                       1)) == [b"\x00", b"\x00"]
+    assert device.connection.scheduler is scheduler
+    assert device.connection.is_multi_channel is False
+    assert scheduler.stats[PRIORITY_REALTIME]["count"] == 4
+
+
+def test_execute_chunked_validates_immediately():
+    scheduler = I2cScheduler(I2cConnection(_BlockingTransceiver()))
+    with pytest.raises(ValueError):
+        scheduler.execute_chunked(0x42, I2cCommand(b"\x01", 4, 0.0, 0.0), 0)
+    with pytest.raises(ValueError):
+        scheduler.view(PRIORITY_BULK).execute_chunked(
+            0x42, I2cCommand(b"\x01", 4, 0.0, 0.0), 0)
+
+
+def test_interrupted_wait_removes_entry():
+    transceiver = _BlockingTransceiver()
+    scheduler = I2cScheduler(I2cConnection(transceiver))
+    command = I2cCommand(b"\x01", 1, 0.0, 0.0)
+    blocker = threading.Thread(target=scheduler.execute,
+                               args=(0x10, command))
+    blocker.start()
+    transceiver.started.wait(5.0)
+    with patch.object(scheduler._condition, "wait",
+                      side_effect=KeyboardInterrupt()):
+        with pytest.raises(KeyboardInterrupt):
+            scheduler.execute(0x20, command, PRIORITY_REALTIME)
+    assert scheduler._queue == []
+    waiter = threading.Thread(target=scheduler.execute, args=(0x21, command))
+    waiter.start()
+    _wait_for_queue(scheduler, 1)
+    transceiver.release.set()
+    for thread in [blocker, waiter]:
+        thread.join(5.0)
+    assert [f[0] for f in transceiver.frames] == [0x10, 0x21]
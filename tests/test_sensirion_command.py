@@ -143,3 +143,25 @@ def test_single_byte_command():
     assert cmd.rx_length == 5
     assert cmd.read_delay == 0.1
     assert cmd.timeout == 0.2
+
+
+def test_interpret_response_chunks():
+    cmd = SensirionI2cCommand(None, None, 9, 0.1, 0.2,
+                              CrcCalculator(8, 0x31, 0xFF))
+    chunks = [b"\xBE", b"\xEF\x92\xBE\xEF", b"\x92\xBE\xEF\x92"]
+    assert list(cmd.interpret_response_chunks(chunks)) == [0xBEEF] * 3
+
+
+def test_interpret_response_chunks_without_crc():
+    cmd = SensirionI2cCommand(None, None, 4, 0.1, 0.2, None)
+    chunks = [b"\x12\x34\x56", b"\x78"]
+    assert list(cmd.interpret_response_chunks(chunks)) == [0x1234, 0x5678]
+
+
+def test_interpret_response_chunks_wrong_crc():
+    cmd = SensirionI2cCommand(None, None, 6, 0.1, 0.2,
+                              CrcCalculator(8, 0x31, 0xFF))
+    words = cmd.interpret_response_chunks([b"\xBE\xEF\x92\xBE\xEF\x00"])
+    assert next(words) == 0xBEEF
+    with pytest.raises(I2cChecksumError):
+        next(words)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver import I2cConnection, I2cCommand
+from sensirion_i2c_driver.clock import VirtualClock
+from sensirion_i2c_driver.tracing import I2cTracer
+from mock import MagicMock
+import json
+import threading
+import pytest
+
+
+def test_record_and_export():
+    clock = VirtualClock()
+    tracer = I2cTracer(clock=clock)
+    start = tracer.now()
+    clock.advance(0.001)
+    tracer.record("write", start, "/dev/i2c-1", {"bytes": 2})
+    tracer.record("read", tracer.now(), "/dev/i2c-2", end=tracer.now() + 500)
+    events = tracer.events()
+    metadata = [e for e in events if e["ph"] == "M"]
+    phases = [e for e in events if e["ph"] == "X"]
+    assert [m["args"]["name"] for m in metadata
+            if m["name"] == "process_name"] == ["/dev/i2c-1", "/dev/i2c-2"]
+    assert [m["args"]["name"] for m in metadata
+            if m["name"] == "thread_name"] == \
+        [threading.current_thread().name] * 2
+    assert phases[0] == {
+        "name": "write", "cat": "i2c", "ph": "X", "ts": 0.0, "dur": 1000.0,
+        "pid": 1, "tid": threading.current_thread().ident,
+        "args": {"bytes": 2},
+    }
+    assert phases[1]["pid"] == 2
+    assert phases[1]["dur"] == 0.5
+
+
+def test_ring_buffer_overwrites_oldest():
+    tracer = I2cTracer(capacity=3, clock=VirtualClock())
+    for i in range(5):
+        tracer.record(str(i), 0)
+    assert [e["name"] for e in tracer.events() if e["ph"] == "X"] == \
+        ["2", "3", "4"]
+    assert tracer.dropped == 2
+    tracer.clear()
+    assert tracer.events() == []
+
+
+def test_disabled():
+    tracer = I2cTracer()
+    tracer.enabled = False
+    tracer.record("write", 0)
+    assert tracer.events() == []
+    with pytest.raises(ValueError):
+        I2cTracer(capacity=0)
+
+
+def test_dump(tmpdir):
+    tracer = I2cTracer(clock=VirtualClock())
+    tracer.record("write", 0)
+    path = str(tmpdir.join("trace.json"))
+    tracer.dump(path)
+    with open(path) as f:
+        content = json.load(f)
+    assert content["displayTimeUnit"] == "ns"
+    assert len(content["traceEvents"]) == 3
+
+
+def test_connection_phases():
+    clock = VirtualClock()
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.description = "bus"
+    transceiver.transceive.return_value = (0, None, b"\x11")
+    connection = I2cConnection(transceiver, clock=clock)
+    connection.tracer = I2cTracer(clock=clock)
+    connection.execute(0x42, I2cCommand(b"\x01", 1, 0.0, 0.0,
+                                        post_processing_time=0.002))
+    phases = [e for e in connection.tracer.events() if e["ph"] == "X"]
+    assert [p["name"] for p in phases] == \
+        ["transceive", "post_process", "interpret", "execute"]
+    assert phases[1]["dur"] == 2000.0
+    assert phases[1]["args"] == {"requested_us": 2000.0}
+    assert phases[3]["args"] == {"slave_address": 0x42}
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright 2019 Sensirion AG, Switzerland
+
+from __future__ import absolute_import, division, print_function
+from sensirion_i2c_driver.transceiver_v2 import I2cTransceiverV2, \
+    I2cTransceiverV2Adapter
+from mock import MagicMock
+import pytest
+
+
+def test_interface():
+    transceiver = I2cTransceiverV2()
+    assert transceiver.API_VERSION == 2
+    assert transceiver.channel_count is None
+    with pytest.raises(NotImplementedError):
+        transceiver.transceive_batch([], [])
+
+
+def test_adapter_single_channel():
+    transceiver = MagicMock()
+    transceiver.API_VERSION = 1
+    transceiver.channel_count = None
+    transceiver.description = "fake"
+    transceiver.transceive.side_effect = [
+        (0, None, b"\x11\x22"),
+        (2, Exception("NACK"), b""),
+    ]
+    adapter = I2cTransceiverV2Adapter(transceiver)
+    assert adapter.API_VERSION == 2
+    assert adapter.description == "fake"
+    assert adapter.channel_count is None
+    buffers = [bytearray(2), None]
+    results = adapter.transceive_batch([
+        (0x42, b"\x55", 2, 0.0, 0.0),
+        (0x43, b"\x66", None, 0.0, 0.0),
+    ], buffers)
+    assert buffers[0] == b"\x11\x22"
+    assert [r[0] for r in results] == [0, 2]
+    assert type(results[0][2]) is float
+
+
+def test_adapter_short_read():
+    transceiver = MagicMock()
+    transceiver.channel_count = None
+    transceiver.transceive.return_value = (0, None, b"\x11")
+    adapter = I2cTransceiverV2Adapter(transceiver)
+    results = adapter.transceive_batch([(0x42, None, 2, 0.0, 0.0)],
+                                       [bytearray(2)])
+    assert results[0][0] == adapter.STATUS_UNSPECIFIED_ERROR
+
+
+def test_adapter_multi_channel_with_mask():
+    transceiver = MagicMock()
+    transceiver.channel_count = 3
+    transceiver.transceive.return_value = [
+        (0, None, b"\x11"),
+        (0, None, b"\x22"),
+        (2, Exception("NACK"), b""),
+    ]
+    adapter = I2cTransceiverV2Adapter(transceiver)
+    buffer = bytearray(3)
+    results = adapter.transceive_batch([(0x42, None, 1, 0.0, 0.0)], [buffer],
+                                       channel_mask=0b101)
+    assert buffer == b"\x11\x00\x00"
+    assert results[0][0][0] == 0
+    assert results[0][1] is None
+    assert results[0][2][0] == 2